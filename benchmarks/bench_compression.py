@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark compressed exports: throughput versus size for each codec.
+
+Exports the same bookmarks from a temporary database as NDJSON (or another
+format) through every codec at a few levels, then reads each file back the
+way import does. Reports write and read throughput in MB of uncompressed
+output per second, the file size and the compression ratio.
+
+Usage: python benchmarks/bench_compression.py [--rows N]
+                                              [--format ndjson|json|csv|html]
+                                              [--levels 1,6,9]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                'bookmark_manager'))
+
+from compression import CODECS, check_level, decompressed  # noqa: E402
+from database import DatabaseManager  # noqa: E402
+from models import Bookmark  # noqa: E402
+from utils import (IMPORT_FORMATS, export_to_csv, export_to_html,  # noqa: E402
+                   export_to_json, export_to_ndjson)
+
+
+def export_ndjson(bookmarks, filename, codec, level):
+    return export_to_ndjson(bookmarks, filename, False, codec, level)
+
+
+def export_json(bookmarks, filename, codec, level):
+    return export_to_json(bookmarks, filename, False, codec, level)
+
+
+EXPORTERS = {
+    'ndjson': export_ndjson,
+    'json': export_json,
+    'csv': export_to_csv,
+    'html': export_to_html,
+}
+
+WORDS = ('python', 'rust', 'async', 'guide', 'tutorial', 'docs', 'blog', 'video',
+         'paper', 'tools')
+
+
+def build_database(path: str, rows: int) -> DatabaseManager:
+    db = DatabaseManager(path)
+    start = datetime(2020, 1, 1)
+    db.add_bookmarks(
+        Bookmark(title=f'{WORDS[i % 10].title()} {WORDS[i * 7 % 10]} #{i}',
+                 url=f'https://site{i % 500}.example.com/{WORDS[i % 3]}/{i}',
+                 description=f'Notes about {WORDS[i % 10]} and {WORDS[i * 3 % 10]}',
+                 tags=f'{WORDS[i % 10]},{WORDS[i % 4]}',
+                 created_at=start + timedelta(minutes=i),
+                 updated_at=start + timedelta(minutes=i), visit_count=i % 7)
+        for i in range(rows))
+    return db
+
+
+def read_back(filename: str, format_type: str) -> int:
+    reader = next(reader for suffix, _, reader, _ in IMPORT_FORMATS
+                  if suffix == '.' + format_type)
+    with open(filename, 'rb') as f:
+        return sum(1 for _ in reader(decompressed(f)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compressed exports')
+    parser.add_argument('--rows', type=int, default=100000, help='Bookmarks to export')
+    parser.add_argument('--format', choices=list(EXPORTERS), default='ndjson',
+                        help='Export format')
+    parser.add_argument('--levels', default='1,6,9',
+                        help='Comma-separated levels to try per codec')
+    args = parser.parse_args()
+    export = EXPORTERS[args.format]
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = build_database(os.path.join(directory, 'bench.db'), args.rows)
+        plain_size = None
+        print(f"{'codec':10} {'level':>5} {'write MB/s':>11} {'read MB/s':>10} "
+              f"{'size MB':>9} {'ratio':>7}")
+        levels = [int(value) for value in args.levels.split(',')]
+        runs = [(None, None)] + [(codec, level) for codec in CODECS
+                                 for level in sorted({check_level(codec, value)
+                                                      for value in levels})]
+        for codec, level in runs:
+            filename = os.path.join(directory, f'export-{codec}-{level}.{args.format}')
+            start = time.perf_counter()
+            export(db.iter_bookmarks(), filename, codec, level)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            read_back(filename, args.format)
+            read_time = time.perf_counter() - start
+
+            size = os.path.getsize(filename)
+            plain_size = plain_size or size
+            megabytes = plain_size / 1024 / 1024
+            print(f"{codec or 'none':10} {'' if level is None else level:>5} "
+                  f"{megabytes / write_time:>11.1f} {megabytes / read_time:>10.1f} "
+                  f"{size / 1024 / 1024:>9.2f} {plain_size / size:>6.1f}x")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
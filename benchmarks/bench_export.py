@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON export memory and speed.
+
+Compares the old export (every bookmark converted to a dict, then one
+json.dump call) with the streaming writer, both reading rows from a
+temporary database through DatabaseManager.iter_bookmarks. Peak memory is
+measured with tracemalloc, and the two files are checked to be identical.
+
+Usage: python benchmarks/bench_export.py [--rows N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                'bookmark_manager'))
+
+from database import DatabaseManager  # noqa: E402
+from jsonstream import write_json_array  # noqa: E402
+from models import Bookmark  # noqa: E402
+
+
+def build_database(path: str, rows: int) -> DatabaseManager:
+    db = DatabaseManager(path)
+    start = datetime(2020, 1, 1)
+    db.add_bookmarks(Bookmark(title=f'Bookmark {i}', url=f'https://example.com/{i}',
+                              description='Some description', tags='python,web',
+                              created_at=start + timedelta(minutes=i),
+                              updated_at=start + timedelta(minutes=i),
+                              visit_count=i % 7)
+                     for i in range(rows))
+    return db
+
+
+def export_loaded(db: DatabaseManager, filename: str):
+    with open(filename, 'w', encoding='utf-8') as f:
+        data = [bookmark.to_dict() for bookmark in db.iter_bookmarks()]
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def export_streamed(db: DatabaseManager, filename: str):
+    with open(filename, 'w', encoding='utf-8') as f:
+        write_json_array((bookmark.to_dict() for bookmark in db.iter_bookmarks()), f)
+
+
+def measure(func, db: DatabaseManager, filename: str):
+    """Seconds taken and peak traced memory in bytes."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(db, filename)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON export')
+    parser.add_argument('--rows', type=int, default=100000, help='Bookmarks to export')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = build_database(os.path.join(directory, 'bench.db'), args.rows)
+        outputs = []
+        for label, func in [('list + json.dump (before)', export_loaded),
+                            ('write_json_array (after)', export_streamed)]:
+            filename = os.path.join(directory, f'{func.__name__}.json')
+            elapsed, peak = measure(func, db, filename)
+            outputs.append(filename)
+            print(f"{label:30} {elapsed:8.2f} s  peak {peak / 1024 / 1024:8.1f} MiB")
+        db.close()
+
+        with open(outputs[0], 'rb') as before, open(outputs[1], 'rb') as after:
+            identical = before.read() == after.read()
+            print('Outputs identical' if identical else 'Outputs DIFFER')
+
+
+if __name__ == '__main__':
+    main()
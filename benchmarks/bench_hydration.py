@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark turning bookmark rows into Bookmark objects.
+
+Compares the old hydration path (sqlite3.Row, name indexing and two
+datetime.fromisoformat calls per row) with Bookmark.from_row on plain tuple
+rows holding epoch timestamps. Both read from an in-memory database so the
+numbers measure CPU cost only.
+
+Usage: python benchmarks/bench_hydration.py [--rows N] [--repeat N]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                'bookmark_manager'))
+
+from models import Bookmark, ROW_FIELDS  # noqa: E402
+
+
+def build_database(rows: int) -> sqlite3.Connection:
+    """Create the same bookmarks with text and with epoch timestamps."""
+    conn = sqlite3.connect(':memory:')
+    for table in ('legacy', 'current'):
+        conn.execute(f'''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY, title TEXT, url TEXT, description TEXT,
+                tags TEXT, created_at TIMESTAMP, updated_at TIMESTAMP,
+                visit_count INTEGER
+            )
+        ''')
+    start = datetime(2020, 1, 1)
+    data = []
+    for i in range(rows):
+        stamp = start + timedelta(minutes=i)
+        data.append((i + 1, f'Bookmark {i}', f'https://example.com/{i}',
+                     'Some description', 'python,web', stamp, stamp, i % 7))
+    conn.executemany('INSERT INTO legacy VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     [row[:5] + (row[5].isoformat(' '), row[6].isoformat(' ')) + row[7:]
+                      for row in data])
+    conn.executemany('INSERT INTO current VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     [row[:5] + (int(row[5].timestamp()), int(row[6].timestamp()))
+                      + row[7:] for row in data])
+    return conn
+
+
+def hydrate_legacy(conn: sqlite3.Connection) -> int:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute('SELECT * FROM legacy')
+    bookmarks = []
+    for row in cursor.fetchall():
+        bookmarks.append(Bookmark(
+            id=row['id'],
+            title=row['title'],
+            url=row['url'],
+            description=row['description'],
+            tags=row['tags'],
+            created_at=datetime.fromisoformat(row['created_at']),
+            updated_at=datetime.fromisoformat(row['updated_at']),
+            visit_count=row['visit_count']
+        ))
+    return len(bookmarks)
+
+
+def hydrate_current(conn: sqlite3.Connection) -> int:
+    cursor = conn.execute(f"SELECT {', '.join(ROW_FIELDS)} FROM current")
+    bookmarks = [Bookmark.from_row(row) for row in cursor.fetchall()]
+    return len(bookmarks)
+
+
+def hydrate_current_with_dates(conn: sqlite3.Connection) -> int:
+    cursor = conn.execute(f"SELECT {', '.join(ROW_FIELDS)} FROM current")
+    bookmarks = [Bookmark.from_row(row) for row in cursor.fetchall()]
+    for bookmark in bookmarks:
+        bookmark.created_at, bookmark.updated_at
+    return len(bookmarks)
+
+
+def measure(func, conn: sqlite3.Connection, repeat: int) -> float:
+    """Best rows/sec over ``repeat`` runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func(conn)
+        best = min(best, time.perf_counter() - start)
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bookmark row hydration')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows per run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs per variant (best is kept)')
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+    baseline = measure(hydrate_legacy, conn, args.repeat)
+    print(f"{'Row + fromisoformat (before)':40} {baseline:>12,.0f} rows/sec")
+    for label, func in [('tuple + from_row (after)', hydrate_current),
+                        ('tuple + from_row, dates read', hydrate_current_with_dates)]:
+        rate = measure(func, conn, args.repeat)
+        print(f"{label:40} {rate:>12,.0f} rows/sec  ({rate / baseline:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
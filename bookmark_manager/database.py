@@ -1,169 +1,945 @@
 import sqlite3
 import os
-from typing import List, Optional, Dict, Any
+import base64
+import json
+import threading
+from typing import List, Optional, Dict, Any, Tuple, Iterable, Iterator, Callable
 from datetime import datetime
-from models import Bookmark
+from models import (Bookmark, ROW_FIELDS, HIGHLIGHT_START, HIGHLIGHT_END, to_epoch, from_epoch,
+                    url_domain, registrable_domain, normalize_domain)
+from migrations import migrate
+from visits import VisitBuffer
+from cache import ResultCache
+from query import Query, parse_query, compile_query, domain_condition, uses_visits, with_default_field
+from related import MAX_DF, MAX_DF_FLOOR, idf, term_frequencies, vector_norm
+from textnorm import fold, unfold_markup
+from trigram import DEFAULT_THRESHOLD, similarity, match_any_expression, substring_expression
+
+
+# Columns covered by full-text search, in FTS table order
+SEARCH_FIELDS = ('title', 'url', 'description', 'tags')
+
+# Columns covered by the trigram index used for substring and fuzzy search
+TRIGRAM_FIELDS = ('title', 'url', 'tags')
+
+# bm25() column weights: title and tag hits outrank URL and description hits
+BM25_WEIGHTS = '10.0, 2.0, 1.0, 5.0'
+
+# How add_bookmarks treats a bookmark whose URL is already stored
+DUPLICATE_POLICIES = ('skip', 'update', 'merge')
+
+# Case- and accent-folded copy of each searchable column (see textnorm)
+FOLDED_COLUMNS = {field: f'{field}_folded' for field in SEARCH_FIELDS}
+
+# Columns add_bookmark(s) write: the bookmark's own fields, then derived ones
+INSERT_COLUMNS = ('title', 'url', 'description', 'tags', 'created_at', 'updated_at', 'visit_count',
+                  'domain', 'registrable_domain') + tuple(FOLDED_COLUMNS.values())
+
+# Column list every bookmark query selects, in the order Bookmark.from_row reads
+BOOKMARK_COLUMNS = ', '.join(ROW_FIELDS)
+# The same columns under the 'b' alias used when joining a search index
+JOINED_COLUMNS = ', '.join('b.' + column for column in ROW_FIELDS)
+
+# Facets search_facets() counts, each a list of (value, hits) pairs
+FACET_NAMES = ('tags', 'domains', 'months')
+
+# What complete() can suggest
+COMPLETION_FIELDS = ('title', 'tag', 'domain')
+
+# Appended to a prefix to get the exclusive upper end of its range: sorts
+# after any character that can follow the prefix
+_PREFIX_END = '\U0010ffff'
+
+# Filters iter_bookmarks understands
+FILTER_KEYS = ('tags', 'match_all', 'domain', 'updated_since')
+
+# Sort orders offered for listing, each paged over a (column, id) index.
+# Titles sort A-Z by default, everything else newest/most visited first.
+SORT_COLUMNS = {
+    'created': 'created_at',
+    'updated': 'updated_at',
+    'visits': 'visit_count',
+    'title': 'title',
+}
+
+
+def _encode_cursor(sort: str, reverse: bool, value: Any, bookmark_id: int) -> str:
+    """Pack a page boundary into an opaque, URL-safe cursor string."""
+    payload = json.dumps([sort, reverse, value, bookmark_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str, sort: str, reverse: bool) -> Tuple[Any, int]:
+    """Unpack a cursor, checking that it belongs to the requested sort order."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, cursor_reverse, value, bookmark_id = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid page cursor: {cursor}") from None
+    if (cursor_sort, cursor_reverse) != (sort, reverse):
+        raise ValueError("Page cursor was created for a different sort order")
+    return value, bookmark_id
 
 
 class DatabaseManager:
     """Handles all database operations for the bookmark manager."""
-    
-    def __init__(self, db_path: str = "bookmarks.db"):
+
+    def __init__(self, db_path: str = "bookmarks.db", cached_statements: int = 128,
+                 journal_mode: Optional[str] = 'WAL', visit_buffer: Optional[VisitBuffer] = None,
+                 cache: Optional[ResultCache] = None):
         self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.journal_mode = journal_mode
+        self.visit_buffer = visit_buffer
+        self.cache = cache
+        self._generation = 0
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._fts_enabled: Optional[bool] = None
+        self._trigram_enabled: Optional[bool] = None
         self.init_database()
-    
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Return this thread's long-lived connection, opening it on first use.
+
+        The connection keeps ``cached_statements`` prepared statements around,
+        so repeated queries skip the SQL compile step. Using it as a context
+        manager commits on success and rolls back on error, but never closes it.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements,
+                                   check_same_thread=False)
+            if self.journal_mode:
+                conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+                if self.journal_mode.upper() == 'WAL':
+                    # WAL only needs an fsync at checkpoint time under NORMAL
+                    conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Close every connection opened by this manager.
+
+        Buffered visits are written first, except spooled ones that are not
+        due yet: those stay on disk for a later process to flush.
+        """
+        if self.visit_buffer is not None and (
+                self.visit_buffer.spool_path is None or self.visit_buffer.is_due()):
+            self.flush_visits()
+        if self.cache is not None:
+            self.cache.save_stats()
+            self.cache.close()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> 'DatabaseManager':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def init_database(self):
-        """Initialize the database with the required schema."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bookmarks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    url TEXT NOT NULL UNIQUE,
-                    description TEXT,
-                    tags TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    visit_count INTEGER DEFAULT 0
-                )
-            ''')
-            conn.commit()
+        """Bring the database schema up to date."""
+        migrate(self.get_connection())
+    
+    def _bump_generation(self):
+        """Mark cached results stale after a write through this manager."""
+        with self._lock:
+            self._generation += 1
+    
+    def _current_generation(self) -> Tuple[int, Optional[int]]:
+        """The generation cached results must match.
+
+        It is the trigger-maintained change counter stored in the database,
+        so every process agrees on it, paired with a fingerprint of the
+        pending visits that hydrated bookmarks include. The counter is only
+        re-read after a write through this manager bumps ``_generation`` or
+        a commit elsewhere changes this connection's ``PRAGMA data_version``.
+        """
+        conn = self.get_connection()
+        state = (conn.execute('PRAGMA data_version').fetchone()[0], self._generation)
+        if getattr(self._local, 'generation_state', None) != state:
+            self._local.changes = conn.execute(
+                'SELECT generation FROM bookmark_changes WHERE id = 1').fetchone()[0]
+            self._local.generation_state = state
+        pending = self.visit_buffer.fingerprint() if self.visit_buffer is not None else None
+        return self._local.changes, pending
+    
+    def _cached(self, key: Tuple, compute: Callable[[], List[Any]]) -> List[Any]:
+        """Serve a list result from the cache, computing and storing it on a miss.
+
+        Callers get their own list, but the cached objects in it are shared.
+        """
+        if self.cache is None:
+            return compute()
+        generation = self._current_generation()
+        hit, value = self.cache.get(key, generation)
+        if not hit:
+            value = compute()
+            self.cache.put(key, generation, value)
+        return list(value)
+    
+    @property
+    def fts_enabled(self) -> bool:
+        """Whether the FTS5 search index exists (checked once, on first use)."""
+        if self._fts_enabled is None:
+            self._fts_enabled = self.get_connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookmarks_fts'"
+            ).fetchone() is not None
+        return self._fts_enabled
+    
+    @property
+    def trigram_enabled(self) -> bool:
+        """Whether the trigram index exists (checked once, on first use)."""
+        if self._trigram_enabled is None:
+            self._trigram_enabled = self.get_connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookmarks_trigram'"
+            ).fetchone() is not None
+        return self._trigram_enabled
+    
+    @staticmethod
+    def _sync_tags(cursor: sqlite3.Cursor, bookmark_id: int, tags: Optional[str]):
+        """Point a bookmark's bookmark_tags rows at the tags in its CSV string."""
+        DatabaseManager._sync_tags_many(cursor, [(bookmark_id, tags)])
+    
+    @staticmethod
+    def _sync_tags_many(cursor: sqlite3.Cursor, rows: List[Tuple[int, Optional[str]]]):
+        """Re-link the tags of several (bookmark_id, tags CSV) rows at once."""
+        if not rows:
+            return
+        
+        placeholders = ', '.join('?' for _ in rows)
+        cursor.execute(f'DELETE FROM bookmark_tags WHERE bookmark_id IN ({placeholders})',
+                       [bookmark_id for bookmark_id, _ in rows])
+        links = [(bookmark_id, name) for bookmark_id, tags in rows
+                 for name in Bookmark(tags=tags).get_tags_list()]
+        if not links:
+            return
+        
+        cursor.executemany('INSERT OR IGNORE INTO tags (name, folded) VALUES (?, ?)',
+                           [(name, fold(name)) for _, name in links])
+        cursor.executemany('''
+            INSERT OR IGNORE INTO bookmark_tags (tag_id, bookmark_id)
+            SELECT id, ? FROM tags WHERE name = ?
+        ''', links)
+    
+    def rebuild_search_index(self) -> bool:
+        """Rebuild the full-text (and trigram) index from the bookmarks table."""
+        if not self.fts_enabled:
+            return False
+        with self.get_connection() as conn:
+            conn.execute("INSERT INTO bookmarks_fts (bookmarks_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO bookmarks_fts (bookmarks_fts) VALUES ('optimize')")
+            if self.trigram_enabled:
+                conn.execute("INSERT INTO bookmarks_trigram (bookmarks_trigram) VALUES ('rebuild')")
+                conn.execute("INSERT INTO bookmarks_trigram (bookmarks_trigram) VALUES ('optimize')")
+        return True
     
     def add_bookmark(self, bookmark: Bookmark) -> int:
         """Add a new bookmark to the database."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO bookmarks (title, url, description, tags, created_at, updated_at, visit_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                bookmark.title,
-                bookmark.url,
-                bookmark.description,
-                bookmark.tags,
-                bookmark.created_at,
-                bookmark.updated_at,
-                bookmark.visit_count
-            ))
+            cursor.execute(self._insert_sql(), self._insert_values(bookmark, bookmark.tags))
+            bookmark_id = cursor.lastrowid
+            self._sync_tags(cursor, bookmark_id, bookmark.tags)
+            self._refresh_collections(cursor, [bookmark_id])
             conn.commit()
-            return cursor.lastrowid
+        self._bump_generation()
+        return bookmark_id
+    
+    @staticmethod
+    def _insert_sql(conflict_clause: str = '') -> str:
+        """INSERT statement for INSERT_COLUMNS, optionally with an ON CONFLICT(url) clause."""
+        placeholders = ', '.join('?' for _ in INSERT_COLUMNS)
+        sql = f"INSERT INTO bookmarks ({', '.join(INSERT_COLUMNS)}) VALUES ({placeholders})"
+        return f'{sql} ON CONFLICT(url) {conflict_clause}' if conflict_clause else sql
+    
+    @staticmethod
+    def _insert_values(bookmark: Bookmark, tags: Optional[str]) -> Tuple:
+        """Values for INSERT_COLUMNS; ``tags`` may differ from the bookmark's (merged)."""
+        return (
+            bookmark.title,
+            bookmark.url,
+            bookmark.description,
+            tags,
+            to_epoch(bookmark.created_at),
+            to_epoch(bookmark.updated_at),
+            bookmark.visit_count,
+            *DatabaseManager._domain_columns(bookmark.url),
+            fold(bookmark.title),
+            fold(bookmark.url),
+            fold(bookmark.description),
+            fold(tags)
+        )
+    
+    @staticmethod
+    def _domain_columns(url: str) -> Tuple[str, str]:
+        """Values of the derived domain and registrable_domain columns for a URL."""
+        domain = url_domain(url)
+        return domain, registrable_domain(domain)
+    
+    def add_bookmarks(self, bookmarks: Iterable[Bookmark], batch_size: int = 500,
+                      on_duplicate: str = 'skip',
+                      progress: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """Insert many bookmarks in a single transaction.
+
+        Rows are written with ``executemany`` in batches of ``batch_size``,
+        so ``bookmarks`` can be a generator that is consumed as it goes.
+        Bookmarks whose URL already exists are handled by ``on_duplicate``:
+        'skip' leaves the stored row alone, 'update' overwrites its title,
+        description and tags, and 'merge' adds the new tags to the old ones.
+        ``progress`` is called with the running counts after each batch.
+        Returns the number of inserted, updated and skipped bookmarks.
+        """
+        if on_duplicate not in DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown duplicate policy: {on_duplicate}")
+        
+        if on_duplicate == 'skip':
+            conflict_clause = 'DO NOTHING'
+        elif on_duplicate == 'update':
+            conflict_clause = '''DO UPDATE SET title = excluded.title,
+                description = excluded.description, tags = excluded.tags,
+                title_folded = excluded.title_folded, description_folded = excluded.description_folded,
+                tags_folded = excluded.tags_folded, updated_at = excluded.updated_at'''
+        else:
+            conflict_clause = '''DO UPDATE SET tags = excluded.tags, tags_folded = excluded.tags_folded,
+                updated_at = excluded.updated_at'''
+        sql = self._insert_sql(conflict_clause)
+        
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            batch = []
+            for bookmark in bookmarks:
+                batch.append(bookmark)
+                if len(batch) >= batch_size:
+                    self._write_batch(cursor, sql, batch, on_duplicate, counts)
+                    batch = []
+                    if progress:
+                        progress(counts)
+            if batch:
+                self._write_batch(cursor, sql, batch, on_duplicate, counts)
+                if progress:
+                    progress(counts)
+        self._bump_generation()
+        return counts
+    
+    def _write_batch(self, cursor: sqlite3.Cursor, sql: str, batch: List[Bookmark],
+                     on_duplicate: str, counts: Dict[str, int]):
+        """Upsert one batch for add_bookmarks and re-link the tags it changed."""
+        urls = list({bookmark.url for bookmark in batch})
+        placeholders = ', '.join('?' for _ in urls)
+        cursor.execute(f'SELECT url, tags FROM bookmarks WHERE url IN ({placeholders})', urls)
+        # Tags each URL will have once the rows before it are written
+        current_tags: Dict[str, Optional[str]] = dict(cursor.fetchall())
+        
+        rows = []
+        changed_urls = set()
+        for bookmark in batch:
+            tags = bookmark.tags
+            if bookmark.url not in current_tags:
+                counts['inserted'] += 1
+                changed_urls.add(bookmark.url)
+            elif on_duplicate == 'skip':
+                counts['skipped'] += 1
+                continue
+            else:
+                existing = current_tags[bookmark.url]
+                if on_duplicate == 'merge':
+                    merged = Bookmark()
+                    merged.set_tags_list(Bookmark(tags=existing).get_tags_list() +
+                                         Bookmark(tags=tags).get_tags_list())
+                    tags = merged.tags or None
+                    if tags == existing:
+                        counts['skipped'] += 1
+                        continue
+                counts['updated'] += 1
+                changed_urls.add(bookmark.url)
+            
+            current_tags[bookmark.url] = tags
+            rows.append(self._insert_values(bookmark, tags))
+        
+        if not rows:
+            return
+        cursor.executemany(sql, rows)
+        
+        changed = list(changed_urls)
+        placeholders = ', '.join('?' for _ in changed)
+        cursor.execute(f'SELECT id, tags FROM bookmarks WHERE url IN ({placeholders})', changed)
+        rows = cursor.fetchall()
+        self._sync_tags_many(cursor, rows)
+        self._refresh_collections(cursor, [bookmark_id for bookmark_id, _ in rows])
     
     def get_bookmark_by_id(self, bookmark_id: int) -> Optional[Bookmark]:
         """Retrieve a bookmark by its ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM bookmarks WHERE id = ?', (bookmark_id,))
+            cursor.execute(f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks WHERE id = ?', (bookmark_id,))
             row = cursor.fetchone()
-            if row:
-                return Bookmark(
-                    id=row['id'],
-                    title=row['title'],
-                    url=row['url'],
-                    description=row['description'],
-                    tags=row['tags'],
-                    created_at=datetime.fromisoformat(row['created_at']),
-                    updated_at=datetime.fromisoformat(row['updated_at']),
-                    visit_count=row['visit_count']
-                )
-            return None
+            return self._hydrate(row) if row else None
     
     def get_bookmark_by_url(self, url: str) -> Optional[Bookmark]:
         """Retrieve a bookmark by its URL."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM bookmarks WHERE url = ?', (url,))
+            cursor.execute(f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks WHERE url = ?', (url,))
             row = cursor.fetchone()
-            if row:
-                return Bookmark(
-                    id=row['id'],
-                    title=row['title'],
-                    url=row['url'],
-                    description=row['description'],
-                    tags=row['tags'],
-                    created_at=datetime.fromisoformat(row['created_at']),
-                    updated_at=datetime.fromisoformat(row['updated_at']),
-                    visit_count=row['visit_count']
-                )
-            return None
+            return self._hydrate(row) if row else None
     
-    def get_all_bookmarks(self, limit: Optional[int] = None, offset: int = 0) -> List[Bookmark]:
-        """Retrieve all bookmarks with optional pagination."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_all_bookmarks(self, limit: Optional[int] = None, offset: int = 0,
+                          sort: str = 'created', reverse: bool = False,
+                          filters: Optional[Dict[str, Any]] = None) -> List[Bookmark]:
+        """Retrieve all bookmarks with optional pagination.
+
+        ``filters`` narrows the rows as in iter_bookmarks. Prefer
+        get_bookmarks_page for paging: large offsets still have to walk past
+        every skipped row.
+        """
+        column, descending = self._sort_order(sort, reverse)
+        direction = 'DESC' if descending else 'ASC'
+        where, params = self._filter_clause(filters or {})
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            query = 'SELECT * FROM bookmarks ORDER BY created_at DESC'
-            params = []
+            query = (f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks {where} '
+                     f'ORDER BY {column} {direction}, id {direction}')
             
             if limit is not None:
                 query += ' LIMIT ? OFFSET ?'
                 params.extend([limit, offset])
             
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            bookmarks = []
-            for row in rows:
-                bookmarks.append(Bookmark(
-                    id=row['id'],
-                    title=row['title'],
-                    url=row['url'],
-                    description=row['description'],
-                    tags=row['tags'],
-                    created_at=datetime.fromisoformat(row['created_at']),
-                    updated_at=datetime.fromisoformat(row['updated_at']),
-                    visit_count=row['visit_count']
-                ))
-            return bookmarks
+            return [self._hydrate(row) for row in cursor.fetchall()]
     
-    def search_bookmarks(self, query: str, search_in: str = 'all') -> List[Bookmark]:
-        """Search bookmarks by query in specified fields."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+    def get_bookmarks_page(self, limit: int = 10, after: Optional[str] = None,
+                           before: Optional[str] = None, sort: str = 'created',
+                           reverse: bool = False,
+                           filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Retrieve one page of bookmarks using keyset pagination.
+
+        Pages are addressed by opaque cursors instead of offsets: ``after``
+        continues past the last row of a page and ``before`` goes back from
+        its first row. Each page is a seek on the (sort column, id) index,
+        so deep pages cost the same as the first one. ``filters`` narrows
+        the rows as in iter_bookmarks. Returns the page's bookmarks plus the
+        'next' and 'prev' cursors (None at either end).
+        """
+        column, descending = self._sort_order(sort, reverse)
+        cursor_value = before if before is not None else after
+        key = _decode_cursor(cursor_value, sort, reverse) if cursor_value is not None else None
+        
+        # Walking backwards means scanning the index in the opposite direction
+        backwards = before is not None
+        scan_descending = descending != backwards
+        direction = 'DESC' if scan_descending else 'ASC'
+        
+        where, params = self._filter_clause(filters or {})
+        if key is not None:
+            where += ' AND ' if where else 'WHERE '
+            where += f'({column}, id) {"<" if scan_descending else ">"} (?, ?)'
+            params.extend(key)
+        query = f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks {where}'
+        query += f' ORDER BY {column} {direction}, id {direction} LIMIT ?'
+        params.append(limit + 1)
+        
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            search_conditions = []
-            params = [f'%{query}%']
-            
-            if search_in == 'all':
-                search_conditions = [
-                    'title LIKE ?',
-                    'url LIKE ?',
-                    'description LIKE ?',
-                    'tags LIKE ?'
-                ]
-                params = [f'%{query}%'] * 4
-            elif search_in == 'title':
-                search_conditions = ['title LIKE ?']
-            elif search_in == 'url':
-                search_conditions = ['url LIKE ?']
-            elif search_in == 'description':
-                search_conditions = ['description LIKE ?']
-            elif search_in == 'tags':
-                search_conditions = ['tags LIKE ?']
-            
-            where_clause = ' OR '.join(search_conditions)
-            sql = f'SELECT * FROM bookmarks WHERE {where_clause} ORDER BY created_at DESC'
-            
-            cursor.execute(sql, params)
+            cursor.execute(query, params)
             rows = cursor.fetchall()
-            
-            bookmarks = []
-            for row in rows:
-                bookmarks.append(Bookmark(
-                    id=row['id'],
-                    title=row['title'],
-                    url=row['url'],
-                    description=row['description'],
-                    tags=row['tags'],
-                    created_at=datetime.fromisoformat(row['created_at']),
-                    updated_at=datetime.fromisoformat(row['updated_at']),
-                    visit_count=row['visit_count']
-                ))
-            return bookmarks
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+        
+        bookmarks = [self._hydrate(row) for row in rows]
+        
+        has_next = has_more if not backwards else True
+        has_prev = has_more if backwards else key is not None
+        position = ROW_FIELDS.index(column)
+        return {
+            'bookmarks': bookmarks,
+            'next': _encode_cursor(sort, reverse, rows[-1][position], rows[-1][0])
+                    if rows and has_next else None,
+            'prev': _encode_cursor(sort, reverse, rows[0][position], rows[0][0])
+                    if rows and has_prev else None,
+        }
+    
+    def _sort_order(self, sort: str, reverse: bool) -> Tuple[str, bool]:
+        """Resolve a sort name to its column and whether it runs descending."""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        if sort == 'visits':
+            # Pending visits would not show up in the index order
+            self.flush_visits()
+        return SORT_COLUMNS[sort], (sort != 'title') != reverse
+    
+    def iter_bookmarks(self, filters: Optional[Dict[str, Any]] = None, order: str = 'created',
+                       chunk_size: int = 500, reverse: bool = False) -> Iterator[Bookmark]:
+        """Yield bookmarks one at a time, reading them from SQLite in chunks.
+
+        ``filters`` narrows the rows: 'tags' is a list of tag names and
+        'match_all' (default True) chooses between all or any of them;
+        'domain' keeps bookmarks on a host or its subdomains;
+        'updated_since' keeps those updated at or after a datetime. Only
+        ``chunk_size`` rows are held in memory at once, so the cost does not
+        grow with the size of the collection.
+        """
+        column, descending = self._sort_order(order, reverse)
+        direction = 'DESC' if descending else 'ASC'
+        where, params = self._filter_clause(filters or {})
+        return self._iter_rows(
+            f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks {where} ORDER BY {column} {direction}, id {direction}',
+            params, chunk_size)
+    
+    @staticmethod
+    def _filter_clause(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause for iter_bookmarks filters."""
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter: {', '.join(sorted(unknown))}")
+        
+        conditions = []
+        params: List[Any] = []
+        if filters.get('tags') is not None:
+            names = Bookmark(tags=','.join(filters['tags'])).get_tags_list()
+            if not names:
+                return 'WHERE 0', []
+            placeholders = ', '.join('?' for _ in names)
+            having = f'HAVING COUNT(*) = {len(names)}' if filters.get('match_all', True) else ''
+            conditions.append(f'''id IN (
+                SELECT bt.bookmark_id FROM tags t
+                JOIN bookmark_tags bt ON bt.tag_id = t.id
+                WHERE t.name IN ({placeholders})
+                GROUP BY bt.bookmark_id
+                {having}
+            )''')
+            params.extend(names)
+        if filters.get('domain'):
+            condition, domain_params = domain_condition(normalize_domain(filters['domain']), prefix='')
+            conditions.append(condition)
+            params.extend(domain_params)
+        if filters.get('updated_since') is not None:
+            conditions.append('updated_at >= ?')
+            params.append(to_epoch(filters['updated_since']))
+        
+        if not conditions:
+            return '', []
+        return 'WHERE ' + ' AND '.join(conditions), params
+    
+    def _iter_rows(self, sql: str, params: Iterable[Any], chunk_size: int) -> Iterator[Bookmark]:
+        """Run a bookmarks query and yield its rows as Bookmarks, chunk by chunk."""
+        for row in self._fetch_chunked(sql, params, chunk_size):
+            yield self._hydrate(row)
+    
+    def _fetch_chunked(self, sql: str, params: Iterable[Any], chunk_size: int) -> Iterator[Tuple]:
+        """Run a query and yield its raw rows, fetching ``chunk_size`` at a time."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, list(params))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # An abandoned iterator may only be finalized after close()
+            if conn in self._connections:
+                cursor.close()
+    
+    def search_bookmarks(self, query: str, search_in: str = 'all') -> List[Bookmark]:
+        """Search bookmarks by query in specified fields, best matches first."""
+        return self._cached(('search', query, search_in),
+                            lambda: list(self.iter_search(query, search_in)))
+    
+    def iter_search(self, query: str, search_in: str = 'all',
+                    chunk_size: int = 500) -> Iterator[Bookmark]:
+        """Yield search results best match first, reading them in chunks."""
+        if not self.fts_enabled:
+            return self._iter_search_like(query, self._like_fields(search_in), chunk_size)
+        
+        match = self._build_match_query(query, search_in)
+        if match is None:
+            return iter(())
+        
+        return self._iter_rows(f'''
+            SELECT {JOINED_COLUMNS} FROM bookmarks_fts
+            JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+            WHERE bookmarks_fts MATCH ?
+            ORDER BY bm25(bookmarks_fts, {BM25_WEIGHTS}), b.created_at DESC
+        ''', (match,), chunk_size)
+    
+    def iter_search_highlighted(self, query: str, search_in: str = 'all', chunk_size: int = 500,
+                                snippet_tokens: int = 16) -> Iterator[Tuple[Bookmark, Dict[str, str]]]:
+        """Yield search results with the matched terms marked, best match first.
+
+        Pairs each bookmark with {field: text} where matches are wrapped in
+        HIGHLIGHT_START/HIGHLIGHT_END. FTS5 builds them while reading the
+        results: title, URL and tags are highlighted whole, and the
+        description is cut to about ``snippet_tokens`` words around the best
+        match. The index holds folded text, so the markers are moved back
+        onto the original text. Without the FTS5 index the highlights are
+        empty.
+        """
+        if not self.fts_enabled:
+            return ((bookmark, {}) for bookmark in
+                    self._iter_search_like(query, self._like_fields(search_in), chunk_size))
+        
+        match = self._build_match_query(query, search_in)
+        if match is None:
+            return iter(())
+        
+        fields = ('title', 'url', 'tags', 'description')
+        columns = [SEARCH_FIELDS.index(field) for field in fields]
+        rows = self._fetch_chunked(f'''
+            SELECT {JOINED_COLUMNS},
+                   highlight(bookmarks_fts, {columns[0]}, ?1, ?2),
+                   highlight(bookmarks_fts, {columns[1]}, ?1, ?2),
+                   highlight(bookmarks_fts, {columns[2]}, ?1, ?2),
+                   snippet(bookmarks_fts, {columns[3]}, ?1, ?2, '...', ?3)
+            FROM bookmarks_fts
+            JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+            WHERE bookmarks_fts MATCH ?4
+            ORDER BY bm25(bookmarks_fts, {BM25_WEIGHTS}), b.created_at DESC
+        ''', (HIGHLIGHT_START, HIGHLIGHT_END, snippet_tokens, match), chunk_size)
+        width = len(ROW_FIELDS)
+        markers = (HIGHLIGHT_START, HIGHLIGHT_END)
+        return ((bookmark, {field: unfold_markup(getattr(bookmark, field), text, markers,
+                                                 '...' if field == 'description' else '')
+                            for field, text in zip(fields, texts) if text})
+                for bookmark, texts in ((self._hydrate(row[:width]), row[width:]) for row in rows))
+    
+    def search_facets(self, query: str, search_in: str = 'all', limit: int = 10) -> Dict[str, Any]:
+        """Count the results of a search per tag, per domain and per month created.
+
+        The counts come from grouped SQL over the ids the search matches, in
+        one statement, without loading the bookmarks themselves. Returns a
+        dict with 'total' hits and, for each of FACET_NAMES, up to ``limit``
+        (value, hits) pairs: tags and domains most frequent first, months
+        ('YYYY-MM', local time) newest first.
+        """
+        facets: Dict[str, Any] = {'total': 0}
+        facets.update((name, []) for name in FACET_NAMES)
+        rows = self._cached(('facets', query, search_in, limit),
+                            lambda: self._fetch_facet_rows(query, search_in, limit))
+        for name, value, count in rows:
+            if name == 'total':
+                facets['total'] = count
+            else:
+                facets[name].append((value, count))
+        return facets
+    
+    def _fetch_facet_rows(self, query: str, search_in: str, limit: int) -> List[Tuple[str, Any, int]]:
+        if self.fts_enabled:
+            match = self._build_match_query(query, search_in)
+            if match is None:
+                return []
+            hits = 'SELECT rowid FROM bookmarks_fts WHERE bookmarks_fts MATCH ?'
+            params: List[Any] = [match]
+        else:
+            fields = self._like_fields(search_in)
+            hits = 'SELECT id FROM bookmarks WHERE ' + ' OR '.join(
+                f'{FOLDED_COLUMNS[field]} LIKE ?' for field in fields)
+            params = [f'%{fold(query)}%'] * len(fields)
+        
+        return self.get_connection().execute(f'''
+            WITH hits (id) AS ({hits})
+            SELECT 'total', NULL, COUNT(*) FROM hits
+            UNION ALL SELECT * FROM (
+                SELECT 'tags', t.name, COUNT(*) AS n FROM hits
+                JOIN bookmark_tags bt ON bt.bookmark_id = hits.id
+                JOIN tags t ON t.id = bt.tag_id
+                GROUP BY t.id ORDER BY n DESC, t.name LIMIT ?
+            )
+            UNION ALL SELECT * FROM (
+                SELECT 'domains', b.domain, COUNT(*) AS n FROM hits
+                JOIN bookmarks b ON b.id = hits.id
+                GROUP BY b.domain ORDER BY n DESC, b.domain LIMIT ?
+            )
+            UNION ALL SELECT * FROM (
+                SELECT 'months', strftime('%Y-%m', b.created_at, 'unixepoch', 'localtime') AS month,
+                       COUNT(*) FROM hits
+                JOIN bookmarks b ON b.id = hits.id
+                GROUP BY month ORDER BY month DESC LIMIT ?
+            )
+        ''', params + [limit] * len(FACET_NAMES)).fetchall()
+    
+    def iter_query(self, text: str, chunk_size: int = 500) -> Iterator[Bookmark]:
+        """Yield bookmarks matching a structured query (see the query module).
+
+        The query compiles to a single statement: full-text terms become one
+        FTS5 MATCH that also ranks the results, the rest become indexed
+        WHERE conditions, and every row it returns is a match. Raises
+        QuerySyntaxError for malformed queries and unknown field names.
+        """
+        compiled = compile_query(parse_query(text), self.fts_enabled)
+        params = list(compiled.params)
+        if compiled.match is not None:
+            sql = f'''
+                SELECT {JOINED_COLUMNS} FROM bookmarks_fts
+                JOIN bookmarks b ON b.id = bookmarks_fts.rowid
+                WHERE bookmarks_fts MATCH ?
+            '''
+            params.insert(0, compiled.match)
+            order = f'bm25(bookmarks_fts, {BM25_WEIGHTS}), b.created_at DESC'
+        else:
+            sql = f'SELECT {JOINED_COLUMNS} FROM bookmarks b WHERE 1'
+            order = 'b.created_at DESC, b.id DESC'
+        
+        for condition in compiled.where:
+            sql += f' AND {condition}'
+        sql += f' ORDER BY {order}'
+        
+        return self._iter_rows(sql, params, chunk_size)
+    
+    @staticmethod
+    def _build_match_query(query: str, search_in: str = 'all') -> Optional[str]:
+        """Turn free text into an FTS5 MATCH expression of quoted prefix terms.
+
+        The index holds the folded columns, so the terms are folded too.
+        """
+        terms = ['"{}"*'.format(term.replace('"', '""')) for term in fold(query).split()]
+        if not terms:
+            return None
+        
+        expression = ' '.join(terms)
+        if search_in in SEARCH_FIELDS:
+            expression = f'{{{FOLDED_COLUMNS[search_in]}}} : ({expression})'
+        return expression
+    
+    def _iter_search_like(self, query: str, fields: Tuple[str, ...],
+                          chunk_size: int = 500) -> Iterator[Bookmark]:
+        """Search the folded columns with LIKE scans when no index can answer the query."""
+        where_clause = ' OR '.join(f'{FOLDED_COLUMNS[field]} LIKE ?' for field in fields)
+        sql = f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks WHERE {where_clause} ORDER BY created_at DESC'
+        return self._iter_rows(sql, [f'%{fold(query)}%'] * len(fields), chunk_size)
+    
+    @staticmethod
+    def _like_fields(search_in: str, all_fields: Tuple[str, ...] = SEARCH_FIELDS) -> Tuple[str, ...]:
+        """Resolve a search_in value to the columns to scan."""
+        if search_in == 'all':
+            return all_fields
+        if search_in not in SEARCH_FIELDS:
+            raise ValueError(f"Unknown search field: {search_in}")
+        return (search_in,)
+    
+    def iter_substring(self, query: str, search_in: str = 'all',
+                       chunk_size: int = 500) -> Iterator[Bookmark]:
+        """Yield bookmarks containing query as a substring, newest first.
+
+        Matching ignores case and accents: the query is folded and compared
+        with the folded copies of the columns.
+
+        'all' covers title, URL and tags. Queries of three or more characters
+        on those fields are answered by the trigram index; shorter ones, the
+        description field, and SQLite builds without the trigram tokenizer
+        fall back to LIKE scans.
+        """
+        fields = self._like_fields(search_in, TRIGRAM_FIELDS)
+        expression = substring_expression(fold(query))
+        if (expression is None or not self.trigram_enabled or
+                not set(fields) <= set(TRIGRAM_FIELDS)):
+            return self._iter_search_like(query, fields, chunk_size)
+        
+        if search_in != 'all':
+            expression = f'{{{FOLDED_COLUMNS[search_in]}}} : {expression}'
+        return self._iter_rows(f'''
+            SELECT {JOINED_COLUMNS} FROM bookmarks_trigram
+            JOIN bookmarks b ON b.id = bookmarks_trigram.rowid
+            WHERE bookmarks_trigram MATCH ?
+            ORDER BY b.created_at DESC
+        ''', (expression,), chunk_size)
+    
+    def fuzzy_search(self, query: str, search_in: str = 'all',
+                     threshold: float = DEFAULT_THRESHOLD,
+                     candidates: int = 500) -> List[Tuple[Bookmark, float]]:
+        """Find bookmarks resembling the query despite typos, most similar first.
+
+        The trigram index picks the ``candidates`` rows sharing the most
+        trigrams with the query; each is then scored with
+        trigram.similarity and kept if it reaches ``threshold`` (0..1).
+        Without a usable index every bookmark is scored instead.
+        Returns (bookmark, similarity) pairs.
+        """
+        return self._cached(('fuzzy', query, search_in, threshold, candidates),
+                            lambda: self._fuzzy_search(query, search_in, threshold, candidates))
+    
+    def _fuzzy_search(self, query: str, search_in: str, threshold: float,
+                      candidates: int) -> List[Tuple[Bookmark, float]]:
+        fields = self._like_fields(search_in, TRIGRAM_FIELDS)
+        expression = match_any_expression(query)
+        if (expression is None or not self.trigram_enabled or
+                not set(fields) <= set(TRIGRAM_FIELDS)):
+            rows = self.iter_bookmarks()
+        else:
+            if search_in != 'all':
+                expression = f'{{{FOLDED_COLUMNS[search_in]}}} : ({expression})'
+            rows = self._iter_rows(f'''
+                SELECT {JOINED_COLUMNS} FROM bookmarks_trigram
+                JOIN bookmarks b ON b.id = bookmarks_trigram.rowid
+                WHERE bookmarks_trigram MATCH ?
+                ORDER BY rank LIMIT ?
+            ''', (expression, candidates), candidates)
+        
+        results = []
+        for bookmark in rows:
+            score = similarity(query, [getattr(bookmark, field) for field in fields])
+            if score >= threshold:
+                results.append((bookmark, score))
+        results.sort(key=lambda result: (-result[1], -result[0].visit_count))
+        return results
+    
+    def complete(self, prefix: str, field: str = 'title', limit: int = 10) -> List[Tuple[str, int]]:
+        """Suggest titles, tags or domains starting with a prefix, most visited first.
+
+        Each field is a range scan on an index (over the folded text for
+        titles and tags, so case and accents are ignored), so the cost
+        depends on how many values share the prefix rather than on the size
+        of the collection. Returns
+        (value, visit count) pairs; a tag's or domain's count is the total
+        over its bookmarks.
+        """
+        if field not in COMPLETION_FIELDS:
+            raise ValueError(f"Unknown completion field: {field}")
+        return self._cached(('complete', prefix, field, limit),
+                            lambda: self._complete(prefix, field, limit))
+    
+    def _complete(self, prefix: str, field: str, limit: int) -> List[Tuple[str, int]]:
+        conn = self.get_connection()
+        if field == 'title':
+            prefix = fold(prefix)
+            return conn.execute('''
+                SELECT title, MAX(visit_count) AS visits FROM bookmarks
+                WHERE title_folded >= ? AND title_folded < ?
+                GROUP BY title_folded
+                ORDER BY visits DESC, title_folded
+                LIMIT ?
+            ''', (prefix, prefix + _PREFIX_END, limit)).fetchall()
+        if field == 'tag':
+            prefix = fold(prefix)
+            return conn.execute('''
+                SELECT name, visit_count FROM tags
+                WHERE folded >= ? AND folded < ? AND bookmark_count > 0
+                ORDER BY visit_count DESC, bookmark_count DESC, folded
+                LIMIT ?
+            ''', (prefix, prefix + _PREFIX_END, limit)).fetchall()
+        
+        prefix = normalize_domain(prefix)
+        return conn.execute('''
+            SELECT domain, SUM(visit_count) AS visits FROM bookmarks
+            WHERE domain >= ? AND domain < ?
+            GROUP BY domain
+            ORDER BY visits DESC, domain
+            LIMIT ?
+        ''', (prefix, prefix + _PREFIX_END, limit)).fetchall()
+    
+    def update_related_index(self, batch_size: int = 500) -> int:
+        """Compute term vectors for bookmarks queued by the related triggers.
+
+        Adding or editing a bookmark only queues its id; the text is
+        tokenized here, in batches, and just for the queued bookmarks.
+        Returns how many bookmarks were (re)indexed.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        indexed = 0
+        while True:
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row[0] for row in cursor.execute(
+                    'SELECT bookmark_id FROM related_queue LIMIT ?', (batch_size,))]
+                if not ids:
+                    conn.commit()
+                    return indexed
+                
+                placeholders = ', '.join('?' for _ in ids)
+                cursor.execute(f'DELETE FROM bookmark_terms WHERE bookmark_id IN ({placeholders})', ids)
+                cursor.execute(f'SELECT {BOOKMARK_COLUMNS} FROM bookmarks WHERE id IN ({placeholders})', ids)
+                postings = [(term, row[0], tf) for row in cursor.fetchall()
+                            for term, tf in term_frequencies(Bookmark.from_row(row)).items()]
+                cursor.executemany('INSERT INTO bookmark_terms (term, bookmark_id, tf) VALUES (?, ?, ?)',
+                                   postings)
+                
+                # Norms use the document frequencies as of now; reindex refreshes them
+                total = cursor.execute('SELECT total FROM bookmark_stats WHERE id = 1').fetchone()[0]
+                cursor.execute(f'''
+                    SELECT p.bookmark_id, p.tf, d.df FROM bookmark_terms p
+                    JOIN term_df d ON d.term = p.term
+                    WHERE p.bookmark_id IN ({placeholders})
+                ''', ids)
+                terms: Dict[int, List[Tuple[float, int]]] = {}
+                for bookmark_id, tf, df in cursor.fetchall():
+                    terms.setdefault(bookmark_id, []).append((tf, df))
+                cursor.executemany('INSERT OR REPLACE INTO related_vectors (bookmark_id, norm) VALUES (?, ?)',
+                                   [(bookmark_id, vector_norm(pairs, total))
+                                    for bookmark_id, pairs in terms.items()])
+                cursor.executemany('DELETE FROM related_vectors WHERE bookmark_id = ?',
+                                   [(bookmark_id,) for bookmark_id in ids if bookmark_id not in terms])
+                cursor.execute(f'DELETE FROM related_queue WHERE bookmark_id IN ({placeholders})', ids)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            indexed += len(ids)
+    
+    def rebuild_related_index(self) -> int:
+        """Recompute every term vector, refreshing norms after the collection changed."""
+        with self.get_connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO related_queue (bookmark_id) SELECT id FROM bookmarks')
+        return self.update_related_index()
+    
+    def related_bookmarks(self, bookmark_id: int, limit: int = 10,
+                          max_df: float = MAX_DF) -> List[Tuple[Bookmark, float]]:
+        """Find the bookmarks most similar to one, by TF-IDF cosine similarity.
+
+        Only bookmarks sharing a term with this one are scored: the dot
+        products are summed over the postings of its terms in one grouped
+        query. Terms found in more than ``max_df`` of all bookmarks (once
+        that is over MAX_DF_FLOOR bookmarks) are skipped. Returns
+        (bookmark, similarity) pairs, most similar first.
+        """
+        self.update_related_index()
+        conn = self.get_connection()
+        total = self.get_total_count()
+        query_terms = conn.execute('''
+            SELECT p.term, p.tf, d.df FROM bookmark_terms p
+            JOIN term_df d ON d.term = p.term
+            WHERE p.bookmark_id = ?
+        ''', (bookmark_id,)).fetchall()
+        
+        # A term only this bookmark has cannot match anything else
+        max_count = max(MAX_DF_FLOOR, int(max_df * total))
+        weights = [(term, tf * idf(df, total) ** 2) for term, tf, df in query_terms
+                   if 2 <= df <= max_count]
+        if not weights:
+            return []
+        query_norm = vector_norm([(tf, df) for _, tf, df in query_terms], total)
+        
+        values = ', '.join('(?, ?)' for _ in weights)
+        params: List[Any] = [value for pair in weights for value in pair]
+        params.extend([query_norm, bookmark_id, limit])
+        rows = conn.execute(f'''
+            WITH q (term, weight) AS (VALUES {values})
+            SELECT {JOINED_COLUMNS}, s.dot / (v.norm * ?) AS score FROM (
+                SELECT p.bookmark_id, SUM(q.weight * p.tf) AS dot
+                FROM q JOIN bookmark_terms p ON p.term = q.term
+                WHERE p.bookmark_id != ?
+                GROUP BY p.bookmark_id
+            ) s
+            JOIN related_vectors v ON v.bookmark_id = s.bookmark_id
+            JOIN bookmarks b ON b.id = s.bookmark_id
+            ORDER BY score DESC, b.visit_count DESC
+            LIMIT ?
+        ''', params).fetchall()
+        return [(self._hydrate(row[:-1]), min(row[-1], 1.0)) for row in rows]
     
     def update_bookmark(self, bookmark_id: int, updates: Dict[str, Any]) -> bool:
         """Update a bookmark with new values."""
@@ -176,64 +952,140 @@ class DatabaseManager:
         for key, value in updates.items():
             if hasattr(Bookmark, key):
                 set_clauses.append(f'{key} = ?')
-                params.append(value)
+                params.append(to_epoch(value) if isinstance(value, datetime) else value)
         
         if not set_clauses:
             return False
         
+        if 'url' in updates:
+            set_clauses.extend(['domain = ?', 'registrable_domain = ?'])
+            params.extend(self._domain_columns(updates['url']))
+        for field, column in FOLDED_COLUMNS.items():
+            if field in updates:
+                set_clauses.append(f'{column} = ?')
+                params.append(fold(updates[field]))
         set_clauses.append('updated_at = ?')
-        params.append(datetime.now().isoformat())
+        params.append(to_epoch(datetime.now()))
         params.append(bookmark_id)
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(f'UPDATE bookmarks SET {", ".join(set_clauses)} WHERE id = ?', params)
+            updated = cursor.rowcount > 0
+            if updated and 'tags' in updates:
+                self._sync_tags(cursor, bookmark_id, updates['tags'])
+            if updated:
+                self._refresh_collections(cursor, [bookmark_id])
             conn.commit()
-            return cursor.rowcount > 0
+        self._bump_generation()
+        return updated
     
     def delete_bookmark(self, bookmark_id: int) -> bool:
         """Delete a bookmark by ID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM bookmarks WHERE id = ?', (bookmark_id,))
             conn.commit()
-            return cursor.rowcount > 0
+        self._bump_generation()
+        return cursor.rowcount > 0
     
     def delete_bookmark_by_url(self, url: str) -> bool:
         """Delete a bookmark by URL."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM bookmarks WHERE url = ?', (url,))
             conn.commit()
-            return cursor.rowcount > 0
+        self._bump_generation()
+        return cursor.rowcount > 0
     
     def increment_visit_count(self, bookmark_id: int) -> bool:
-        """Increment the visit count for a bookmark."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Increment the visit count for a bookmark.
+
+        With a visit buffer attached the increment is only recorded, and
+        written together with others once the buffer is due.
+        """
+        if self.visit_buffer is not None and self.get_connection().execute(
+                'SELECT 1 FROM bookmarks WHERE id = ?', (bookmark_id,)).fetchone() is None:
+            # Checked before buffering, as the flush would drop the visit silently
+            return False
+        
+        # Cached results carry visit counts, pending ones included
+        self._bump_generation()
+        if self.visit_buffer is not None:
+            if self.visit_buffer.record(bookmark_id):
+                self.flush_visits()
+            return True
+        
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('UPDATE bookmarks SET visit_count = visit_count + 1 WHERE id = ?', (bookmark_id,))
+            updated = cursor.rowcount > 0
+            if updated:
+                self._refresh_collections(cursor, [bookmark_id], visits_only=True)
             conn.commit()
-            return cursor.rowcount > 0
+            return updated
+    
+    def flush_visits(self) -> int:
+        """Write buffered visit increments in one batched UPDATE.
+
+        Returns the number of visits written.
+        """
+        if self.visit_buffer is None or not len(self.visit_buffer):
+            return 0
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # Claim under the write lock so two processes never apply the same spool
+        cursor.execute('BEGIN IMMEDIATE')
+        counts: Dict[int, int] = {}
+        try:
+            counts = self.visit_buffer.claim()
+            cursor.executemany('UPDATE bookmarks SET visit_count = visit_count + ? WHERE id = ?',
+                               [(count, bookmark_id) for bookmark_id, count in counts.items()])
+            self._refresh_collections(cursor, list(counts), visits_only=True)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            self.visit_buffer.requeue(counts)
+            raise
+        self.visit_buffer.commit_claim()
+        self._bump_generation()
+        return sum(counts.values())
+    
+    def _hydrate(self, row: Tuple) -> Bookmark:
+        """Turn a BOOKMARK_COLUMNS row into a Bookmark, including pending visits."""
+        bookmark = Bookmark.from_row(row)
+        if self.visit_buffer is not None and len(self.visit_buffer):
+            bookmark.visit_count += self.visit_buffer.pending(bookmark.id)
+        return bookmark
     
     def get_bookmark_stats(self) -> Dict[str, Any]:
-        """Get statistics about bookmarks."""
-        with sqlite3.connect(self.db_path) as conn:
+        """Get statistics about bookmarks.
+
+        Counts come from the trigger-maintained bookmark_stats row and the
+        rest from single index lookups, so this does not grow with the table.
+        """
+        self.flush_visits()
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('SELECT COUNT(*) as total FROM bookmarks')
-            total = cursor.fetchone()[0]
+            cursor.execute('SELECT total, visited FROM bookmark_stats WHERE id = 1')
+            total, visited = cursor.fetchone()
             
-            cursor.execute('SELECT COUNT(*) as total FROM bookmarks WHERE visit_count > 0')
-            visited = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT MAX(visit_count) as max_visits FROM bookmarks')
-            max_visits = cursor.fetchone()[0] or 0
-            
-            cursor.execute('SELECT title, url, visit_count FROM bookmarks ORDER BY visit_count DESC LIMIT 1')
+            cursor.execute('''
+                SELECT title, url, visit_count FROM bookmarks
+                ORDER BY visit_count DESC, id DESC LIMIT 1
+            ''')
             most_visited = cursor.fetchone()
+            max_visits = most_visited[2] if most_visited else 0
             
-            cursor.execute('SELECT title, url, created_at FROM bookmarks ORDER BY created_at DESC LIMIT 1')
+            cursor.execute('''
+                SELECT title, url, created_at FROM bookmarks
+                ORDER BY created_at DESC, id DESC LIMIT 1
+            ''')
             recent = cursor.fetchone()
+            if recent:
+                recent = (recent[0], recent[1], from_epoch(recent[2]))
             
             return {
                 'total': total,
@@ -243,23 +1095,227 @@ class DatabaseManager:
                 'recent': recent
             }
     
-    def get_all_tags(self) -> List[str]:
-        """Get all unique tags from bookmarks."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT tags FROM bookmarks WHERE tags IS NOT NULL')
-            rows = cursor.fetchall()
+    def recompute_stats(self) -> Dict[str, Tuple[int, int]]:
+        """Recount the maintained counters with full scans and repair any drift.
+
+        Returns the counters that were wrong as {name: (stored, actual)}; tag
+        counters are reported as 'tag:<name>' and their visit totals as
+        'tag-visits:<name>'.
+        """
+        self.flush_visits()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            stored = cursor.execute('SELECT total, visited FROM bookmark_stats WHERE id = 1').fetchone()
+            actual = cursor.execute('''
+                SELECT COUNT(*), COUNT(CASE WHEN visit_count > 0 THEN 1 END) FROM bookmarks
+            ''').fetchone()
+            drift = {name: (old, new) for name, old, new in zip(('total', 'visited'), stored, actual)
+                     if old != new}
             
-            tags = set()
-            for row in rows:
-                if row[0]:
-                    tags.update(tag.strip() for tag in row[0].split(','))
+            cursor.execute('''
+                SELECT t.name, t.bookmark_count, COUNT(bt.bookmark_id)
+                FROM tags t LEFT JOIN bookmark_tags bt ON bt.tag_id = t.id
+                GROUP BY t.id
+                HAVING t.bookmark_count != COUNT(bt.bookmark_id)
+            ''')
+            for name, old, new in cursor.fetchall():
+                drift[f'tag:{name}'] = (old, new)
             
-            return sorted(list(tags))
+            cursor.execute('''
+                SELECT t.name, t.visit_count, COALESCE(SUM(b.visit_count), 0) AS actual
+                FROM tags t
+                LEFT JOIN bookmark_tags bt ON bt.tag_id = t.id
+                LEFT JOIN bookmarks b ON b.id = bt.bookmark_id
+                GROUP BY t.id
+                HAVING t.visit_count != actual
+            ''')
+            for name, old, new in cursor.fetchall():
+                drift[f'tag-visits:{name}'] = (old, new)
+            
+            if drift:
+                cursor.execute('''
+                    UPDATE bookmark_stats SET total = ?, visited = ? WHERE id = 1
+                ''', actual)
+                cursor.execute('''
+                    UPDATE tags SET bookmark_count = (
+                        SELECT COUNT(*) FROM bookmark_tags WHERE tag_id = tags.id
+                    ), visit_count = (
+                        SELECT COALESCE(SUM(b.visit_count), 0) FROM bookmark_tags bt
+                        JOIN bookmarks b ON b.id = bt.bookmark_id
+                        WHERE bt.tag_id = tags.id
+                    )
+                ''')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if drift:
+            self._bump_generation()
+        return drift
+    
+    def create_collection(self, name: str, query: str, search_in: str = 'all') -> int:
+        """Save a search as a named collection and fill in its members.
+
+        ``query`` uses the query language (see the query module); plain words
+        only match ``search_in`` when it names a field. Members are kept up
+        to date as bookmarks change. Returns how many bookmarks it holds.
+        Raises QuerySyntaxError for a malformed query and ValueError if the
+        name is taken.
+        """
+        self._like_fields(search_in)
+        parse_query(query)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('''
+                    INSERT INTO collections (name, query, search_in, created_at) VALUES (?, ?, ?, ?)
+                ''', (name, query, search_in, to_epoch(datetime.now())))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Collection already exists: {name}") from None
+            collection_id = cursor.lastrowid
+            self._refresh_collections(cursor, None, [(collection_id, query, search_in)])
+            cursor.execute('SELECT COUNT(*) FROM collection_members WHERE collection_id = ?',
+                           (collection_id,))
+            size = cursor.fetchone()[0]
+        self._bump_generation()
+        return size
+    
+    def delete_collection(self, name: str) -> bool:
+        """Delete a collection; its bookmarks are left alone."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM collections WHERE name = ?', (name,))
+        self._bump_generation()
+        return cursor.rowcount > 0
+    
+    def get_collections(self) -> List[Tuple[str, str, str, int]]:
+        """Get (name, query, search_in, bookmark count) for every collection, by name."""
+        return self.get_connection().execute('''
+            SELECT c.name, c.query, c.search_in, COUNT(m.bookmark_id) FROM collections c
+            LEFT JOIN collection_members m ON m.collection_id = c.id
+            GROUP BY c.id
+            ORDER BY c.name
+        ''').fetchall()
+    
+    def iter_collection(self, name: str, chunk_size: int = 500) -> Iterator[Bookmark]:
+        """Yield a collection's bookmarks, newest first. Raises ValueError for unknown names."""
+        row = self.get_connection().execute('SELECT id FROM collections WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"Unknown collection: {name}")
+        return self._iter_rows(f'''
+            SELECT {JOINED_COLUMNS} FROM collection_members m
+            JOIN bookmarks b ON b.id = m.bookmark_id
+            WHERE m.collection_id = ?
+            ORDER BY b.created_at DESC, b.id DESC
+        ''', row, chunk_size)
+    
+    def refresh_collections(self) -> int:
+        """Re-evaluate every collection against all bookmarks. Returns the number of collections."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            refreshed = self._refresh_collections(cursor, None)
+        self._bump_generation()
+        return refreshed
+    
+    def _refresh_collections(self, cursor: sqlite3.Cursor, ids: Optional[List[int]],
+                             collections: Optional[List[Tuple[int, str, str]]] = None,
+                             visits_only: bool = False) -> int:
+        """Re-evaluate collection membership of the given bookmark ids (None: all of them).
+
+        Writes call this with just the ids they changed, so the saved queries
+        only run against those rows. ``visits_only`` skips collections whose
+        query cannot depend on visit counts. Returns how many were refreshed.
+        """
+        if collections is None:
+            collections = cursor.execute('SELECT id, query, search_in FROM collections').fetchall()
+        refreshed = 0
+        for collection_id, text, search_in in collections:
+            query = with_default_field(parse_query(text), search_in)
+            if visits_only and not uses_visits(query):
+                continue
+            where, params = self._collection_where(query, ids)
+            if ids is None:
+                cursor.execute('DELETE FROM collection_members WHERE collection_id = ?', (collection_id,))
+            else:
+                placeholders = ', '.join('?' for _ in ids)
+                cursor.execute(f'''
+                    DELETE FROM collection_members
+                    WHERE collection_id = ? AND bookmark_id IN ({placeholders})
+                ''', [collection_id, *ids])
+            cursor.execute(f'''
+                INSERT INTO collection_members (collection_id, bookmark_id)
+                SELECT ?, b.id FROM bookmarks b WHERE {where}
+            ''', [collection_id, *params])
+            refreshed += 1
+        return refreshed
+    
+    def _collection_where(self, query: Query, ids: Optional[List[int]]) -> Tuple[str, List[Any]]:
+        """WHERE clause over bookmarks ``b`` selecting a saved query's matches among ``ids``."""
+        compiled = compile_query(query, self.fts_enabled)
+        conditions = list(compiled.where)
+        params = list(compiled.params)
+        if compiled.match is not None:
+            if ids is None:
+                conditions.insert(0, 'b.id IN (SELECT rowid FROM bookmarks_fts WHERE bookmarks_fts MATCH ?)')
+            else:
+                # Checks the index for these rows only instead of collecting every match
+                conditions.insert(0, '''EXISTS (
+                    SELECT 1 FROM bookmarks_fts WHERE bookmarks_fts MATCH ? AND rowid = b.id
+                )''')
+            params.insert(0, compiled.match)
+        if ids is not None:
+            conditions.append(f"b.id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        return ' AND '.join(conditions) or '1', params
+    
+    def get_all_tags(self) -> List[str]:
+        """Get all tags that are in use, sorted by name."""
+        return [name for name, _ in self.get_tag_counts()]
+    
+    def get_tag_counts(self) -> List[Tuple[str, int]]:
+        """Get (tag, bookmark count) pairs for all tags that are in use."""
+        return self._cached(('tag_counts',), self._fetch_tag_counts)
+    
+    def _fetch_tag_counts(self) -> List[Tuple[str, int]]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT name, bookmark_count FROM tags
+                WHERE bookmark_count > 0
+                ORDER BY name
+            ''')
+            return cursor.fetchall()
+    
+    def get_domain_stats(self, limit: Optional[int] = None,
+                         registrable: bool = False) -> List[Tuple[str, int, int]]:
+        """Get (domain, bookmarks, visits) rows, most bookmarked domains first.
+
+        With ``registrable``, subdomains are counted under the domain their
+        owner registered (docs.python.org under python.org).
+        """
+        column = 'registrable_domain' if registrable else 'domain'
+        return self._cached(('domains', limit, registrable), lambda: self.get_connection().execute(f'''
+            SELECT {column}, COUNT(*) AS bookmarks, SUM(visit_count) FROM bookmarks
+            GROUP BY {column}
+            ORDER BY bookmarks DESC, {column}
+            LIMIT ?
+        ''', (-1 if limit is None else limit,)).fetchall())
+    
+    def get_bookmarks_by_tags(self, tags: List[str], match_all: bool = True) -> List[Bookmark]:
+        """Get bookmarks carrying all (or, with match_all=False, any) of the given tags."""
+        return self._cached(
+            ('tags', tuple(tags), match_all),
+            lambda: list(self.iter_bookmarks({'tags': tags, 'match_all': match_all})))
     
-    def get_total_count(self) -> int:
-        """Get total number of bookmarks."""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_total_count(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Get total number of bookmarks, or of those matching iter_bookmarks filters."""
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM bookmarks')
+            if filters:
+                where, params = self._filter_clause(filters)
+                cursor.execute(f'SELECT COUNT(*) FROM bookmarks {where}', params)
+            else:
+                cursor.execute('SELECT total FROM bookmark_stats WHERE id = 1')
             return cursor.fetchone()[0]
\ No newline at end of file
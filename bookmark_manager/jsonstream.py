@@ -0,0 +1,218 @@
+"""
+Streaming JSON for exports and imports.
+
+``json.dump`` and ``json.load`` need the whole document in memory, so a
+large collection would be held at least twice: once as objects and once as
+dicts. The writer here encodes and writes the array a chunk of items at a
+time, producing the same text ``json.dump`` would, and the reader yields
+the items of a top-level array one by one. Memory stays flat regardless of
+how many items there are.
+
+Reading uses ijson when it is installed (``pip install ijson``) and
+otherwise a buffered reader built on ``JSONDecoder.raw_decode``.
+
+Newline-delimited JSON (NDJSON) holds one compact item per line instead of
+one array, so files can be appended to, split and read from either end
+without parsing the rest.
+"""
+
+import codecs
+import json
+import os
+import re
+from itertools import chain, islice
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, TextIO
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Compact output: no indentation and no spaces after separators
+COMPACT_SEPARATORS = (',', ':')
+
+
+def write_json_array(items: Iterable[Any], f: TextIO, indent: Optional[int] = 2,
+                     chunk_size: int = 500) -> int:
+    """Write items to f as one JSON array and return how many were written.
+
+    The text equals ``json.dump(list(items), f, indent=indent,
+    ensure_ascii=False)``; indent=None writes compact JSON with
+    COMPACT_SEPARATORS instead. Items are encoded ``chunk_size`` at a time:
+    each chunk is encoded as an array of its own, whose brackets are dropped
+    so the items keep the indentation they have inside the full array.
+    """
+    if indent is None:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=COMPACT_SEPARATORS)
+        opening, separator, closing = '[', ',', ']'
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=indent)
+        newline = '\n' + ' ' * indent
+        opening, separator, closing = '[' + newline, ',' + newline, '\n]'
+
+    count = 0
+    for chunk in _chunks(items, chunk_size):
+        f.write(separator if count else opening)
+        f.write(encoder.encode(chunk)[len(opening):-len(closing)])
+        count += len(chunk)
+    f.write(closing if count else '[]')
+    return count
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# An item decoded or failing this close to the end of the buffer may be a
+# literal, number or escape cut off by it (the longest literal is -Infinity)
+_CUT_OFF_MARGIN = len('-Infinity')
+
+
+def iter_json_array(f: BinaryIO, chunk_size: int = 64 * 1024,
+                    use_ijson: bool = True) -> Iterator[Any]:
+    """Yield the items of the JSON array in a binary file, one at a time.
+
+    Raises ValueError if the document is not an array or is malformed;
+    items before the error have already been yielded by then.
+    """
+    if use_ijson and ijson is not None:
+        return _iter_ijson(f)
+    return _iter_array(f, chunk_size)
+
+
+def _iter_ijson(f: BinaryIO) -> Iterator[Any]:
+    """ijson reader, raising ValueError like the built-in one."""
+    try:
+        events = ijson.parse(f, use_float=True)
+        first = next(events, None)
+        if first is None or first[1] != 'start_array':
+            raise ValueError("Expected a JSON array")
+        yield from ijson.items(chain([first], events), 'item')
+    except ijson.JSONError as e:
+        # yajl messages continue with a picture of where the error is
+        raise ValueError(str(e).split('\n', 1)[0]) from e
+
+
+def _iter_array(f: BinaryIO, chunk_size: int) -> Iterator[Any]:
+    """Buffered reader: raw_decode each item, reading more text when one is cut off."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    position = 0
+    # Characters already dropped from the front of the buffer
+    offset = 0
+    eof = False
+
+    def fill() -> bool:
+        """Append the next chunk to the buffer, dropping what was consumed."""
+        nonlocal buffer, position, offset, eof
+        if eof:
+            return False
+        data = f.read(chunk_size)
+        eof = not data
+        buffer = buffer[position:] + text.decode(data, final=eof)
+        offset += position
+        position = 0
+        return True
+
+    def next_token() -> str:
+        """Skip whitespace and return the next character ('' at the end)."""
+        nonlocal position
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or not fill():
+                return buffer[position:position + 1]
+
+    def check_end():
+        """Step past the closing bracket; only whitespace may follow it."""
+        nonlocal position
+        position += 1
+        if next_token():
+            raise ValueError(f"Extra data at character {offset + position}")
+
+    if next_token() != '[':
+        raise ValueError("Expected a JSON array")
+    position += 1
+    if next_token() == ']':
+        check_end()
+        return
+
+    while True:
+        next_token()
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Read more only if the end of the buffer may have cut the item
+            # off; an error with text after it is final, so a malformed
+            # item does not pull the rest of the file into memory
+            cut_off = (len(buffer) - e.pos <= _CUT_OFF_MARGIN or
+                       e.msg.startswith('Unterminated string'))
+            if cut_off and fill():
+                continue
+            raise ValueError(f"{e.msg} at character {offset + e.pos}") from None
+        if len(buffer) - end < _CUT_OFF_MARGIN and fill():
+            # A number or literal may continue in the next chunk, even past
+            # a prefix that decodes on its own ("1.5" of "1.5e3")
+            continue
+        position = end
+        yield item
+
+        token = next_token()
+        if token == ']':
+            check_end()
+            return
+        if token != ',':
+            raise ValueError(f"Expected ',' or ']' at character {offset + position}")
+        position += 1
+
+
+def write_ndjson(items: Iterable[Any], f: TextIO, chunk_size: int = 500) -> int:
+    """Write each item as one line of compact JSON and return how many were written."""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=COMPACT_SEPARATORS).encode
+    count = 0
+    for chunk in _chunks(items, chunk_size):
+        f.write(''.join(encode(item) + '\n' for item in chunk))
+        count += len(chunk)
+    return count
+
+
+def iter_ndjson(f: BinaryIO) -> Iterator[Any]:
+    """Yield the item on each non-blank line of a binary file, first line first.
+
+    Raises ValueError naming the first line that is not valid JSON.
+    """
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: {e}") from None
+
+
+def iter_ndjson_reversed(f: BinaryIO, block_size: int = 64 * 1024) -> Iterator[Any]:
+    """Yield the items of a binary NDJSON file from the last line back.
+
+    Blocks are read from the end of the file, so reading the last few items
+    costs the same however long the file is.
+    """
+    position = f.seek(0, os.SEEK_END)
+    # Start of the earliest block read so far, possibly only part of a line
+    partial = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        lines = (f.read(size) + partial).split(b'\n')
+        partial = lines.pop(0)
+        for line in reversed(lines):
+            if line.strip():
+                yield json.loads(line)
+    if partial.strip():
+        yield json.loads(partial)
@@ -3,7 +3,8 @@
 import argparse
 import sys
 import os
-from typing import Optional, List
+from itertools import chain, islice
+from typing import Optional, List, Iterable, Callable, Dict
 from datetime import datetime
 from colorama import Fore
 
@@ -14,11 +15,18 @@ if os.name == 'nt':  # Windows
 # Import modules directly for Windows compatibility
 from database import DatabaseManager
 from models import Bookmark
+from visits import VisitBuffer
+from cache import ResultCache, load_stats
+from trigram import DEFAULT_THRESHOLD
+from query import QuerySyntaxError
+from compression import (CODECS, DECOMPRESSION_ERRORS, add_suffix, check_level, decompressed,
+                          file_codec, strip_suffix)
 from utils import (
     validate_url, fetch_title_from_url, open_url_in_browser,
-    export_to_json, export_to_csv, import_from_json, import_from_csv,
-    display_bookmarks, display_stats, display_tags,
-    print_success, print_error, print_warning, print_info,
+    export_to_json, export_to_ndjson, export_to_csv, export_to_html, ndjson_export_mark, IMPORT_FORMATS,
+    display_bookmarks, display_stats, display_tags, display_cache_stats,
+    display_facets, display_domain_stats, display_collections,
+    print_success, print_error, print_warning, print_info, print_progress,
     paginate_list, get_pagination_info, confirm_action
 )
 
@@ -33,7 +41,16 @@ class BookmarkManager:
             home_dir = os.path.expanduser("~")
             db_path = os.path.join(home_dir, db_path)
         
-        self.db = DatabaseManager(db_path)
+        # Visits deferred by short-lived processes are spooled next to the
+        # database; attaching the spool makes every read include them. Search
+        # and tag results are cached there too, so the next run can reuse them
+        self.db = DatabaseManager(db_path, visit_buffer=VisitBuffer(spool_path=db_path + '.visits'),
+                                  cache=ResultCache(path=db_path + '.cache',
+                                                    stats_path=db_path + '.cache-stats'))
+    
+    def close(self):
+        """Release the database connection."""
+        self.db.close()
     
     def add_bookmark(self, url: str, title: Optional[str] = None, 
                     description: Optional[str] = None, tags: Optional[str] = None,
@@ -74,11 +91,58 @@ class BookmarkManager:
             print_error("Failed to add bookmark")
             return False
     
-    def list_bookmarks(self, limit: Optional[int] = None, page: int = 1) -> bool:
-        """List bookmarks with pagination."""
-        offset = (page - 1) * (limit or 10) if limit else 0
-        bookmarks = self.db.get_all_bookmarks(limit=limit, offset=offset)
+    def list_bookmarks(self, limit: Optional[int] = None, page: int = 1,
+                       tags: Optional[List[str]] = None, match_all: bool = True,
+                       sort: str = 'created', reverse: bool = False,
+                       after: Optional[str] = None, before: Optional[str] = None,
+                       domain: Optional[str] = None) -> bool:
+        """List bookmarks, paged by cursor or, with --page, by page number.
+
+        ``tags`` and ``domain`` narrow the listing; filtered listings sort
+        and page the same way as the full one.
+        """
+        filters = {'tags': tags, 'match_all': match_all, 'domain': domain} if tags or domain else None
+        
+        if page > 1 and not (after or before):
+            offset = (page - 1) * (limit or 10)
+            bookmarks = self.db.get_all_bookmarks(limit=limit or 10, offset=offset,
+                                                  sort=sort, reverse=reverse, filters=filters)
+            return self._show_numbered_page(bookmarks, self.db.get_total_count(filters), limit or 10, page)
+        
+        if not (limit or after or before) and filters:
+            matches = self.db.iter_bookmarks(filters, order=sort, reverse=reverse)
+            return display_bookmarks(matches, show_stats=False) > 0
+        
+        if not (limit or after or before):
+            total = self.db.get_total_count()
+            if not total:
+                print_warning("No bookmarks found")
+                return False
+            display_bookmarks(self.db.iter_bookmarks(order=sort, reverse=reverse),
+                              show_stats=False, total=total)
+            return True
+        
+        try:
+            result = self.db.get_bookmarks_page(limit=limit or 10, after=after, before=before,
+                                                sort=sort, reverse=reverse, filters=filters)
+        except ValueError as e:
+            print_error(str(e))
+            return False
         
+        if not result['bookmarks']:
+            print_warning("No bookmarks found")
+            return False
+        
+        display_bookmarks(result['bookmarks'], show_stats=False)
+        if result['prev']:
+            print(f"{Fore.BLUE}Previous page: --before {result['prev']}")
+        if result['next']:
+            print(f"{Fore.BLUE}Next page: --after {result['next']}")
+        return True
+    
+    def _show_numbered_page(self, bookmarks: List[Bookmark], total_count: int,
+                            limit: Optional[int], page: int) -> bool:
+        """Display one offset-paginated page with its page-number footer."""
         if not bookmarks:
             print_warning("No bookmarks found")
             return False
@@ -86,7 +150,6 @@ class BookmarkManager:
         display_bookmarks(bookmarks, show_stats=False)
         
         # Show pagination info
-        total_count = self.db.get_total_count()
         if limit and total_count > limit:
             pagination_info = get_pagination_info(total_count, page, limit or 10)
             print(f"\n{Fore.BLUE}Page {pagination_info['current_page']} of {pagination_info['total_pages']}")
@@ -94,22 +157,129 @@ class BookmarkManager:
         
         return True
     
-    def search_bookmarks(self, query: str, search_in: str = 'all') -> bool:
-        """Search bookmarks."""
+    def search_bookmarks(self, query: str, search_in: str = 'all', fuzzy: bool = False,
+                         threshold: float = DEFAULT_THRESHOLD, substring: bool = False,
+                         facets: bool = False) -> bool:
+        """Search bookmarks by words, by substring, or fuzzily to tolerate typos.
+
+        With ``facets``, word searches also show hit counts per tag, domain
+        and month.
+        """
         if not query.strip():
             print_error("Search query cannot be empty")
             return False
         
-        bookmarks = self.db.search_bookmarks(query, search_in)
+        if facets and (fuzzy or substring):
+            print_error("Facets are only available for word searches")
+            return False
         
-        if not bookmarks:
+        if fuzzy:
+            if not 0 <= threshold <= 1:
+                print_error("Threshold must be between 0 and 1")
+                return False
+            matches = self.db.fuzzy_search(query, search_in, threshold=threshold)
+            if not matches:
+                print_warning(f"No bookmarks similar to '{query}' (threshold {threshold})")
+                return False
+            display_bookmarks([bookmark for bookmark, _ in matches], show_stats=False)
+            print_info(f"Found {len(matches)} bookmarks similar to '{query}' "
+                       f"(best similarity {matches[0][1]:.2f})")
+            return True
+        
+        if substring:
+            results = self.db.iter_substring(query, search_in)
+        else:
+            results = self.db.iter_search_highlighted(query, search_in)
+        first = next(results, None)
+        
+        if first is None:
             print_warning(f"No bookmarks found matching '{query}'")
             return False
         
-        print_info(f"Found {len(bookmarks)} bookmarks matching '{query}'")
-        display_bookmarks(bookmarks, show_stats=False)
+        # Results are printed as they stream in, so the count comes last
+        found = display_bookmarks(chain([first], results), show_stats=False,
+                                  highlighted=not substring)
+        print_info(f"Found {found} bookmarks matching '{query}'")
+        if facets:
+            display_facets(self.db.search_facets(query, search_in))
         return True
     
+    def query_bookmarks(self, text: str, limit: Optional[int] = None) -> bool:
+        """Run a structured query such as 'tag:python -tag:old visits:>5 created:2024..'."""
+        try:
+            results = self.db.iter_query(text)
+        except QuerySyntaxError as e:
+            print_error(f"Invalid query: {e}")
+            return False
+        
+        first = next(results, None)
+        if first is None:
+            print_warning(f"No bookmarks match '{text}'")
+            return False
+        
+        found = display_bookmarks(islice(chain([first], results), limit), show_stats=False)
+        print_info(f"Showing {found} bookmarks matching '{text}'")
+        return True
+    
+    def show_related(self, identifier: str, limit: int = 10) -> bool:
+        """Show the bookmarks most similar to one."""
+        if identifier.isdigit():
+            bookmark = self.db.get_bookmark_by_id(int(identifier))
+        else:
+            bookmark = self.db.get_bookmark_by_url(identifier)
+        
+        if not bookmark:
+            print_error(f"Bookmark not found: {identifier}")
+            return False
+        
+        related = self.db.related_bookmarks(bookmark.id, limit=limit)
+        if not related:
+            print_warning(f"No bookmarks related to: {bookmark.title}")
+            return False
+        
+        print_info(f"Bookmarks related to: {bookmark.title}")
+        display_bookmarks([match for match, _ in related], show_stats=False)
+        print_info("Similarity: " + ', '.join(f"#{match.id} {score:.2f}" for match, score in related))
+        return True
+    
+    def create_collection(self, name: str, query: str, search_in: str = 'all') -> bool:
+        """Save a search as a collection that keeps itself up to date."""
+        try:
+            size = self.db.create_collection(name, query, search_in)
+        except QuerySyntaxError as e:
+            print_error(f"Invalid query: {e}")
+            return False
+        except ValueError as e:
+            print_error(str(e))
+            return False
+        
+        print_success(f"Collection '{name}' created with {size} bookmarks")
+        return True
+    
+    def list_collections(self) -> bool:
+        """List saved collections and how many bookmarks each holds."""
+        display_collections(self.db.get_collections())
+        return True
+    
+    def show_collection(self, name: str, limit: Optional[int] = None) -> bool:
+        """Show the bookmarks in a collection, newest first."""
+        try:
+            bookmarks = self.db.iter_collection(name)
+        except ValueError as e:
+            print_error(str(e))
+            return False
+        
+        found = display_bookmarks(islice(bookmarks, limit), show_stats=False)
+        return found > 0
+    
+    def delete_collection(self, name: str) -> bool:
+        """Delete a collection (its bookmarks stay)."""
+        if self.db.delete_collection(name):
+            print_success(f"Collection '{name}' deleted")
+            return True
+        print_error(f"Unknown collection: {name}")
+        return False
+    
     def update_bookmark(self, identifier: str, title: Optional[str] = None,
                        url: Optional[str] = None, description: Optional[str] = None,
                        tags: Optional[str] = None) -> bool:
@@ -193,8 +363,8 @@ class BookmarkManager:
             print_error("Failed to delete bookmark")
             return False
     
-    def open_bookmark(self, identifier: str) -> bool:
-        """Open bookmark in browser."""
+    def open_bookmark(self, identifier: str, defer_visit: bool = False) -> bool:
+        """Open bookmark in browser, optionally deferring the visit-count write."""
         # Find bookmark by ID or URL
         bookmark = None
         if identifier.isdigit():
@@ -210,43 +380,106 @@ class BookmarkManager:
         
         if open_url_in_browser(bookmark.url):
             self.db.increment_visit_count(bookmark.id)
+            if not defer_visit:
+                self.db.flush_visits()
             print_success("Bookmark opened in browser")
             return True
         else:
             print_error("Failed to open bookmark")
             return False
     
-    def export_bookmarks(self, format_type: str, filename: Optional[str] = None) -> bool:
-        """Export bookmarks to file."""
-        bookmarks = self.db.get_all_bookmarks()
+    def export_bookmarks(self, format_type: str, filename: Optional[str] = None,
+                         compact: bool = False, append: bool = False,
+                         compress: Optional[str] = None, level: Optional[int] = None) -> bool:
+        """Export bookmarks to file.
+
+        NDJSON is written oldest update first; with ``append`` only the
+        bookmarks added or changed since the file's last line are added.
+        Visits do not touch ``updated_at``, so a bookmark whose only change
+        is its visit count is not appended; a full export picks those up.
+        ``compress`` streams the output through gzip, bz2 or xz at ``level``.
+        """
+        if compact and format_type.lower() != 'json':
+            print_error("--compact only applies to JSON export")
+            return False
+        if append and (format_type.lower() != 'ndjson' or not filename):
+            print_error("--append needs --format ndjson and --file")
+            return False
+        if level is not None and not compress:
+            print_error("--level needs --compress")
+            return False
+        if compress:
+            try:
+                level = check_level(compress, level)
+            except ValueError as e:
+                print_error(str(e))
+                return False
         
-        if not bookmarks:
+        count = self.db.get_total_count()
+        
+        if not count:
             print_warning("No bookmarks to export")
             return False
         
+        # Stream rows to the exporter instead of loading the whole collection
+        bookmarks = self.db.iter_bookmarks()
+        
         if not filename:
-            filename = get_default_export_filename(format_type)
+            from utils import get_default_export_filename
+            filename = add_suffix(get_default_export_filename(format_type), compress)
         
         # Handle Windows path
         if os.name == 'nt' and not os.path.isabs(filename):
             # Use current directory
             filename = os.path.join(os.getcwd(), filename)
         
-        if format_type.lower() == 'json':
-            success = export_to_json(bookmarks, filename)
+        if format_type.lower() == 'ndjson':
+            return self._export_ndjson(filename, append, compress, level)
+        elif format_type.lower() == 'json':
+            success = export_to_json(bookmarks, filename, compact, compress, level)
         elif format_type.lower() == 'csv':
-            success = export_to_csv(bookmarks, filename)
+            success = export_to_csv(bookmarks, filename, compress, level)
+        elif format_type.lower() == 'html':
+            success = export_to_html(bookmarks, filename, compress, level)
         else:
             print_error(f"Unsupported export format: {format_type}")
             return False
         
         if success:
-            print_success(f"Exported {len(bookmarks)} bookmarks to {filename}")
+            print_success(f"Exported {count} bookmarks to {filename}")
             return True
         else:
             return False
     
-    def import_bookmarks(self, filename: str) -> bool:
+    def _export_ndjson(self, filename: str, append: bool, compress: Optional[str],
+                       level: Optional[int]) -> bool:
+        """Write bookmarks to an NDJSON file in update order, or append the ones it lacks."""
+        try:
+            since, exported = ndjson_export_mark(filename) if append else (None, {})
+            if since is not None:
+                # New lines must go through the codec the file already uses
+                existing = file_codec(filename)
+                if compress and compress != existing:
+                    raise ValueError(f"file is {existing or 'not'} compressed, not {compress}")
+                compress = existing
+        except (ValueError, KeyError) + DECOMPRESSION_ERRORS as e:
+            print_error(f"Cannot append to {filename}: {e}")
+            return False
+        
+        bookmarks = self.db.iter_bookmarks({'updated_since': since}, order='updated', reverse=True)
+        if since is not None:
+            # Bookmarks updated in the same second as the last line may already
+            # be in the file; they are written again only if they changed since
+            bookmarks = (bookmark for bookmark in bookmarks
+                         if bookmark.updated_at != since or bookmark.to_dict() != exported.get(bookmark.id))
+        
+        written = export_to_ndjson(bookmarks, filename, append, compress, level)
+        if written is None:
+            return False
+        print_success(f"{'Appended' if append else 'Exported'} {written} bookmarks to {filename}")
+        return True
+    
+    def import_bookmarks(self, filename: str, on_duplicate: str = 'skip') -> bool:
         """Import bookmarks from file."""
         # Handle Windows path
         if os.name == 'nt' and not os.path.isabs(filename):
@@ -256,50 +489,122 @@ class BookmarkManager:
             print_error(f"File not found: {filename}")
             return False
         
-        if filename.endswith('.json'):
-            bookmarks = import_from_json(filename)
-        elif filename.endswith('.csv'):
-            bookmarks = import_from_csv(filename)
-        else:
+        # The format comes from the name without any .gz/.bz2/.xz suffix
+        formats = [entry for entry in IMPORT_FORMATS if strip_suffix(filename).endswith(entry[0])]
+        if not formats:
             print_error(f"Unsupported file format: {filename}")
             return False
+        _, name, reader, keep_dates = formats[0]
+        
+        # Decompress, parse and insert as the file is read so memory stays
+        # flat; a malformed file rolls back everything inserted before the error
+        try:
+            with open(filename, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                counts = self._insert_imported(reader(decompressed(f)), on_duplicate,
+                                               lambda: f.tell() / size if size else 1.0, keep_dates)
+        except (ValueError, KeyError, TypeError) + DECOMPRESSION_ERRORS as e:
+            print_error(f"Error importing from {name}: {e}")
+            return False
         
-        if not bookmarks:
+        if not any(counts.values()):
             print_error("No bookmarks found in file")
             return False
         
-        imported_count = 0
-        skipped_count = 0
-        
-        for bookmark in bookmarks:
-            # Check if URL already exists
-            existing = self.db.get_bookmark_by_url(bookmark.url)
-            if existing:
-                print_warning(f"Skipping duplicate: {bookmark.url}")
-                skipped_count += 1
-                continue
-            
-            # Reset ID for new insertion
-            bookmark.id = None
-            bookmark.created_at = datetime.now()
-            bookmark.updated_at = datetime.now()
-            
-            if self.db.add_bookmark(bookmark):
-                imported_count += 1
-        
-        print_success(f"Imported {imported_count} bookmarks, skipped {skipped_count} duplicates")
-        return imported_count > 0
+        print_success(f"Imported {counts['inserted']} bookmarks, updated {counts['updated']}, "
+                      f"skipped {counts['skipped']} duplicates")
+        return counts['inserted'] + counts['updated'] > 0
     
-    def show_stats(self) -> bool:
-        """Show bookmark statistics."""
+    def _insert_imported(self, bookmarks: Iterable[Bookmark], on_duplicate: str,
+                         fraction_read: Optional[Callable[[], float]] = None,
+                         keep_dates: bool = False) -> Dict[str, int]:
+        """Batch-insert imported bookmarks as new rows, reporting progress as batches land.
+
+        Dates are reset to the time of the import unless ``keep_dates``.
+        """
+        now = datetime.now()
+        
+        def prepared():
+            for bookmark in bookmarks:
+                # Reset ID for new insertion
+                bookmark.id = None
+                if not keep_dates:
+                    bookmark.created_at = now
+                    bookmark.updated_at = now
+                yield bookmark
+        
+        def progress(counts: Dict[str, int]):
+            message = f"{sum(counts.values()):,} bookmarks read"
+            if fraction_read:
+                message += f" ({min(fraction_read(), 1.0):.0%} of file)"
+            print_progress(message)
+        
+        counts = self.db.add_bookmarks(prepared(), on_duplicate=on_duplicate, progress=progress)
+        print_progress(f"{sum(counts.values()):,} bookmarks read", done=True)
+        return counts
+    
+    def show_stats(self, recompute: bool = False, by_domain: bool = False, by_site: bool = False,
+                   limit: Optional[int] = None) -> bool:
+        """Show bookmark statistics, optionally verifying them with a full recount.
+
+        ``by_domain`` and ``by_site`` show counts per host name or per
+        registrable domain instead.
+        """
+        if recompute:
+            drift = self.db.recompute_stats()
+            if not drift:
+                print_success("Stored statistics match a full recount")
+            for name, (stored, actual) in drift.items():
+                print_warning(f"Corrected {name}: {stored} -> {actual}")
+        
+        if by_domain or by_site:
+            display_domain_stats(self.db.get_domain_stats(limit, registrable=by_site))
+            return True
+        
         stats = self.db.get_bookmark_stats()
         display_stats(stats)
         return True
     
     def show_tags(self) -> bool:
         """Show all unique tags."""
-        tags = self.db.get_all_tags()
-        display_tags(tags)
+        tag_counts = self.db.get_tag_counts()
+        display_tags([tag for tag, _ in tag_counts], counts=dict(tag_counts))
+        return True
+    
+    def complete(self, prefix: str, field: str = 'title', limit: int = 10) -> bool:
+        """Print completions for a prefix, one per line, for shells and launchers."""
+        for value, _ in self.db.complete(prefix, field, limit):
+            print(value)
+        return True
+    
+    def flush_visits(self) -> bool:
+        """Write deferred visit counts to the database."""
+        flushed = self.db.flush_visits()
+        print_success(f"Recorded {flushed} deferred visits")
+        return True
+    
+    def show_cache_stats(self, reset: bool = False) -> bool:
+        """Show result-cache hit/miss counters accumulated across runs."""
+        stats_path = self.db.cache.stats_path
+        if reset:
+            if os.path.exists(stats_path):
+                os.remove(stats_path)
+            print_success("Cache statistics reset")
+            return True
+        
+        display_cache_stats(load_stats(stats_path), self.db.cache.max_entries,
+                            self.db.cache.max_bytes)
+        return True
+    
+    def rebuild_index(self) -> bool:
+        """Rebuild the full-text search index."""
+        if not self.db.rebuild_search_index():
+            print_error("Full-text search is not available in this SQLite build")
+            return False
+        
+        self.db.rebuild_related_index()
+        self.db.refresh_collections()
+        print_success(f"Search index rebuilt ({self.db.get_total_count()} bookmarks)")
         return True
 
 
@@ -312,13 +617,25 @@ def main():
 Examples:
   %(prog)s add --url "https://github.com" --title "GitHub" --tags "dev,git"
   %(prog)s search "python" --in all
+  %(prog)s search "pyhton" --fuzzy --threshold 0.4
+  %(prog)s search "python" --facets
+  %(prog)s query 'tag:python -tag:old domain:github.com visits:>5 created:2024..2025'
   %(prog)s list --limit 10 --page 1
+  %(prog)s list --tag python --tag async
+  %(prog)s list --domain github.com
+  %(prog)s stats --by-domain --limit 20
+  %(prog)s list --limit 20 --sort visits --after <cursor>
+  %(prog)s related 1 --limit 5
+  %(prog)s complete py --field tag
+  %(prog)s collection create unread-python 'tag:python visits:0'
+  %(prog)s collection show unread-python
   %(prog)s update 1 --title "New Title"
   %(prog)s delete 1
   %(prog)s open 1
   %(prog)s export --format json --file bookmarks.json
-  %(prog)s import --file bookmarks.json
+  %(prog)s import --file bookmarks.json --on-duplicate merge
   %(prog)s stats
+  %(prog)s reindex
         """
     )
     
@@ -337,12 +654,40 @@ Examples:
     list_parser = subparsers.add_parser('list', help='List bookmarks')
     list_parser.add_argument('--limit', type=int, help='Number of bookmarks to show')
     list_parser.add_argument('--page', type=int, default=1, help='Page number for pagination')
+    list_parser.add_argument('--sort', choices=['created', 'updated', 'visits', 'title'],
+                             default='created', help='Sort order (newest, most visited or A-Z first)')
+    list_parser.add_argument('--reverse', action='store_true', help='Reverse the sort order')
+    list_parser.add_argument('--after', metavar='CURSOR', help='Show the page after this cursor')
+    list_parser.add_argument('--before', metavar='CURSOR', help='Show the page before this cursor')
+    list_parser.add_argument('--tag', action='append', dest='tags', metavar='TAG',
+                             help='Only show bookmarks with this exact tag (repeatable)')
+    list_parser.add_argument('--any-tag', action='store_true',
+                             help='Match bookmarks with any of the --tag values instead of all')
+    list_parser.add_argument('--domain', help='Only show bookmarks on this host or its subdomains')
     
     # Search command
     search_parser = subparsers.add_parser('search', help='Search bookmarks')
     search_parser.add_argument('query', help='Search query')
     search_parser.add_argument('--in', choices=['title', 'url', 'description', 'tags', 'all'],
                              default='all', help='Field to search in')
+    search_parser.add_argument('--substring', action='store_true',
+                             help='Match the query anywhere inside title, URL or tags')
+    search_parser.add_argument('--fuzzy', action='store_true',
+                             help='Tolerate typos by ranking on trigram similarity')
+    search_parser.add_argument('--facets', action='store_true',
+                               help='Also show hit counts per tag, domain and month')
+    search_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                             help=f'Minimum similarity for --fuzzy, 0-1 (default: {DEFAULT_THRESHOLD})')
+    
+    # Query command
+    query_parser = subparsers.add_parser('query', help='Search with a structured query')
+    query_parser.add_argument('text', help='Query, e.g. \'tag:python "exact phrase" visits:>5 created:2024..\'')
+    query_parser.add_argument('--limit', type=int, help='Maximum number of results to show')
+    
+    # Related command
+    related_parser = subparsers.add_parser('related', help='Show bookmarks similar to one')
+    related_parser.add_argument('identifier', help='Bookmark ID or URL')
+    related_parser.add_argument('--limit', type=int, default=10, help='Number of bookmarks to show')
     
     # Update command
     update_parser = subparsers.add_parser('update', help='Update a bookmark')
@@ -359,29 +704,82 @@ Examples:
     # Open command
     open_parser = subparsers.add_parser('open', help='Open bookmark in browser')
     open_parser.add_argument('identifier', help='Bookmark ID or URL')
+    open_parser.add_argument('--defer-visit', action='store_true',
+                             help='Spool the visit and write it later in a batch')
     
     # Export command
     export_parser = subparsers.add_parser('export', help='Export bookmarks')
-    export_parser.add_argument('--format', choices=['json', 'csv'], required=True,
+    export_parser.add_argument('--format', choices=['json', 'ndjson', 'csv', 'html'], required=True,
                                help='Export format')
     export_parser.add_argument('--file', help='Output filename')
+    export_parser.add_argument('--compact', action='store_true',
+                               help='Write JSON without indentation or spaces')
+    export_parser.add_argument('--append', action='store_true',
+                               help='Add bookmarks new or changed since the NDJSON file was written '
+                                    '(visit counts alone do not count as changes)')
+    export_parser.add_argument('--compress', choices=list(CODECS),
+                               help='Compress the output (adds .gz, .bz2 or .xz to default file names)')
+    export_parser.add_argument('--level', type=int,
+                               help='Compression level (gzip and xz 0-9, bz2 1-9)')
     
     # Import command
     import_parser = subparsers.add_parser('import', help='Import bookmarks')
-    import_parser.add_argument('--file', required=True, help='Input filename')
+    import_parser.add_argument('--file', required=True, help='Input filename (.json, .ndjson, .jsonl, .csv or .html)')
+    import_parser.add_argument('--on-duplicate', choices=['skip', 'update', 'merge'], default='skip',
+                               help='What to do with bookmarks whose URL already exists')
     
     # Stats command
-    subparsers.add_parser('stats', help='Show bookmark statistics')
+    stats_parser = subparsers.add_parser('stats', help='Show bookmark statistics')
+    stats_parser.add_argument('--recompute', action='store_true',
+                              help='Verify the stored counters with a full recount and repair them')
+    by_group = stats_parser.add_mutually_exclusive_group()
+    by_group.add_argument('--by-domain', action='store_true', help='Count bookmarks and visits per host name')
+    by_group.add_argument('--by-site', action='store_true',
+                          help='Count bookmarks and visits per registrable domain (subdomains combined)')
+    stats_parser.add_argument('--limit', type=int, help='Number of domains to show')
     
     # Tags command
     subparsers.add_parser('tags', help='List all unique tags')
     
+    # Collection commands
+    collection_parser = subparsers.add_parser('collection', help='Manage saved searches')
+    collection_commands = collection_parser.add_subparsers(dest='collection_command', required=True)
+    collection_create = collection_commands.add_parser('create', help='Save a search as a collection')
+    collection_create.add_argument('name', help='Collection name')
+    collection_create.add_argument('query', help='Search, in the query language (see the query command)')
+    collection_create.add_argument('--in', choices=['title', 'url', 'description', 'tags', 'all'],
+                                   default='all', help='Field plain words must match')
+    collection_commands.add_parser('list', help='List collections')
+    collection_show = collection_commands.add_parser('show', help='Show the bookmarks in a collection')
+    collection_show.add_argument('name', help='Collection name')
+    collection_show.add_argument('--limit', type=int, help='Number of bookmarks to show')
+    collection_delete = collection_commands.add_parser('delete', help='Delete a collection')
+    collection_delete.add_argument('name', help='Collection name')
+    
+    # Complete command
+    complete_parser = subparsers.add_parser('complete', help='Complete a title, tag or domain prefix')
+    complete_parser.add_argument('prefix', nargs='?', default='', help='Text to complete')
+    complete_parser.add_argument('--field', choices=['title', 'tag', 'domain'], default='title',
+                                 help='What to complete')
+    complete_parser.add_argument('--limit', type=int, default=10, help='Number of suggestions')
+    
+    # Flush visits command
+    subparsers.add_parser('flush-visits', help='Write deferred visit counts to the database')
+    
+    # Reindex command
+    subparsers.add_parser('reindex', help='Rebuild the full-text search index')
+    
+    # Cache stats command
+    cache_stats_parser = subparsers.add_parser('cache-stats', help='Show search/tag result cache statistics')
+    cache_stats_parser.add_argument('--reset', action='store_true', help='Reset the counters')
+    
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return 1
     
+    manager = None
     try:
         manager = BookmarkManager()
         
@@ -395,10 +793,22 @@ Examples:
             )
         
         elif args.command == 'list':
-            success = manager.list_bookmarks(limit=args.limit, page=args.page)
+            success = manager.list_bookmarks(limit=args.limit, page=args.page,
+                                             tags=args.tags, match_all=not args.any_tag,
+                                             sort=args.sort, reverse=args.reverse,
+                                             after=args.after, before=args.before,
+                                             domain=args.domain)
         
         elif args.command == 'search':
-            success = manager.search_bookmarks(args.query, getattr(args, 'in'))
+            success = manager.search_bookmarks(args.query, getattr(args, 'in'), fuzzy=args.fuzzy,
+                                               threshold=args.threshold, substring=args.substring,
+                                               facets=args.facets)
+        
+        elif args.command == 'query':
+            success = manager.query_bookmarks(args.text, args.limit)
+        
+        elif args.command == 'related':
+            success = manager.show_related(args.identifier, args.limit)
         
         elif args.command == 'update':
             success = manager.update_bookmark(
@@ -413,20 +823,44 @@ Examples:
             success = manager.delete_bookmark(args.identifier)
         
         elif args.command == 'open':
-            success = manager.open_bookmark(args.identifier)
+            success = manager.open_bookmark(args.identifier, defer_visit=args.defer_visit)
         
         elif args.command == 'export':
-            success = manager.export_bookmarks(args.format, args.file)
+            success = manager.export_bookmarks(args.format, args.file, args.compact, args.append,
+                                               args.compress, args.level)
         
         elif args.command == 'import':
-            success = manager.import_bookmarks(args.file)
+            success = manager.import_bookmarks(args.file, on_duplicate=args.on_duplicate)
         
         elif args.command == 'stats':
-            success = manager.show_stats()
+            success = manager.show_stats(recompute=args.recompute, by_domain=args.by_domain,
+                                         by_site=args.by_site, limit=args.limit)
         
         elif args.command == 'tags':
             success = manager.show_tags()
         
+        elif args.command == 'collection':
+            if args.collection_command == 'create':
+                success = manager.create_collection(args.name, args.query, getattr(args, 'in'))
+            elif args.collection_command == 'list':
+                success = manager.list_collections()
+            elif args.collection_command == 'show':
+                success = manager.show_collection(args.name, args.limit)
+            else:
+                success = manager.delete_collection(args.name)
+        
+        elif args.command == 'complete':
+            success = manager.complete(args.prefix, args.field, args.limit)
+        
+        elif args.command == 'flush-visits':
+            success = manager.flush_visits()
+        
+        elif args.command == 'reindex':
+            success = manager.rebuild_index()
+        
+        elif args.command == 'cache-stats':
+            success = manager.show_cache_stats(args.reset)
+        
         else:
             print_error(f"Unknown command: {args.command}")
             return 1
@@ -439,6 +873,9 @@ Examples:
     except Exception as e:
         print_error(f"An error occurred: {e}")
         return 1
+    finally:
+        if manager is not None:
+            manager.close()
 
 
 if __name__ == '__main__':
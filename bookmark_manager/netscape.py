@@ -0,0 +1,187 @@
+"""
+Netscape bookmark files, the HTML format browsers import and export.
+
+A file is nested definition lists: each ``<DT><H3>`` names a folder whose
+``<DL>`` holds its entries, and each ``<DT><A HREF ADD_DATE TAGS>`` is a
+bookmark, optionally followed by a ``<DD>`` description::
+
+    <DL><p>
+        <DT><H3>Python</H3>
+        <DL><p>
+            <DT><A HREF="https://docs.python.org" ADD_DATE="1700000000" TAGS="docs">Docs</A>
+            <DD>The standard library reference
+        </DL><p>
+    </DL><p>
+
+Reading feeds the file to ``html.parser.HTMLParser`` a chunk at a time and
+yields bookmarks as soon as they are complete, so no document tree is
+built. Folder names become tags, except the browsers' own toolbar and
+"other bookmarks" folders. Writing produces a flat list that keeps the
+tags in the TAGS attribute, as Firefox does.
+"""
+
+import codecs
+import html
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, TextIO
+from models import Bookmark, from_epoch, to_epoch
+
+HEADER = '''<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<!-- This is an automatically generated file.
+     It will be read and overwritten.
+     DO NOT EDIT! -->
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+'''
+FOOTER = '</DL><p>\n'
+
+# H3 attributes browsers put on their built-in folders, which are not tags
+ROOT_FOLDER_ATTRIBUTES = ('personal_toolbar_folder', 'unfiled_bookmarks_folder')
+
+
+class NetscapeParser(HTMLParser):
+    """Incremental parser collecting the bookmarks of a Netscape file.
+
+    Feed it text with ``feed``; completed bookmarks pile up in ``bookmarks``
+    for the caller to take. A bookmark is complete once the next entry or
+    the end of its folder shows that its description has ended.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.bookmarks: List[Bookmark] = []
+        # Tag for each open <DL>, None for folders that do not make one
+        self._folders: List[Optional[str]] = []
+        # Folder name being read from an <H3>, then waiting for its <DL>
+        self._folder: Optional[str] = None
+        self._folder_is_root = False
+        self._reading_folder = False
+        self._current: Optional[Bookmark] = None
+        self._text: Optional[List[str]] = None
+        self._description: Optional[List[str]] = None
+
+    def handle_starttag(self, tag: str, attrs: List[tuple]):
+        if tag in ('dt', 'dl', 'h3', 'a'):
+            self._finish_bookmark()
+        if tag == 'dl':
+            self._folders.append(None if self._folder_is_root else self._folder)
+        if tag in ('dt', 'dl'):
+            # A folder name only applies to the <DL> right after its <H3>
+            self._folder = None
+            self._folder_is_root = False
+        elif tag == 'h3':
+            values = dict(attrs)
+            self._folder_is_root = any(name in values for name in ROOT_FOLDER_ATTRIBUTES)
+            self._reading_folder = True
+            self._text = []
+        elif tag == 'a':
+            self._start_bookmark(dict(attrs))
+        elif tag == 'dd' and self._current is not None:
+            self._finish_title()
+            self._description = []
+
+    def handle_endtag(self, tag: str):
+        if tag == 'h3' and self._reading_folder:
+            self._folder = ' '.join(''.join(self._text).replace(',', ' ').split()) or None
+            self._reading_folder = False
+            self._text = None
+        elif tag == 'a':
+            self._finish_title()
+        elif tag == 'dl':
+            self._finish_bookmark()
+            if self._folders:
+                self._folders.pop()
+
+    def handle_data(self, data: str):
+        if self._text is not None:
+            self._text.append(data)
+        elif self._description is not None:
+            self._description.append(data)
+
+    def close(self):
+        super().close()
+        self._finish_bookmark()
+
+    def _start_bookmark(self, attrs: Dict[str, Optional[str]]):
+        url = (attrs.get('href') or '').strip()
+        if not url or url.startswith(('javascript:', 'place:')):
+            return
+        tags = [folder for folder in self._folders if folder]
+        tags.extend(' '.join(tag.split()) for tag in (attrs.get('tags') or '').split(','))
+        created = _parse_date(attrs.get('add_date')) or datetime.now()
+        bookmark = Bookmark(url=url, created_at=created,
+                            updated_at=_parse_date(attrs.get('last_modified')) or created)
+        bookmark.set_tags_list(tags)
+        bookmark.tags = bookmark.tags or None
+        self._current = bookmark
+        self._text = []
+
+    def _finish_title(self):
+        """Take the text read since <A> as the title, falling back to the URL."""
+        if self._text is not None and self._current is not None:
+            self._current.title = ''.join(self._text).strip() or self._current.url
+            self._text = None
+
+    def _finish_bookmark(self):
+        if self._current is None:
+            return
+        # Files without </A> end the title at the next tag that ends the bookmark
+        self._finish_title()
+        if self._description is not None:
+            self._current.description = ''.join(self._description).strip() or None
+        self.bookmarks.append(self._current)
+        self._current = None
+        self._text = None
+        self._description = None
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Epoch seconds from an ADD_DATE or LAST_MODIFIED attribute.
+
+    Some browsers write milliseconds or microseconds, which are scaled down.
+    """
+    try:
+        stamp = int(value)
+    except (TypeError, ValueError):
+        return None
+    while stamp > 10 ** 11:
+        stamp //= 1000
+    return from_epoch(stamp) if stamp > 0 else None
+
+
+def iter_netscape_bookmarks(f: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[Bookmark]:
+    """Yield the bookmarks of a Netscape file in a binary stream as they are parsed."""
+    parser = NetscapeParser()
+    text = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    while True:
+        data = f.read(chunk_size)
+        parser.feed(text.decode(data, final=not data))
+        if not data:
+            parser.close()
+        yield from parser.bookmarks
+        parser.bookmarks.clear()
+        if not data:
+            return
+
+
+def write_netscape(bookmarks: Iterable[Bookmark], f: TextIO) -> int:
+    """Write bookmarks as a flat Netscape file and return how many were written."""
+    f.write(HEADER)
+    count = 0
+    for bookmark in bookmarks:
+        attributes = (f'HREF="{html.escape(bookmark.url)}" '
+                      f'ADD_DATE="{to_epoch(bookmark.created_at)}" '
+                      f'LAST_MODIFIED="{to_epoch(bookmark.updated_at)}"')
+        tags = bookmark.get_tags_list()
+        if tags:
+            attributes += f' TAGS="{html.escape(",".join(tags))}"'
+        line = f'    <DT><A {attributes}>{html.escape(bookmark.title or bookmark.url, quote=False)}</A>\n'
+        if bookmark.description:
+            line += f'    <DD>{html.escape(bookmark.description, quote=False)}\n'
+        f.write(line)
+        count += 1
+    f.write(FOOTER)
+    return count
@@ -0,0 +1,92 @@
+"""
+Text folding for case- and accent-insensitive matching.
+
+SQLite's LIKE and NOCASE only fold ASCII letters, so "istanbul" does not
+match "İstanbul" and "cafe" does not match "café". Folded copies of the
+searchable columns are stored next to the originals and compared against
+folded queries instead: text is casefolded (ß becomes ss), decomposed with
+NFKD (ligatures split, accents separated) and stripped of combining marks.
+Turkish dotless ı and a few letters with no decomposition are mapped to
+their plain Latin counterparts.
+
+Folding works one character at a time, so every position in folded text
+maps back to a character of the original. That is how highlights found in
+the folded search index are shown on the text as it was written.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Optional, Sequence
+
+# Letters that casefolding and NFKD leave distinct. The dotted capital İ
+# needs no entry: it casefolds to 'i' plus a combining dot, which is dropped.
+_EXTRA_FOLDS = str.maketrans({
+    'ı': 'i',
+    'ø': 'o',
+    'đ': 'd',
+    'ł': 'l',
+    'æ': 'ae',
+    'œ': 'oe',
+})
+
+
+def fold(text: Optional[str]) -> Optional[str]:
+    """Fold text for comparison; None stays None."""
+    if text is None:
+        return None
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).translate(_EXTRA_FOLDS)
+
+
+def unfold_markup(text: str, marked: str, markers: Sequence[str], ellipsis: str = '') -> str:
+    """Move the markers in ``marked``, a span of ``fold(text)``, onto the original text.
+
+    ``marked`` is what FTS5's highlight() or snippet() returned for a folded
+    column: part of the folded text with ``markers`` inserted and, for
+    snippets, ``ellipsis`` where text was cut. The same span of ``text`` is
+    returned with the markers at the matching places.
+    """
+    pieces = [fold(char) for char in text]
+    starts = list(accumulate((len(piece) for piece in pieces), initial=0))
+    folded = ''.join(pieces)
+
+    def original(position: int) -> int:
+        """Index in text of the character at a folded position, skipping dropped marks."""
+        index = bisect_left(starts, position)
+        while index < len(pieces) and not pieces[index]:
+            index += 1
+        return index
+
+    # Take the markers out, remembering where they were in the folded span
+    plain = []
+    marks = []
+    pattern = re.compile('|'.join(re.escape(marker) for marker in markers))
+    last = 0
+    for match in pattern.finditer(marked):
+        plain.append(marked[last:match.start()])
+        marks.append((sum(len(part) for part in plain), match.group()))
+        last = match.end()
+    plain.append(marked[last:])
+    span = ''.join(plain)
+
+    lead = trail = ''
+    if ellipsis and span.startswith(ellipsis) and not folded.startswith(span):
+        lead, span = ellipsis, span[len(ellipsis):]
+    if ellipsis and span.endswith(ellipsis) and span not in folded:
+        trail, span = ellipsis, span[:-len(ellipsis)]
+    offset = folded.find(span)
+    if offset < 0:
+        return marked
+
+    parts = [lead]
+    position = original(offset)
+    for mark_at, marker in marks:
+        index = original(offset + max(mark_at - len(lead), 0))
+        parts += [text[position:index], marker]
+        position = index
+    parts += [text[position:original(offset + len(span))], trail]
+    return ''.join(parts)
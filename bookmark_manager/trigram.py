@@ -0,0 +1,73 @@
+"""
+Trigram helpers for substring and typo-tolerant search.
+
+The database keeps an FTS5 index with the ``trigram`` tokenizer over title,
+URL and tags. It answers substring queries directly and narrows fuzzy
+queries down to candidates that share trigrams with the query. The
+candidates are then ranked here by trigram similarity, in the style of
+PostgreSQL's pg_trgm: each word is padded with two leading and one trailing
+space, folded (see textnorm), and cut into overlapping three-character
+pieces. The index covers the folded copies of the columns, so queries are
+folded the same way before they are matched.
+"""
+
+import re
+from typing import Iterable, List, Optional, Set
+from textnorm import fold
+
+# pg_trgm's default similarity threshold
+DEFAULT_THRESHOLD = 0.3
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text: Optional[str]) -> List[str]:
+    """Split text into folded words."""
+    return _WORD.findall(fold(text)) if text else []
+
+
+def word_trigrams(word: str) -> Set[str]:
+    """Padded trigrams of one word, e.g. 'git' -> {'  g', ' gi', 'git', 'it '}."""
+    padded = f'  {word.lower()} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, texts: Iterable[Optional[str]]) -> float:
+    """Score how well the query words match the words of some texts (0..1).
+
+    Each query word is scored by the share of its trigrams found in the best
+    matching word of the texts, so a typo costs a few trigrams instead of the
+    whole match. The result is the average over the query words.
+    """
+    query_words = words(query)
+    if not query_words:
+        return 0.0
+    candidates = [word_trigrams(word) for text in texts for word in words(text)]
+    if not candidates:
+        return 0.0
+
+    total = 0.0
+    for word in query_words:
+        wanted = word_trigrams(word)
+        total += max(len(wanted & found) for found in candidates) / len(wanted)
+    return total / len(query_words)
+
+
+def match_any_expression(query: str) -> Optional[str]:
+    """FTS5 MATCH expression for rows sharing any trigram with the query.
+
+    The trigram tokenizer indexes raw text without padding, so only the inner
+    trigrams of each word are used. Words shorter than three characters have
+    none; None means the query cannot use the index.
+    """
+    grams = sorted({word[i:i + 3] for word in words(query) for i in range(len(word) - 2)})
+    if not grams:
+        return None
+    return ' OR '.join('"{}"'.format(gram.replace('"', '""')) for gram in grams)
+
+
+def substring_expression(query: str) -> Optional[str]:
+    """FTS5 MATCH expression for a substring, or None if it is too short to index."""
+    if len(query) < 3:
+        return None
+    return '"{}"'.format(query.replace('"', '""'))
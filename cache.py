@@ -0,0 +1,231 @@
+"""
+LRU cache for read query results, optionally shared between processes.
+
+Entries are tagged with the database generation they were computed at: the
+change counter the bookmark triggers keep in the database file, plus a
+fingerprint of pending visits. The first lookup at a new generation drops
+every entry. Given a ``path``, entries are also pickled into a small SQLite
+file next to the database, so short-lived processes such as completion hooks
+can reuse what earlier ones computed; the file is trusted like the database.
+Counters can be merged into a small JSON file so the ``cache-stats`` command
+can report totals across processes.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+STAT_NAMES = ('hits', 'misses', 'evictions', 'invalidations')
+
+# Returned by ResultCache._load when the shared file has no usable entry
+_MISSING = object()
+
+
+class ResultCache:
+    """LRU cache bounded by number of entries and approximate size in bytes."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8 * 1024 * 1024,
+                 stats_path: Optional[str] = None, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats_path = stats_path
+        self.path = path
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, int]]' = OrderedDict()
+        self._bytes = 0
+        self._generation: Optional[Hashable] = None
+        # Whether this generation change was already counted as an invalidation
+        self._invalidated = False
+        self._stats = dict.fromkeys(STAT_NAMES, 0)
+        self._store: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, generation: Hashable) -> Tuple[bool, Any]:
+        """Look up a key, in memory and then in the shared file; returns (hit, value)."""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                value = self._load(key, generation)
+                if value is _MISSING:
+                    self._stats['misses'] += 1
+                    return False, None
+                self._remember(key, value, estimate_size(value))
+                self._stats['hits'] += 1
+                return True, value
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, generation: Hashable, value: Any):
+        """Store a value computed at the given generation, evicting old entries."""
+        size = estimate_size(value)
+        with self._lock:
+            self._check_generation(generation)
+            if size > self.max_bytes:
+                return
+            self._remember(key, value, size)
+            self._save(key, generation, value)
+
+    def _remember(self, key: Hashable, value: Any, size: int):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            if not self.path:
+                # With a shared file its evictions are the ones counted
+                self._stats['evictions'] += 1
+
+    def _check_generation(self, generation: Hashable):
+        if generation != self._generation:
+            self._invalidated = bool(self._entries)
+            if self._invalidated:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def _open_store(self) -> Optional[sqlite3.Connection]:
+        """The shared cache file, opened on first use; None without one."""
+        if self._store is None and self.path:
+            try:
+                store = sqlite3.connect(self.path, timeout=0.1, check_same_thread=False)
+                # Losing the file in a crash only costs recomputing its entries
+                store.execute('PRAGMA synchronous = OFF')
+                store.execute('''
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        generation TEXT NOT NULL,
+                        value BLOB NOT NULL,
+                        used REAL NOT NULL
+                    )
+                ''')
+            except sqlite3.Error:
+                # An unusable file (read-only, corrupt) leaves the memory cache
+                self.path = None
+                return None
+            self._store = store
+        return self._store
+
+    def _load(self, key: Hashable, generation: Hashable) -> Any:
+        """A value another process stored at this generation, or _MISSING."""
+        store = self._open_store()
+        if store is None:
+            return _MISSING
+        try:
+            with store:
+                row = store.execute('SELECT value FROM entries WHERE key = ? AND generation = ?',
+                                    (repr(key), repr(generation))).fetchone()
+                if row is None:
+                    return _MISSING
+                store.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), repr(key)))
+        except sqlite3.Error:
+            # Busy with another process's write: compute it instead of waiting
+            return _MISSING
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            # Written by an incompatible version of the models
+            return _MISSING
+
+    def _save(self, key: Hashable, generation: Hashable, value: Any):
+        """Write a value to the shared file, dropping stale and least recently used entries."""
+        store = self._open_store()
+        if store is None:
+            return
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            with store:
+                stale = store.execute('DELETE FROM entries WHERE generation != ?',
+                                      (repr(generation),)).rowcount
+                if stale and not self._invalidated:
+                    self._invalidated = True
+                    self._stats['invalidations'] += 1
+                store.execute('INSERT OR REPLACE INTO entries (key, generation, value, used) '
+                              'VALUES (?, ?, ?, ?)',
+                              (repr(key), repr(generation), data, time.time()))
+                total = 0
+                rows = store.execute('SELECT key, length(value) FROM entries ORDER BY used DESC')
+                for count, (stored_key, size) in enumerate(rows.fetchall(), 1):
+                    total += size
+                    if count > self.max_entries or total > self.max_bytes:
+                        store.execute('DELETE FROM entries WHERE key = ?', (stored_key,))
+                        self._stats['evictions'] += 1
+        except (sqlite3.Error, pickle.PicklingError):
+            pass
+
+    def clear(self):
+        """Drop every entry, including those in the shared file."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            store = self._open_store()
+            if store is not None:
+                try:
+                    with store:
+                        store.execute('DELETE FROM entries')
+                except sqlite3.Error:
+                    pass
+
+    def close(self):
+        """Close the shared file; it is reopened if the cache is used again."""
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for this process plus the current entry count and size."""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def save_stats(self):
+        """Add this process's counters to the stats file and reset them."""
+        if not self.stats_path:
+            return
+        with self._lock:
+            counters, self._stats = self._stats, dict.fromkeys(STAT_NAMES, 0)
+        if not any(counters.values()):
+            return
+        totals = load_stats(self.stats_path)
+        for name in STAT_NAMES:
+            totals[name] += counters[name]
+        temp_path = self.stats_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(totals, f)
+        os.replace(temp_path, self.stats_path)
+
+
+def load_stats(path: str) -> Dict[str, int]:
+    """Read counters saved by ResultCache.save_stats (zeros if there are none)."""
+    totals = dict.fromkeys(STAT_NAMES, 0)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return totals
+    for name in STAT_NAMES:
+        if isinstance(saved.get(name), int):
+            totals[name] = saved[name]
+    return totals
+
+
+def estimate_size(value: Any) -> int:
+    """Rough memory footprint of a cached result, following containers and objects."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v)
+                                          for k, v in value.items())
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + estimate_size(value.__dict__)
+    return sys.getsizeof(value)
@@ -0,0 +1,106 @@
+"""
+Compressed export and import streams.
+
+Exports can be written through gzip, bz2 or xz from the standard library.
+The streaming writers and readers use the compressing file objects the
+same way as plain files, so nothing is held in memory. On import the codec
+is recognized by the file's magic bytes, so a compressed file is read
+correctly whatever its name; codec suffixes (.gz, .bz2, .xz) are ignored
+when the format is guessed from the name.
+"""
+
+import bz2
+import gzip
+import lzma
+from typing import Any, BinaryIO, Optional, TextIO
+
+# Codec name -> (file suffix, magic bytes, (lowest, highest, default) level).
+# gzip defaults to 6 like the gzip tool rather than zlib's slow 9.
+CODECS = {
+    'gzip': ('.gz', b'\x1f\x8b', (0, 9, 6)),
+    'bz2': ('.bz2', b'BZh', (1, 9, 9)),
+    'xz': ('.xz', b'\xfd7zXZ\x00', (0, 9, 6)),
+}
+
+_MAGIC_LENGTH = max(len(magic) for _, magic, _ in CODECS.values())
+
+# What reading a corrupt or truncated compressed file can raise
+DECOMPRESSION_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+
+def check_level(codec: str, level: Optional[int]) -> int:
+    """Return the compression level to use, raising ValueError if it is out of range."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression: {codec}")
+    lowest, highest, default = CODECS[codec][2]
+    if level is None:
+        return default
+    if not lowest <= level <= highest:
+        raise ValueError(f"{codec} level must be between {lowest} and {highest}")
+    return level
+
+
+def add_suffix(filename: str, codec: Optional[str]) -> str:
+    """Append the codec's suffix to a file name unless it already ends with it."""
+    if codec is None or filename.endswith(CODECS[codec][0]):
+        return filename
+    return filename + CODECS[codec][0]
+
+
+def strip_suffix(filename: str) -> str:
+    """Drop a codec suffix, so 'backup.json.gz' becomes 'backup.json'."""
+    for suffix, _, _ in CODECS.values():
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def detect_codec(f: BinaryIO) -> Optional[str]:
+    """Codec whose magic bytes start a seekable binary file, or None if it is not compressed."""
+    position = f.tell()
+    head = f.read(_MAGIC_LENGTH)
+    f.seek(position)
+    for codec, (_, magic, _) in CODECS.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def file_codec(filename: str) -> Optional[str]:
+    """Codec of an existing file, or None if it is not compressed."""
+    with open(filename, 'rb') as f:
+        return detect_codec(f)
+
+
+def decompressed(raw: BinaryIO) -> BinaryIO:
+    """Wrap a binary file in a decompressing reader if its magic bytes call for one.
+
+    The caller keeps ownership of ``raw``; its position shows how much of
+    the compressed data has been consumed.
+    """
+    codec = detect_codec(raw)
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if codec == 'bz2':
+        return bz2.BZ2File(raw, 'rb')
+    if codec == 'xz':
+        return lzma.LZMAFile(raw, 'rb')
+    return raw
+
+
+def open_text(filename: str, mode: str = 'w', codec: Optional[str] = None,
+              level: Optional[int] = None, **options: Any) -> TextIO:
+    """Open a file for writing ('w') or appending ('a') text, compressed with ``codec``.
+
+    ``options`` are passed on to the text layer (encoding, newline). Each
+    append to a compressed file adds a new stream, which all three codecs
+    read back as one.
+    """
+    if codec is None:
+        return open(filename, mode, **options)
+    level = check_level(codec, level)
+    if codec == 'gzip':
+        return gzip.open(filename, mode + 't', compresslevel=level, **options)
+    if codec == 'bz2':
+        return bz2.open(filename, mode + 't', compresslevel=level, **options)
+    return lzma.open(filename, mode + 't', preset=level, **options)
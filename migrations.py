@@ -0,0 +1,607 @@
+"""
+Versioned schema migrations for the bookmark database.
+
+The schema version lives in ``PRAGMA user_version``. Each migration step runs
+once, in order, and all pending steps are applied in a single transaction.
+Steps are frozen snapshots of the schema at that version: they must not call
+into DatabaseManager, whose code keeps changing after the step is written.
+The helpers steps use to derive column values (tag splitting, domains,
+folding) are copied here for the same reason.
+"""
+
+import sqlite3
+import unicodedata
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Copy of models.SECOND_LEVEL_LABELS when the domain columns were added
+_SECOND_LEVEL_LABELS = frozenset({'ac', 'co', 'com', 'edu', 'gen', 'go', 'gov',
+                                  'ne', 'net', 'or', 'org', 'web'})
+
+# Copy of textnorm's extra folds when the folded columns were added
+_EXTRA_FOLDS = str.maketrans({'ı': 'i', 'ø': 'o', 'đ': 'd', 'ł': 'l', 'æ': 'ae', 'œ': 'oe'})
+
+
+def _split_tags(tags: Optional[str]) -> List[str]:
+    """Tag names in a CSV tags value, as Bookmark.get_tags_list split them."""
+    seen = set()
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip()
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def _url_domain(url: str) -> str:
+    """Host name of a URL without 'www.', as models.url_domain found it."""
+    try:
+        host = (urlparse(url).hostname or '').strip().lower()
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def _registrable_domain(domain: str) -> str:
+    """Registered part of a host name, as models.registrable_domain found it."""
+    labels = domain.split('.')
+    if len(labels) <= 2 or ':' in domain or all(label.isdigit() for label in labels):
+        return domain
+    keep = 3 if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS else 2
+    return '.'.join(labels[-keep:])
+
+
+def _fold(text: Optional[str]) -> Optional[str]:
+    """Case- and accent-folded text, as textnorm.fold produced it."""
+    if text is None:
+        return None
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return stripped.translate(_EXTRA_FOLDS)
+
+
+def _create_bookmarks_table(cursor: sqlite3.Cursor):
+    """Create the bookmarks table (already present in pre-migration databases)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            url TEXT NOT NULL UNIQUE,
+            description TEXT,
+            tags TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            visit_count INTEGER DEFAULT 0
+        )
+    ''')
+
+
+def _create_search_index(cursor: sqlite3.Cursor):
+    """Create the FTS5 index with its sync triggers and fill it."""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_fts USING fts5(
+                title, url, description, tags,
+                content='bookmarks', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite was built without FTS5; searches fall back to LIKE scans
+        return
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (rowid, title, url, description, tags)
+            VALUES (new.id, new.title, new.url, new.description, new.tags);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (bookmarks_fts, rowid, title, url, description, tags)
+            VALUES ('delete', old.id, old.title, old.url, old.description, old.tags);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au
+        AFTER UPDATE OF title, url, description, tags ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (bookmarks_fts, rowid, title, url, description, tags)
+            VALUES ('delete', old.id, old.title, old.url, old.description, old.tags);
+            INSERT INTO bookmarks_fts (rowid, title, url, description, tags)
+            VALUES (new.id, new.title, new.url, new.description, new.tags);
+        END
+    ''')
+    cursor.execute("INSERT INTO bookmarks_fts (bookmarks_fts) VALUES ('rebuild')")
+
+
+def _create_tag_tables(cursor: sqlite3.Cursor):
+    """Create the normalized tag tables and copy in the CSV tags column."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            bookmark_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_tags (
+            tag_id INTEGER NOT NULL REFERENCES tags(id),
+            bookmark_id INTEGER NOT NULL REFERENCES bookmarks(id),
+            PRIMARY KEY (tag_id, bookmark_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_bookmark_tags_bookmark ON bookmark_tags (bookmark_id)'
+    )
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_tags_ai AFTER INSERT ON bookmark_tags BEGIN
+            UPDATE tags SET bookmark_count = bookmark_count + 1 WHERE id = new.tag_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_tags_ad AFTER DELETE ON bookmark_tags BEGIN
+            UPDATE tags SET bookmark_count = bookmark_count - 1 WHERE id = old.tag_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_tags_ad AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmark_tags WHERE bookmark_id = old.id;
+        END
+    ''')
+
+    cursor.execute('DELETE FROM bookmark_tags')
+    rows = cursor.execute('SELECT id, tags FROM bookmarks WHERE tags IS NOT NULL').fetchall()
+    links = [(bookmark_id, name) for bookmark_id, tags in rows
+             for name in _split_tags(tags)]
+    cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)',
+                       [(name,) for _, name in links])
+    cursor.executemany('''
+        INSERT OR IGNORE INTO bookmark_tags (tag_id, bookmark_id)
+        SELECT id, ? FROM tags WHERE name = ?
+    ''', links)
+
+
+def _create_sort_indexes(cursor: sqlite3.Cursor):
+    """Index every column listings sort on, with id as the keyset tie-breaker.
+
+    The indexes are not covering: a page reads its few rows from the table,
+    which is cheaper than a second copy of every column per sort order.
+    """
+    for name, column in [('created', 'created_at'), ('updated', 'updated_at'),
+                         ('visits', 'visit_count'), ('title', 'title')]:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_bookmarks_{name} ON bookmarks ({column}, id)')
+
+
+def _create_stats_table(cursor: sqlite3.Cursor):
+    """Create the single-row counter table that triggers keep current."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL,
+            visited INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO bookmark_stats (id, total, visited)
+        SELECT 1, COUNT(*), COUNT(CASE WHEN visit_count > 0 THEN 1 END) FROM bookmarks
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_stats_ai AFTER INSERT ON bookmarks BEGIN
+            UPDATE bookmark_stats
+            SET total = total + 1, visited = visited + (new.visit_count > 0)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_stats_ad AFTER DELETE ON bookmarks BEGIN
+            UPDATE bookmark_stats
+            SET total = total - 1, visited = visited - (old.visit_count > 0)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_stats_au AFTER UPDATE OF visit_count ON bookmarks BEGIN
+            UPDATE bookmark_stats
+            SET visited = visited + (new.visit_count > 0) - (old.visit_count > 0)
+            WHERE id = 1;
+        END
+    ''')
+
+
+def _store_epoch_timestamps(cursor: sqlite3.Cursor):
+    """Convert ISO text timestamps to integer epoch seconds.
+
+    The text values were written from naive local datetimes, so they are
+    read back as local time.
+    """
+    for column in ('created_at', 'updated_at'):
+        cursor.execute(f'''
+            UPDATE bookmarks
+            SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER)
+            WHERE typeof({column}) = 'text'
+        ''')
+
+
+def _create_trigram_index(cursor: sqlite3.Cursor):
+    """Create the trigram index over title, URL and tags and fill it."""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_trigram USING fts5(
+                title, url, tags,
+                content='bookmarks', content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # No FTS5, or SQLite older than 3.34 without the trigram tokenizer;
+        # substring and fuzzy search fall back to scans
+        return
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (rowid, title, url, tags)
+            VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_ad AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (bookmarks_trigram, rowid, title, url, tags)
+            VALUES ('delete', old.id, old.title, old.url, old.tags);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_au
+        AFTER UPDATE OF title, url, tags ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (bookmarks_trigram, rowid, title, url, tags)
+            VALUES ('delete', old.id, old.title, old.url, old.tags);
+            INSERT INTO bookmarks_trigram (rowid, title, url, tags)
+            VALUES (new.id, new.title, new.url, new.tags);
+        END
+    ''')
+    cursor.execute("INSERT INTO bookmarks_trigram (bookmarks_trigram) VALUES ('rebuild')")
+
+
+def _create_related_tables(cursor: sqlite3.Cursor):
+    """Create the TF-IDF postings tables and queue every bookmark for indexing."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_terms (
+            term INTEGER NOT NULL,
+            bookmark_id INTEGER NOT NULL,
+            tf REAL NOT NULL,
+            PRIMARY KEY (term, bookmark_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_bookmark_terms_bookmark ON bookmark_terms (bookmark_id)'
+    )
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS term_df (
+            term INTEGER PRIMARY KEY,
+            df INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_vectors (
+            bookmark_id INTEGER PRIMARY KEY,
+            norm REAL NOT NULL
+        )
+    ''')
+    # Bookmarks whose vectors must be (re)computed; filled by triggers and
+    # drained in Python, where the text is tokenized
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_queue (
+            bookmark_id INTEGER PRIMARY KEY
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_terms_ai AFTER INSERT ON bookmark_terms BEGIN
+            INSERT INTO term_df (term, df) VALUES (new.term, 1)
+            ON CONFLICT (term) DO UPDATE SET df = df + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_terms_ad AFTER DELETE ON bookmark_terms BEGIN
+            UPDATE term_df SET df = df - 1 WHERE term = old.term;
+        END
+    ''')
+    # The outer statement's conflict clause (e.g. an upsert from add_bookmarks)
+    # would override INSERT OR IGNORE inside a trigger, so check explicitly
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_related_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO related_queue (bookmark_id) SELECT new.id
+            WHERE NOT EXISTS (SELECT 1 FROM related_queue WHERE bookmark_id = new.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_related_au
+        AFTER UPDATE OF title, url, description, tags ON bookmarks BEGIN
+            INSERT INTO related_queue (bookmark_id) SELECT new.id
+            WHERE NOT EXISTS (SELECT 1 FROM related_queue WHERE bookmark_id = new.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_related_ad AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM bookmark_terms WHERE bookmark_id = old.id;
+            DELETE FROM related_vectors WHERE bookmark_id = old.id;
+            DELETE FROM related_queue WHERE bookmark_id = old.id;
+        END
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO related_queue (bookmark_id) SELECT id FROM bookmarks')
+
+
+def _create_completion_indexes(cursor: sqlite3.Cursor):
+    """Index titles for case-insensitive prefix ranges and keep visit totals per tag."""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bookmarks_title_nocase
+        ON bookmarks (title COLLATE NOCASE, visit_count)
+    ''')
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(tags)')]
+    if 'visit_count' not in columns:
+        cursor.execute('ALTER TABLE tags ADD COLUMN visit_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_tags_visits_ai AFTER INSERT ON bookmark_tags BEGIN
+            UPDATE tags SET visit_count = visit_count +
+                COALESCE((SELECT visit_count FROM bookmarks WHERE id = new.bookmark_id), 0)
+            WHERE id = new.tag_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmark_tags_visits_ad AFTER DELETE ON bookmark_tags BEGIN
+            UPDATE tags SET visit_count = visit_count -
+                COALESCE((SELECT visit_count FROM bookmarks WHERE id = old.bookmark_id), 0)
+            WHERE id = old.tag_id;
+        END
+    ''')
+    # By the time bookmarks_tags_ad removes the links the bookmark row is
+    # gone, so its visits are taken off its tags before the delete
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_tag_visits_bd BEFORE DELETE ON bookmarks BEGIN
+            UPDATE tags SET visit_count = visit_count - old.visit_count
+            WHERE id IN (SELECT tag_id FROM bookmark_tags WHERE bookmark_id = old.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_tag_visits_au AFTER UPDATE OF visit_count ON bookmarks BEGIN
+            UPDATE tags SET visit_count = visit_count + new.visit_count - old.visit_count
+            WHERE id IN (SELECT tag_id FROM bookmark_tags WHERE bookmark_id = new.id);
+        END
+    ''')
+    cursor.execute('''
+        UPDATE tags SET visit_count = (
+            SELECT COALESCE(SUM(b.visit_count), 0) FROM bookmark_tags bt
+            JOIN bookmarks b ON b.id = bt.bookmark_id
+            WHERE bt.tag_id = tags.id
+        )
+    ''')
+
+
+def _add_domain_columns(cursor: sqlite3.Cursor):
+    """Store each URL's host name and registrable domain in indexed columns."""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(bookmarks)')]
+    for column in ('domain', 'registrable_domain'):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE bookmarks ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+    rows = cursor.execute('SELECT id, url FROM bookmarks').fetchall()
+    cursor.executemany('UPDATE bookmarks SET domain = ?, registrable_domain = ? WHERE id = ?',
+                       [(_url_domain(url), _registrable_domain(_url_domain(url)), bookmark_id)
+                        for bookmark_id, url in rows])
+    # visit_count makes both indexes covering for the grouped domain reports
+    for column in ('domain', 'registrable_domain'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_bookmarks_{column} ON bookmarks ({column}, visit_count)')
+
+
+def _create_collection_tables(cursor: sqlite3.Cursor):
+    """Create saved searches and the table holding their current members."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS collections (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            query TEXT NOT NULL,
+            search_in TEXT NOT NULL DEFAULT 'all',
+            created_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS collection_members (
+            collection_id INTEGER NOT NULL REFERENCES collections(id),
+            bookmark_id INTEGER NOT NULL REFERENCES bookmarks(id),
+            PRIMARY KEY (collection_id, bookmark_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_collection_members_bookmark ON collection_members (bookmark_id)'
+    )
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_collections_ad AFTER DELETE ON bookmarks BEGIN
+            DELETE FROM collection_members WHERE bookmark_id = old.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS collections_ad AFTER DELETE ON collections BEGIN
+            DELETE FROM collection_members WHERE collection_id = old.id;
+        END
+    ''')
+
+
+def _add_folded_columns(cursor: sqlite3.Cursor):
+    """Store case- and accent-folded copies of the searchable text and index them."""
+    fields = ('title', 'url', 'description', 'tags')
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(bookmarks)')]
+    for field in fields:
+        if f'{field}_folded' not in columns:
+            cursor.execute(f'ALTER TABLE bookmarks ADD COLUMN {field}_folded TEXT')
+    rows = cursor.execute(f"SELECT {', '.join(fields)}, id FROM bookmarks").fetchall()
+    cursor.executemany(
+        f"UPDATE bookmarks SET {', '.join(f'{field}_folded = ?' for field in fields)} WHERE id = ?",
+        [tuple(_fold(value) for value in row[:-1]) + (row[-1],) for row in rows])
+    cursor.execute('DROP INDEX IF EXISTS idx_bookmarks_title_nocase')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_bookmarks_title_folded ON bookmarks (title_folded, visit_count)'
+    )
+
+    if 'folded' not in [row[1] for row in cursor.execute('PRAGMA table_info(tags)')]:
+        cursor.execute('ALTER TABLE tags ADD COLUMN folded TEXT')
+    tags = cursor.execute('SELECT id, name FROM tags').fetchall()
+    cursor.executemany('UPDATE tags SET folded = ? WHERE id = ?', [(_fold(name), tag_id) for tag_id, name in tags])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tags_folded ON tags (folded, visit_count)')
+
+    # Substring and fuzzy search match folded text from now on
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'bookmarks_trigram'").fetchone() is None:
+        return
+    for trigger in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS bookmarks_trigram_{trigger}')
+    cursor.execute('DROP TABLE bookmarks_trigram')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE bookmarks_trigram USING fts5(
+            title_folded, url_folded, tags_folded,
+            content='bookmarks', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (rowid, title_folded, url_folded, tags_folded)
+            VALUES (new.id, new.title_folded, new.url_folded, new.tags_folded);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_ad AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (bookmarks_trigram, rowid, title_folded, url_folded, tags_folded)
+            VALUES ('delete', old.id, old.title_folded, old.url_folded, old.tags_folded);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_trigram_au
+        AFTER UPDATE OF title_folded, url_folded, tags_folded ON bookmarks BEGIN
+            INSERT INTO bookmarks_trigram (bookmarks_trigram, rowid, title_folded, url_folded, tags_folded)
+            VALUES ('delete', old.id, old.title_folded, old.url_folded, old.tags_folded);
+            INSERT INTO bookmarks_trigram (rowid, title_folded, url_folded, tags_folded)
+            VALUES (new.id, new.title_folded, new.url_folded, new.tags_folded);
+        END
+    ''')
+    cursor.execute("INSERT INTO bookmarks_trigram (bookmarks_trigram) VALUES ('rebuild')")
+
+
+def _index_folded_text(cursor: sqlite3.Cursor):
+    """Rebuild the full-text index over the folded columns.
+
+    unicode61 only strips accents, so "kirmizi" missed "Kırmızı" and
+    "strasse" missed "Straße"; queries are folded the same way from now on.
+    """
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'bookmarks_fts'").fetchone() is None:
+        return
+    for trigger in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS bookmarks_fts_{trigger}')
+    cursor.execute('DROP TABLE bookmarks_fts')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE bookmarks_fts USING fts5(
+            title_folded, url_folded, description_folded, tags_folded,
+            content='bookmarks', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ai AFTER INSERT ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (rowid, title_folded, url_folded, description_folded, tags_folded)
+            VALUES (new.id, new.title_folded, new.url_folded, new.description_folded, new.tags_folded);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_ad AFTER DELETE ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (bookmarks_fts, rowid, title_folded, url_folded,
+                                       description_folded, tags_folded)
+            VALUES ('delete', old.id, old.title_folded, old.url_folded,
+                    old.description_folded, old.tags_folded);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS bookmarks_fts_au
+        AFTER UPDATE OF title_folded, url_folded, description_folded, tags_folded ON bookmarks BEGIN
+            INSERT INTO bookmarks_fts (bookmarks_fts, rowid, title_folded, url_folded,
+                                       description_folded, tags_folded)
+            VALUES ('delete', old.id, old.title_folded, old.url_folded,
+                    old.description_folded, old.tags_folded);
+            INSERT INTO bookmarks_fts (rowid, title_folded, url_folded, description_folded, tags_folded)
+            VALUES (new.id, new.title_folded, new.url_folded, new.description_folded, new.tags_folded);
+        END
+    ''')
+    cursor.execute("INSERT INTO bookmarks_fts (bookmarks_fts) VALUES ('rebuild')")
+
+
+def _create_change_counter(cursor: sqlite3.Cursor):
+    """Create the single-row counter that every bookmark write bumps.
+
+    Unlike ``PRAGMA data_version`` it is stored in the file, so processes
+    can compare it to tell whether results cached by another are current.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookmark_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO bookmark_changes (id, generation) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS bookmark_changes_a{event[0].lower()}
+            AFTER {event} ON bookmarks BEGIN
+                UPDATE bookmark_changes SET generation = generation + 1 WHERE id = 1;
+            END
+        ''')
+
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, 'Create bookmarks table', _create_bookmarks_table),
+    (2, 'Add FTS5 search index', _create_search_index),
+    (3, 'Add normalized tag tables', _create_tag_tables),
+    (4, 'Add sort indexes', _create_sort_indexes),
+    (5, 'Add trigger-maintained statistics', _create_stats_table),
+    (6, 'Store timestamps as epoch seconds', _store_epoch_timestamps),
+    (7, 'Add trigram index', _create_trigram_index),
+    (8, 'Add related-bookmark term vectors', _create_related_tables),
+    (9, 'Add prefix completion indexes', _create_completion_indexes),
+    (10, 'Add domain columns', _add_domain_columns),
+    (11, 'Add smart collections', _create_collection_tables),
+    (12, 'Add folded search columns', _add_folded_columns),
+    (13, 'Index folded text for full-text search', _index_folded_text),
+    (14, 'Add change counter for shared caches', _create_change_counter),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Read the schema version stored in the database file."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply any pending migrations and return the resulting schema version.
+
+    A database that is already current costs a single pragma read. Otherwise
+    the pending steps run inside one write transaction, so a failed step
+    leaves the database at its previous version.
+    """
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    cursor = conn.cursor()
+    # Take the write lock first so concurrent processes migrate one at a time
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        version = get_schema_version(conn)
+        for step_version, _, step in MIGRATIONS:
+            if step_version > version:
+                step(cursor)
+                version = step_version
+        cursor.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return version
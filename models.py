@@ -1,6 +1,96 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Sequence, Union
+from urllib.parse import urlparse
+
+# Column order of the rows Bookmark.from_row hydrates
+ROW_FIELDS = ('id', 'title', 'url', 'description', 'tags',
+              'created_at', 'updated_at', 'visit_count')
+
+
+# Markers around matched terms in search highlights; control characters
+# cannot clash with text users type
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+class _LazyTimestamp:
+    """Converts a hydrated row's epoch timestamp to a datetime on first read.
+
+    As a non-data descriptor it is only consulted while the instance has no
+    value of its own, so bookmarks built through ``__init__`` never hit it.
+    """
+
+    def __init__(self, name: str, slot: str):
+        self.name = name
+        self.slot = slot
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            value = from_epoch(instance.__dict__.pop(self.slot))
+        except KeyError:
+            raise AttributeError(self.name) from None
+        instance.__dict__[self.name] = value
+        return value
+
+
+def to_epoch(value: datetime) -> int:
+    """Convert a datetime to the integer epoch seconds stored in the database."""
+    return int(value.timestamp())
+
+
+def from_epoch(value: Union[int, str]) -> datetime:
+    """Convert a stored timestamp back to a local datetime.
+
+    Text values are accepted for rows written before timestamps were stored
+    as integers.
+    """
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.fromtimestamp(value)
+
+
+def normalize_domain(host: str) -> str:
+    """Lowercase a host name and drop a leading 'www.'."""
+    host = host.strip().lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def url_domain(url: str) -> str:
+    """Normalized host name of a URL ('' if it has none)."""
+    try:
+        return normalize_domain(urlparse(url).hostname or '')
+    except ValueError:
+        return ''
+
+
+# Labels that registries sell names under in country-code domains
+# (bbc.co.uk, example.com.tr); there is no public suffix list to consult
+SECOND_LEVEL_LABELS = frozenset({'ac', 'co', 'com', 'edu', 'gen', 'go', 'gov',
+                                 'ne', 'net', 'or', 'org', 'web'})
+
+
+def registrable_domain(domain: str) -> str:
+    """The part of a host name its owner registered: 'docs.python.org' -> 'python.org'."""
+    labels = domain.split('.')
+    if len(labels) <= 2 or ':' in domain or all(label.isdigit() for label in labels):
+        return domain
+    keep = 3 if len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS else 2
+    return '.'.join(labels[-keep:])
+
+
+def _unique_tags(tags: List[str]) -> List[str]:
+    """Strip tags and drop blanks and case-insensitive duplicates."""
+    seen = set()
+    unique = []
+    for tag in tags:
+        tag = tag.strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            unique.append(tag)
+    return unique
 
 
 @dataclass
@@ -15,15 +105,31 @@ class Bookmark:
     updated_at: datetime = field(default_factory=datetime.now)
     visit_count: int = 0
     
+    @classmethod
+    def from_row(cls, row: Sequence) -> 'Bookmark':
+        """Build a bookmark from a plain tuple row in ROW_FIELDS order.
+
+        This is the hot path for every query, so it skips ``__init__`` and
+        leaves the timestamps as epoch seconds until they are first read.
+        """
+        bookmark = cls.__new__(cls)
+        (bookmark.id, bookmark.title, bookmark.url, bookmark.description, bookmark.tags,
+         bookmark._created_ts, bookmark._updated_ts, bookmark.visit_count) = row
+        return bookmark
+    
     def get_tags_list(self) -> List[str]:
-        """Get tags as a list of strings."""
+        """Get tags as a list of strings.
+
+        Tags are matched case-insensitively, the same way the tags table
+        stores them, so only the first spelling of a repeated tag is kept.
+        """
         if not self.tags:
             return []
-        return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
+        return _unique_tags(self.tags.split(','))
     
     def set_tags_list(self, tags_list: List[str]):
         """Set tags from a list of strings."""
-        self.tags = ','.join(tag.strip() for tag in tags_list if tag.strip())
+        self.tags = ','.join(_unique_tags(tags_list))
     
     def to_dict(self) -> dict:
         """Convert bookmark to dictionary for export."""
@@ -61,4 +167,8 @@ class Bookmark:
     
     def __repr__(self) -> str:
         """Debug representation of bookmark."""
-        return f"Bookmark(id={self.id}, title='{self.title}', url='{self.url}')"
\ No newline at end of file
+        return f"Bookmark(id={self.id}, title='{self.title}', url='{self.url}')"
+
+
+Bookmark.created_at = _LazyTimestamp('created_at', '_created_ts')
+Bookmark.updated_at = _LazyTimestamp('updated_at', '_updated_ts')
@@ -0,0 +1,289 @@
+"""
+Structured search queries.
+
+A query is a list of space-separated terms that must all match::
+
+    python "exact phrase" title:asyncio tag:python -tag:old
+    domain:github.com visits:>5 created:2024..2025
+
+A leading ``-`` negates a term. Words and phrases (optionally limited to
+title:, url: or description:) go to the full-text index, and tag:, domain:,
+visits:, created: and updated: terms become indexed SQL predicates, so the
+whole query runs as one parameterized statement with no filtering in
+Python. Other field names are rejected, except for URLs typed into the
+query (https://...), which are searched as text; quote a term to search
+for text containing a colon.
+
+Numbers and dates take an exact value, a comparison (>5, <=2024-06) or an
+inclusive range (1..10, 2024..2025, 2024-03..). Dates are a year, a month
+or a day, and cover the whole period.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple, Union
+from models import normalize_domain, registrable_domain, to_epoch
+from textnorm import fold
+
+# Fields a word or phrase can be limited to, all covered by the FTS index
+TEXT_FIELDS = ('title', 'url', 'description')
+
+# Range fields and the columns they compare
+RANGE_COLUMNS = {'visits': 'visit_count', 'created': 'created_at', 'updated': 'updated_at'}
+
+_TERM = re.compile(r'\s*(-?)(?:([A-Za-z]+):)?(?:"([^"]*)("?)|([^\s"]*))')
+_DATE = re.compile(r'(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+_COMPARISON = re.compile(r'(>=|<=|>|<)?(.*)$')
+
+
+class QuerySyntaxError(ValueError):
+    """Raised for queries that cannot be parsed."""
+
+
+@dataclass
+class Text:
+    """A word (prefix match) or quoted phrase, optionally in one field."""
+    value: str
+    field: Optional[str] = None
+    phrase: bool = False
+
+
+@dataclass
+class Tag:
+    """An exact tag name."""
+    name: str
+
+
+@dataclass
+class Domain:
+    """A host name without 'www.'; subdomains match too."""
+    name: str
+
+
+@dataclass
+class Range:
+    """A half-open [low, high) interval on a numeric column; None is unbounded."""
+    column: str
+    low: Optional[int] = None
+    high: Optional[int] = None
+
+
+@dataclass
+class Not:
+    """A negated term."""
+    term: 'Term'
+
+
+Term = Union[Text, Tag, Domain, Range, Not]
+
+
+@dataclass
+class Query:
+    """All terms of a query; a bookmark matches when every term does."""
+    terms: List[Term] = field(default_factory=list)
+
+
+@dataclass
+class CompiledQuery:
+    """A query split into the parts that DatabaseManager assembles into SQL.
+
+    ``match`` is the FTS5 expression every result must match (None when the
+    query has no positive text terms) and ``where`` are extra conditions on
+    the bookmarks table aliased as ``b``.
+    """
+    match: Optional[str] = None
+    where: List[str] = field(default_factory=list)
+    params: List[Any] = field(default_factory=list)
+
+
+def parse_query(text: str) -> Query:
+    """Parse query text into a Query of terms."""
+    query = Query()
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TERM.match(text, position)
+        if not match or match.end() == position:
+            raise QuerySyntaxError(f"Cannot parse query at: {text[position:]}")
+        position = match.end()
+        negated, name, quoted, closing, word = match.groups()
+        if quoted is not None and not closing:
+            raise QuerySyntaxError(f'Unterminated quote: "{quoted}')
+
+        term = _make_term(name.lower() if name else None,
+                          quoted if quoted is not None else word,
+                          quoted is not None, match.group(0).strip())
+        if term is not None:
+            query.terms.append(Not(term) if negated else term)
+
+    if not query.terms:
+        raise QuerySyntaxError("Query is empty")
+    return query
+
+
+def _make_term(name: Optional[str], value: str, phrase: bool, raw: str) -> Optional[Term]:
+    if name is not None and name not in TEXT_FIELDS + ('tag', 'domain') and name not in RANGE_COLUMNS:
+        if phrase or not value.startswith('//'):
+            raise QuerySyntaxError(f'Unknown field "{name}:" '
+                                   '(quote the term to search for it as text)')
+        # The scheme of a URL: search the URL as typed
+        name, value, phrase = None, raw.lstrip('-'), False
+    value = value.strip()
+    if not value:
+        if name is not None:
+            raise QuerySyntaxError(f"Missing value for {name}:")
+        return None
+
+    if name == 'tag':
+        return Tag(value)
+    if name == 'domain':
+        return Domain(normalize_domain(value))
+    if name in RANGE_COLUMNS:
+        parse_point = _number_period if name == 'visits' else _date_period
+        low, high = _parse_bounds(value, parse_point, name)
+        return Range(RANGE_COLUMNS[name], low, high)
+    return Text(value, name, phrase)
+
+
+def _parse_bounds(value: str, parse_point: Callable[[str], Tuple[int, int]],
+                  name: str) -> Tuple[Optional[int], Optional[int]]:
+    """Turn '5', '>5', '<=2024-06' or '1..10' into a half-open interval."""
+    try:
+        if '..' in value:
+            start, end = value.split('..', 1)
+            return (parse_point(start)[0] if start else None,
+                    parse_point(end)[1] if end else None)
+
+        operator, point = _COMPARISON.match(value).groups()
+        low, high = parse_point(point)
+    except ValueError:
+        raise QuerySyntaxError(f"Invalid value for {name}: {value}") from None
+    if operator == '>':
+        return high, None
+    if operator == '>=':
+        return low, None
+    if operator == '<':
+        return None, low
+    if operator == '<=':
+        return None, high
+    return low, high
+
+
+def _number_period(text: str) -> Tuple[int, int]:
+    number = int(text)
+    return number, number + 1
+
+
+def _date_period(text: str) -> Tuple[int, int]:
+    """Epoch bounds of the year, month or day a date string names."""
+    match = _DATE.match(text)
+    if not match:
+        raise ValueError(text)
+    year, month, day = (int(part) if part else None for part in match.groups())
+    if month is None:
+        start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    elif day is None:
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+    else:
+        start = datetime(year, month, day)
+        end = datetime.fromordinal(start.toordinal() + 1)
+    return to_epoch(start), to_epoch(end)
+
+
+def with_default_field(query: Query, field: str) -> Query:
+    """Limit the query's unqualified words and phrases to one field ('all' leaves it as is)."""
+    if field == 'all':
+        return query
+
+    def restrict(term: Term) -> Term:
+        if isinstance(term, Not):
+            return Not(restrict(term.term))
+        if isinstance(term, Text) and term.field is None:
+            return Text(term.value, field, term.phrase)
+        return term
+    return Query([restrict(term) for term in query.terms])
+
+
+def uses_visits(query: Query) -> bool:
+    """Whether a query has a visits: term, so visit counts can change its results."""
+    for term in query.terms:
+        if isinstance(term, Not):
+            term = term.term
+        if isinstance(term, Range) and term.column == 'visit_count':
+            return True
+    return False
+
+
+def compile_query(query: Query, fts_enabled: bool = True) -> CompiledQuery:
+    """Compile a parsed query for the bookmarks table.
+
+    Without the FTS5 index, text terms become LIKE conditions on the
+    folded columns instead.
+    """
+    compiled = CompiledQuery()
+    match_parts = []
+    for term in query.terms:
+        if isinstance(term, Text) and fts_enabled:
+            match_parts.append(_match_expression(term))
+        else:
+            _compile_term(term, compiled, fts_enabled)
+    if match_parts:
+        compiled.match = ' '.join(match_parts)
+    return compiled
+
+
+def _compile_term(term: Term, compiled: CompiledQuery, fts_enabled: bool, negated: bool = False):
+    """Add one term to the WHERE conditions."""
+    if isinstance(term, Not):
+        _compile_term(term.term, compiled, fts_enabled, not negated)
+        return
+
+    if isinstance(term, Domain):
+        condition, params = domain_condition(term.name)
+    elif isinstance(term, Text) and fts_enabled:
+        condition = 'b.id IN (SELECT rowid FROM bookmarks_fts WHERE bookmarks_fts MATCH ?)'
+        params = [_match_expression(term)]
+    elif isinstance(term, Text):
+        columns = [term.field] if term.field else ['title', 'url', 'description', 'tags']
+        condition = '(' + ' OR '.join(f'b.{column}_folded LIKE ?' for column in columns) + ')'
+        params = [f'%{fold(term.value)}%'] * len(columns)
+    elif isinstance(term, Tag):
+        condition = '''b.id IN (
+            SELECT bt.bookmark_id FROM tags t
+            JOIN bookmark_tags bt ON bt.tag_id = t.id
+            WHERE t.name = ?
+        )'''
+        params = [term.name]
+    else:
+        bounds = []
+        params = []
+        if term.low is not None:
+            bounds.append(f'b.{term.column} >= ?')
+            params.append(term.low)
+        if term.high is not None:
+            bounds.append(f'b.{term.column} < ?')
+            params.append(term.high)
+        condition = '(' + ' AND '.join(bounds) + ')' if bounds else '1'
+
+    compiled.where.append(f'NOT {condition}' if negated else condition)
+    compiled.params.extend(params)
+
+
+def _match_expression(term: Text) -> str:
+    """FTS5 expression for a word (as a prefix) or phrase over the folded columns."""
+    quoted = '"{}"'.format(fold(term.value).replace('"', '""'))
+    expression = quoted if term.phrase else quoted + '*'
+    return f'{{{term.field}_folded}} : {expression}' if term.field else expression
+
+
+def domain_condition(domain: str, prefix: str = 'b.') -> Tuple[str, List[Any]]:
+    """SQL condition matching a host and its subdomains through the domain indexes.
+
+    Subdomains share the registrable domain, so that index narrows the rows
+    before the suffix check.
+    """
+    condition = (f'({prefix}domain = ? OR ({prefix}registrable_domain = ? '
+                 f'AND substr({prefix}domain, -?) = ?))')
+    return condition, [domain, registrable_domain(domain), len(domain) + 1, '.' + domain]
@@ -0,0 +1,64 @@
+"""
+Hashed TF-IDF vectors for related-bookmark recommendations.
+
+Each bookmark becomes a sparse vector of term weights over its title,
+description, tags and URL tokens. Terms are hashed to integers (the
+"hashing trick"), so no vocabulary has to be stored or kept in sync. The
+database keeps one postings row per (term, bookmark) with the raw weighted
+term frequency; document frequencies and vector norms are stored next to
+them, so similarity is a sparse dot product over the query's terms that
+SQLite can compute with an indexed join instead of a scan of every vector.
+"""
+
+import math
+import re
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+from models import Bookmark
+
+# Hash space for terms; collisions are rare enough not to matter for ranking
+HASH_BITS = 24
+
+# Title and tag words say more about a bookmark than description or URL words
+FIELD_WEIGHTS = (('title', 2.0), ('tags', 2.0), ('description', 1.0), ('url', 1.0))
+
+# Terms in more than this share of all bookmarks (and more than
+# MAX_DF_FLOOR of them) are ignored when ranking: they barely change the
+# scores but have the longest postings lists
+MAX_DF = 0.05
+MAX_DF_FLOOR = 1000
+
+# URL pieces that carry no meaning of their own
+URL_NOISE = frozenset({'http', 'https', 'www', 'com', 'org', 'net', 'html', 'htm', 'php'})
+
+_WORD = re.compile(r'[^\W_]{2,}')
+
+
+def hash_term(term: str) -> int:
+    """Stable hash of a term, the same in every process."""
+    return zlib.crc32(term.encode('utf-8')) & ((1 << HASH_BITS) - 1)
+
+
+def term_frequencies(bookmark: Bookmark) -> Dict[int, float]:
+    """Field-weighted term frequencies of a bookmark, keyed by hashed term."""
+    frequencies: Dict[int, float] = {}
+    for field, weight in FIELD_WEIGHTS:
+        text: Optional[str] = getattr(bookmark, field)
+        if not text:
+            continue
+        for word in _WORD.findall(text.lower()):
+            if field == 'url' and word in URL_NOISE:
+                continue
+            term = hash_term(word)
+            frequencies[term] = frequencies.get(term, 0.0) + weight
+    return frequencies
+
+
+def idf(df: int, total: int) -> float:
+    """Smoothed inverse document frequency."""
+    return math.log((total + 1) / (df + 1)) + 1.0
+
+
+def vector_norm(terms: Iterable[Tuple[float, int]], total: int) -> float:
+    """Euclidean norm of a TF-IDF vector given its (tf, df) pairs."""
+    return math.sqrt(sum((tf * idf(df, total)) ** 2 for tf, df in terms))
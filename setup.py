@@ -70,6 +70,9 @@ setup(
             "pytest-cov>=3.0.0",
             "requests-mock>=1.9.0",
         ],
+        "fast-import": [
+            "ijson>=3.1",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -3,14 +3,26 @@ from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 import tempfile
 import os
+import shutil
 import sys
+import threading
 
 # Add the parent directory to the path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from bookmark_manager.database import DatabaseManager
-from bookmark_manager.models import Bookmark
-from bookmark_manager.utils import validate_url, fetch_title_from_url, export_to_json, import_from_json
+from bookmark_manager.migrations import SCHEMA_VERSION, get_schema_version, migrate
+from bookmark_manager.visits import VisitBuffer
+from bookmark_manager.cache import ResultCache, load_stats
+from bookmark_manager.textnorm import fold, unfold_markup
+from bookmark_manager.compression import detect_codec
+from bookmark_manager.jsonstream import (iter_json_array, iter_ndjson, iter_ndjson_reversed,
+                                         write_json_array, write_ndjson)
+from bookmark_manager.netscape import iter_netscape_bookmarks, write_netscape
+from bookmark_manager.models import (Bookmark, HIGHLIGHT_END, HIGHLIGHT_START, registrable_domain,
+                                     url_domain)
+from bookmark_manager.utils import (validate_url, fetch_title_from_url, export_to_json, import_from_json,
+                                    iter_ndjson_bookmarks, format_bookmark_display)
 from bookmark_manager.bookmark_manager import BookmarkManager
 
 
@@ -25,6 +37,7 @@ class TestDatabaseManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test database."""
+        self.db.close()
         os.unlink(self.temp_db.name)
     
     def test_init_database(self):
@@ -134,7 +147,339 @@ class TestDatabaseManager(unittest.TestCase):
         # Search in all fields
         results = self.db.search_bookmarks("python", "all")
         self.assertEqual(len(results), 2)
+
+    def test_search_ranked_by_relevance(self):
+        """Test that full-text search orders results by BM25 relevance."""
+        self.db.add_bookmark(Bookmark(title="Cooking", url="https://food.com",
+                                      description="Not about python at all"))
+        self.db.add_bookmark(Bookmark(title="Python docs", url="https://docs.python.org",
+                                      tags="python"))
+
+        results = self.db.search_bookmarks("python")
+        self.assertEqual([b.title for b in results], ["Python docs", "Cooking"])
+
+        # Field restriction and prefix matching
+        results = self.db.search_bookmarks("pyth", "description")
+        self.assertEqual([b.title for b in results], ["Cooking"])
+        self.assertEqual(self.db.search_bookmarks('"unbalanced'), [])
+
+    def test_search_index_follows_updates(self):
+        """Test that the FTS index is kept in sync and can be rebuilt."""
+        bookmark_id = self.db.add_bookmark(Bookmark(title="Old title", url="https://example.com"))
+        self.db.update_bookmark(bookmark_id, {"title": "Fresh title"})
+        self.assertEqual(len(self.db.search_bookmarks("old")), 0)
+        self.assertEqual(len(self.db.search_bookmarks("fresh")), 1)
+
+        self.assertTrue(self.db.rebuild_search_index())
+        self.assertEqual(len(self.db.search_bookmarks("fresh")), 1)
+
+        self.db.delete_bookmark(bookmark_id)
+        self.assertEqual(len(self.db.search_bookmarks("fresh")), 0)
     
+    def test_substring_and_fuzzy_search(self):
+        """Test trigram-backed substring search and typo-tolerant ranking."""
+        self.db.add_bookmark(Bookmark(title="Python asyncio guide", url="https://docs.python.org/asyncio",
+                                      tags="python,async"))
+        self.db.add_bookmark(Bookmark(title="JavaScript promises", url="https://javascript.info",
+                                      tags="js"))
+        self.db.add_bookmark(Bookmark(title="Pythonic patterns", url="https://patterns.dev",
+                                      description="not about asyncio"))
+        self.assertTrue(self.db.trigram_enabled)
+
+        self.assertEqual([b.title for b in self.db.iter_substring("SYNCI")], ["Python asyncio guide"])
+        self.assertEqual([b.title for b in self.db.iter_substring("script", "title")],
+                         ["JavaScript promises"])
+        self.assertEqual(len(list(self.db.iter_substring("py"))), 2)
+        self.assertEqual([b.title for b in self.db.iter_substring("asyncio", "description")],
+                         ["Pythonic patterns"])
+
+        matches = self.db.fuzzy_search("pyhton asyncoi")
+        self.assertEqual(matches[0][0].title, "Python asyncio guide")
+        self.assertTrue(all(0.3 <= score <= 1 for _, score in matches))
+        self.assertEqual(self.db.fuzzy_search("pyhton", threshold=0.99), [])
+        self.assertEqual([b.title for b, _ in self.db.fuzzy_search("javscript", "url")],
+                         ["JavaScript promises"])
+
+    def test_structured_query(self):
+        """Test the query language: tags, negation, phrases, ranges and domains."""
+        def add(title, url, tags, visits, year):
+            stamp = datetime(year, 6, 1)
+            self.db.add_bookmark(Bookmark(title=title, url=url, tags=tags, visit_count=visits,
+                                          created_at=stamp, updated_at=stamp))
+
+        add("Async Python", "https://github.com/python/asyncio", "python,async", 10, 2024)
+        add("Old Python tricks", "https://blog.example.com/py2", "python,old", 20, 2019)
+        add("Python async patterns", "https://docs.github.com/async", "python,async", 2, 2025)
+        add("Rust book", "https://doc.rust-lang.org", "rust", 7, 2024)
+
+        def titles(text):
+            return [b.title for b in self.db.iter_query(text)]
+
+        self.assertEqual(titles("tag:python tag:async -tag:old visits:>5"), ["Async Python"])
+        self.assertEqual(titles('"async patterns"'), ["Python async patterns"])
+        self.assertEqual(titles("domain:github.com"), ["Python async patterns", "Async Python"])
+        self.assertEqual(titles("-domain:github.com created:2019..2024"),
+                         ["Rust book", "Old Python tricks"])
+        self.assertCountEqual(titles("title:python visits:2..10 created:>=2024-06"),
+                              ["Python async patterns", "Async Python"])
+        self.assertEqual(titles("python -async"), ["Old Python tricks"])
+        self.assertEqual(titles("https://github.com/python"), ["Async Python"])
+        self.assertEqual(titles("python -https://github.com/python"),
+                         ["Python async patterns", "Old Python tricks"])
+
+        for bad in ['"unterminated', 'visits:lots', 'created:2024-13', 'tag:', '   ',
+                    'lang:python', '-foo:bar', 'note:"two words"']:
+            with self.assertRaises(ValueError):
+                list(self.db.iter_query(bad))
+
+    def test_result_cache_invalidation(self):
+        """Test that cached searches are dropped by local and external writes."""
+        self.db.close()
+        self.db = DatabaseManager(self.temp_db.name, cache=ResultCache())
+        self.db.add_bookmark(Bookmark(title="Python docs", url="https://python.org", tags="python"))
+
+        self.assertEqual(len(self.db.search_bookmarks("python")), 1)
+        self.assertEqual(len(self.db.search_bookmarks("python")), 1)
+        self.assertEqual(self.db.get_all_tags(), ["python"])
+        self.assertEqual(self.db.cache.stats()['hits'], 1)
+
+        self.db.add_bookmark(Bookmark(title="Python blog", url="https://blog.python.org"))
+        self.assertEqual(len(self.db.search_bookmarks("python")), 2)
+
+        # A write by another connection is noticed through PRAGMA data_version
+        with DatabaseManager(self.temp_db.name) as other:
+            other.update_bookmark(1, {"tags": "python,docs"})
+        self.assertEqual(self.db.get_all_tags(), ["docs", "python"])
+        self.assertEqual(self.db.cache.stats()['invalidations'], 2)
+
+    def test_result_cache_bounds(self):
+        """Test LRU eviction by entry count and size, and persisted counters."""
+        cache = ResultCache(max_entries=2, max_bytes=10000,
+                            stats_path=self.temp_db.name + '.cache-stats')
+        cache.put('a', 0, [1])
+        cache.put('b', 0, [2])
+        self.assertEqual(cache.get('a', 0), (True, [1]))
+        cache.put('c', 0, [3])
+        self.assertEqual(cache.get('b', 0), (False, None))
+        cache.put('big', 0, ['x' * 20000])
+        self.assertEqual(cache.get('big', 0), (False, None))
+        self.assertEqual(cache.get('a', 1), (False, None))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        cache.save_stats()
+        cache.get('a', 1)
+        cache.save_stats()
+        saved = load_stats(cache.stats_path)
+        os.unlink(cache.stats_path)
+        self.assertEqual(saved, {'hits': 1, 'misses': 4, 'evictions': 1, 'invalidations': 1})
+
+    def test_result_cache_shared_file(self):
+        """Test that a cache file lets a later manager reuse results until a write."""
+        path = self.temp_db.name + '.cache'
+        self.addCleanup(os.unlink, path)
+        self.db.add_bookmark(Bookmark(title="Python docs", url="https://python.org", tags="python"))
+        with DatabaseManager(self.temp_db.name, cache=ResultCache(path=path)) as first:
+            self.assertEqual(len(first.search_bookmarks("python")), 1)
+
+        second = DatabaseManager(self.temp_db.name, cache=ResultCache(path=path))
+        self.addCleanup(second.close)
+        self.assertEqual(len(second.search_bookmarks("python")), 1)
+        self.assertEqual(second.cache.stats()['hits'], 1)
+
+        # A commit by any connection bumps the change counter in the database
+        self.db.add_bookmark(Bookmark(title="Python blog", url="https://blog.python.org"))
+        with DatabaseManager(self.temp_db.name, cache=ResultCache(path=path)) as third:
+            self.assertEqual(len(third.search_bookmarks("python")), 2)
+            self.assertEqual(third.cache.stats()['hits'], 0)
+        self.assertEqual(len(second.search_bookmarks("python")), 2)
+        self.assertEqual(second.cache.stats()['hits'], 2)
+
+    def test_related_bookmarks(self):
+        """Test TF-IDF recommendations and their incremental updates."""
+        python_id = self.db.add_bookmark(Bookmark(title="Python asyncio tutorial",
+                                                  url="https://realpython.com/async-io",
+                                                  tags="python,async"))
+        self.db.add_bookmark(Bookmark(title="Asyncio in depth", url="https://docs.python.org/asyncio",
+                                      tags="python,async"))
+        self.db.add_bookmark(Bookmark(title="Python packaging guide", url="https://packaging.python.org",
+                                      tags="python"))
+        self.db.add_bookmark(Bookmark(title="Sourdough bread", url="https://baking.example.com",
+                                      tags="cooking"))
+
+        related = self.db.related_bookmarks(python_id)
+        self.assertEqual([b.title for b, _ in related], ["Asyncio in depth", "Python packaging guide"])
+        self.assertTrue(1 >= related[0][1] > related[1][1] > 0)
+
+        # Edits and deletes are picked up without a rebuild
+        bread_id = self.db.get_bookmark_by_url("https://baking.example.com").id
+        self.db.update_bookmark(bread_id, {"title": "Asyncio bread machine", "tags": "async"})
+        self.assertIn("Asyncio bread machine", [b.title for b, _ in self.db.related_bookmarks(python_id)])
+        self.db.delete_bookmark(bread_id)
+        self.assertEqual(len(self.db.related_bookmarks(python_id)), 2)
+        self.assertEqual(self.db.rebuild_related_index(), 3)
+
+    def test_complete_prefix(self):
+        """Test prefix completion of titles, tags and domains ranked by visits."""
+        self.db.add_bookmarks([
+            Bookmark(title="Python docs", url="https://docs.python.org", tags="python", visit_count=3),
+            Bookmark(title="pytest guide", url="https://www.pytest.org", tags="pytest,python", visit_count=9),
+            Bookmark(title="Rust book", url="https://doc.rust-lang.org", tags="rust", visit_count=20),
+        ])
+        self.assertEqual(self.db.complete("PY"), [("pytest guide", 9), ("Python docs", 3)])
+        self.assertEqual(self.db.complete("py", field="tag"), [("python", 12), ("pytest", 9)])
+        self.assertEqual(self.db.complete("py", field="domain"), [("pytest.org", 9)])
+        self.assertEqual(self.db.complete("doc", field="domain", limit=1), [("doc.rust-lang.org", 20)])
+        self.assertEqual(self.db.complete("go"), [])
+        with self.assertRaises(ValueError):
+            self.db.complete("py", field="url")
+
+        # Tag visit totals follow visits, retagging and deletes
+        rust = self.db.get_bookmark_by_url("https://doc.rust-lang.org")
+        self.db.increment_visit_count(rust.id)
+        self.db.update_bookmark(rust.id, {"tags": "rust,python"})
+        self.assertEqual(self.db.complete("pyth", field="tag"), [("python", 33)])
+        self.db.delete_bookmark(rust.id)
+        self.assertEqual(self.db.complete("pyth", field="tag"), [("python", 12)])
+        self.assertEqual(self.db.recompute_stats(), {})
+
+    def test_search_facets(self):
+        """Test per-tag, per-domain and per-month counts of search hits."""
+        self.db.add_bookmarks([
+            Bookmark(title="Python docs", url="https://docs.python.org/3/", tags="python,docs",
+                     created_at=datetime(2024, 3, 5)),
+            Bookmark(title="Python tutorial", url="https://www.docs.python.org/tut", tags="python",
+                     created_at=datetime(2024, 3, 20)),
+            Bookmark(title="Python on GitHub", url="https://github.com/python", tags="python,git",
+                     created_at=datetime(2024, 5, 1)),
+            Bookmark(title="Rust book", url="https://doc.rust-lang.org", tags="rust",
+                     created_at=datetime(2024, 5, 2)),
+        ])
+        facets = self.db.search_facets("python")
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['tags'], [("python", 3), ("docs", 1), ("git", 1)])
+        self.assertEqual(facets['domains'], [("docs.python.org", 2), ("github.com", 1)])
+        self.assertEqual(facets['months'], [("2024-05", 1), ("2024-03", 2)])
+        self.assertEqual(self.db.search_facets("python", limit=1)['tags'], [("python", 3)])
+        self.assertEqual(self.db.search_facets("nothing"),
+                         {'total': 0, 'tags': [], 'domains': [], 'months': []})
+
+    def test_domain_columns(self):
+        """Test the stored domain columns behind domain filters and reports."""
+        self.db.add_bookmarks([
+            Bookmark(title="Docs", url="https://docs.python.org/3/", visit_count=4),
+            Bookmark(title="PyPI", url="https://pypi.python.org", visit_count=1),
+            Bookmark(title="Python", url="https://www.Python.org/about", visit_count=2),
+            Bookmark(title="BBC", url="https://news.bbc.co.uk/world", visit_count=7),
+            Bookmark(title="Spoof", url="https://notpython.org", visit_count=3),
+        ])
+        titles = lambda domain: sorted(b.title for b in self.db.iter_bookmarks({'domain': domain}))
+        self.assertEqual(titles("python.org"), ["Docs", "PyPI", "Python"])
+        self.assertEqual(titles("WWW.docs.python.org"), ["Docs"])
+        self.assertEqual(titles("bbc.co.uk"), ["BBC"])
+        self.assertEqual([b.title for b in self.db.iter_query("domain:python.org -domain:pypi.python.org")],
+                         ["Python", "Docs"])
+
+        self.assertEqual(self.db.get_domain_stats(limit=2, registrable=True),
+                         [("python.org", 3, 7), ("bbc.co.uk", 1, 7)])
+        self.assertEqual(self.db.get_domain_stats(limit=2),
+                         [("docs.python.org", 1, 4), ("news.bbc.co.uk", 1, 7)])
+
+        # Changing the URL moves the bookmark to its new domain
+        spoof = self.db.get_bookmark_by_url("https://notpython.org")
+        self.db.update_bookmark(spoof.id, {"url": "https://wiki.python.org"})
+        self.assertEqual(titles("python.org"), ["Docs", "PyPI", "Python", "Spoof"])
+        self.assertEqual(self.db.complete("wi", field="domain"), [("wiki.python.org", 3)])
+
+        # Domain listings page by cursor in the requested order
+        filters = {'domain': 'python.org'}
+        page = self.db.get_bookmarks_page(limit=3, sort='visits', filters=filters)
+        self.assertEqual([b.title for b in page['bookmarks']], ["Docs", "Spoof", "Python"])
+        rest = self.db.get_bookmarks_page(limit=3, after=page['next'], sort='visits', filters=filters)
+        self.assertEqual([b.title for b in rest['bookmarks']], ["PyPI"])
+        self.assertIsNone(rest['next'])
+
+    def test_search_highlights(self):
+        """Test FTS highlights and description snippets on search results."""
+        description = ' '.join(['filler'] * 50) + ' all about asyncio internals ' + ' '.join(['tail'] * 50)
+        self.db.add_bookmark(Bookmark(title="Asyncio deep dive", url="https://example.com/asyncio",
+                                      description=description, tags="python,async"))
+
+        [(bookmark, highlights)] = list(self.db.iter_search_highlighted("asyncio"))
+        self.assertEqual(bookmark.title, "Asyncio deep dive")
+        self.assertEqual(highlights['title'], f"{HIGHLIGHT_START}Asyncio{HIGHLIGHT_END} deep dive")
+        self.assertIn(f"{HIGHLIGHT_START}asyncio{HIGHLIGHT_END}", highlights['url'])
+        self.assertEqual(highlights['tags'], "python,async")
+        snippet = highlights['description']
+        self.assertIn(f"about {HIGHLIGHT_START}asyncio{HIGHLIGHT_END} internals", snippet)
+        self.assertTrue(snippet.startswith('...') and snippet.endswith('...'))
+        self.assertLess(len(snippet), len(description) // 3)
+
+        shown = format_bookmark_display(bookmark, highlights=highlights)
+        self.assertNotIn(HIGHLIGHT_START, shown)
+        self.assertNotIn('tail tail tail tail tail tail tail tail tail tail', shown)
+        self.assertEqual(list(self.db.iter_search_highlighted("   ")), [])
+
+    def test_collections(self):
+        """Test saved searches whose members follow bookmark changes."""
+        python_id = self.db.add_bookmark(Bookmark(title="Python articles", url="https://py.com",
+                                                  tags="python"))
+        self.db.add_bookmark(Bookmark(title="Rust articles", url="https://rust.com", tags="rust"))
+        self.assertEqual(self.db.create_collection("Unread Python", "tag:python visits:0"), 1)
+        self.assertEqual(self.db.create_collection("Articles", "articles", search_in="title"), 2)
+        self.db.create_collection("Described", "articles", search_in="description")
+        with self.assertRaises(ValueError):
+            self.db.create_collection("unread python", "python")
+        with self.assertRaisesRegex(ValueError, "Unterminated quote"):
+            self.db.create_collection("Broken", '"unterminated')
+
+        members = lambda name: sorted(b.title for b in self.db.iter_collection(name))
+        self.assertEqual(members("Described"), [])
+
+        # Only the changed bookmark is re-checked, and visits count for visits: queries
+        self.db.add_bookmarks([Bookmark(title="More articles", url="https://more.com", tags="python")])
+        self.assertEqual(members("Unread Python"), ["More articles", "Python articles"])
+        self.db.increment_visit_count(python_id)
+        self.assertEqual(members("Unread Python"), ["More articles"])
+        self.db.update_bookmark(python_id, {"title": "Python notes"})
+        self.assertEqual(members("Articles"), ["More articles", "Rust articles"])
+        self.db.delete_bookmark_by_url("https://more.com")
+        self.assertEqual([(name, size) for name, _, _, size in self.db.get_collections()],
+                         [("Articles", 1), ("Described", 0), ("Unread Python", 0)])
+
+        self.assertEqual(self.db.refresh_collections(), 3)
+        self.assertTrue(self.db.delete_collection("Articles"))
+        with self.assertRaises(ValueError):
+            self.db.iter_collection("Articles")
+
+    def test_folded_search(self):
+        """Test that full-text, substring, fuzzy and completion matching ignore case and accents."""
+        self.db.add_bookmarks([
+            Bookmark(title="İstanbul Café guide", url="https://cafe.example", tags="Reisen"),
+            Bookmark(title="Straße maps", url="https://maps.example", tags="Größe",
+                     description="Ünïcode notes"),
+            Bookmark(title="Kırmızı elma", url="https://elma.example"),
+        ])
+        titles = lambda results: [b.title for b in results]
+        self.assertEqual(titles(self.db.search_bookmarks("ıstanbul")), ["İstanbul Café guide"])
+        self.assertEqual(titles(self.db.search_bookmarks("kirmizi")), ["Kırmızı elma"])
+        self.assertEqual(titles(self.db.search_bookmarks("strasse", "title")), ["Straße maps"])
+        self.assertEqual(titles(self.db.search_bookmarks("STRASSE", "tags")), [])
+        self.assertEqual(titles(self.db.iter_query('title:"STRASSE maps" grosse')), ["Straße maps"])
+        self.assertEqual(self.db.search_facets("gröSSe")['tags'], [("Größe", 1)])
+        [(_, highlights)] = list(self.db.iter_search_highlighted("strasse"))
+        self.assertEqual(highlights['title'], f"{HIGHLIGHT_START}Straße{HIGHLIGHT_END} maps")
+        self.assertEqual(titles(self.db.iter_substring("istanbul cafe")), ["İstanbul Café guide"])
+        self.assertEqual(titles(self.db.iter_substring("ıSTANBUL", "title")), ["İstanbul Café guide"])
+        self.assertEqual(titles(self.db.iter_substring("strasse")), ["Straße maps"])
+        self.assertEqual(titles(self.db.iter_substring("unicode", "description")), ["Straße maps"])
+        self.assertEqual(titles(b for b, _ in self.db.fuzzy_search("istanbol")), ["İstanbul Café guide"])
+        self.assertEqual(self.db.complete("ista"), [("İstanbul Café guide", 0)])
+        self.assertEqual(self.db.complete("gross", field="tag"), [("Größe", 0)])
+
+        bookmark = self.db.get_bookmark_by_url("https://maps.example")
+        self.db.update_bookmark(bookmark.id, {"title": "Ærø ferries"})
+        self.assertEqual(titles(self.db.iter_substring("aero")), ["Ærø ferries"])
+
     def test_get_bookmark_stats(self):
         """Test getting bookmark statistics."""
         # Add test bookmarks
@@ -153,6 +498,32 @@ class TestDatabaseManager(unittest.TestCase):
         self.assertEqual(stats['visited'], 1)
         self.assertEqual(stats['max_visits'], 2)
     
+    def test_stats_maintained_by_triggers(self):
+        """Test that counters follow inserts, visits, updates and deletes."""
+        first = self.db.add_bookmark(Bookmark(title="First", url="https://first.com", visit_count=3))
+        second = self.db.add_bookmark(Bookmark(title="Second", url="https://second.com"))
+        self.db.add_bookmarks([Bookmark(title="Third", url="https://third.com")])
+        self.db.increment_visit_count(second)
+        self.db.update_bookmark(first, {"visit_count": 0})
+        self.db.delete_bookmark(second)
+
+        stats = self.db.get_bookmark_stats()
+        self.assertEqual((stats['total'], stats['visited'], stats['max_visits']), (2, 0, 0))
+        self.assertEqual(self.db.get_total_count(), 2)
+        self.assertEqual(self.db.recompute_stats(), {})
+
+    def test_recompute_stats_repairs_drift(self):
+        """Test that a full recount reports and fixes stale counters."""
+        self.db.add_bookmark(Bookmark(title="First", url="https://first.com", tags="a"))
+        conn = self.db.get_connection()
+        conn.execute('UPDATE bookmark_stats SET total = 7')
+        conn.execute("UPDATE tags SET bookmark_count = 5 WHERE name = 'a'")
+        conn.commit()
+
+        self.assertEqual(self.db.recompute_stats(), {'total': (7, 1), 'tag:a': (5, 1)})
+        self.assertEqual(self.db.get_total_count(), 1)
+        self.assertEqual(self.db.get_tag_counts(), [('a', 1)])
+
     def test_get_all_tags(self):
         """Test getting all unique tags."""
         # Add test bookmarks with tags
@@ -169,6 +540,310 @@ class TestDatabaseManager(unittest.TestCase):
         expected_tags = ['java', 'javascript', 'programming', 'python', 'web']
         self.assertEqual(sorted(tags), expected_tags)
 
+    def test_tag_counts_and_exact_filtering(self):
+        """Test normalized tags: counts and exact AND/OR tag filters."""
+        first = self.db.add_bookmark(Bookmark(title="NumPy", url="https://numpy.org", tags="numpy,science"))
+        self.db.add_bookmark(Bookmark(title="Python", url="https://python.org", tags="python,Science"))
+        self.db.add_bookmark(Bookmark(title="Py", url="https://py.org", tags="py"))
+
+        self.assertEqual(self.db.get_tag_counts(), [('numpy', 1), ('py', 1), ('python', 1), ('science', 2)])
+
+        # Exact matching: 'py' does not match 'numpy' or 'python'
+        results = self.db.get_bookmarks_by_tags(['py'])
+        self.assertEqual([b.title for b in results], ["Py"])
+
+        results = self.db.get_bookmarks_by_tags(['SCIENCE', 'python'])
+        self.assertEqual([b.title for b in results], ["Python"])
+
+        results = self.db.get_bookmarks_by_tags(['py', 'numpy'], match_all=False)
+        self.assertEqual(sorted(b.title for b in results), ["NumPy", "Py"])
+
+        # Updates and deletes keep the tag index in sync
+        self.db.update_bookmark(first, {"tags": "numpy"})
+        self.assertEqual(dict(self.db.get_tag_counts())['science'], 1)
+        self.db.delete_bookmark(first)
+        self.assertNotIn('numpy', self.db.get_all_tags())
+
+    def test_tags_migrated_from_csv_column(self):
+        """Test that existing CSV tags are copied into the tag tables."""
+        conn = self.db.get_connection()
+        conn.execute("INSERT INTO bookmarks (title, url, tags, created_at, updated_at) "
+                     "VALUES ('Old', 'https://old.com', 'legacy, data', '2023-01-01 00:00:00', '2023-01-01 00:00:00')")
+        conn.execute('DROP TABLE bookmark_tags')
+        conn.execute('PRAGMA user_version = 2')
+        conn.commit()
+        self.db.close()
+
+        db = DatabaseManager(self.temp_db.name)
+        try:
+            self.assertEqual(db.get_all_tags(), ['data', 'legacy'])
+            self.assertEqual([b.title for b in db.get_bookmarks_by_tags(['legacy'])], ['Old'])
+        finally:
+            db.close()
+
+    def test_add_bookmarks_duplicate_policies(self):
+        """Test bulk inserts with skip, update and merge duplicate handling."""
+        self.db.add_bookmark(Bookmark(title="Old", url="https://a.com", tags="one"))
+        rows = [
+            Bookmark(title="New A", url="https://a.com", tags="two"),
+            Bookmark(title="B", url="https://b.com", tags="three"),
+            Bookmark(title="B again", url="https://b.com"),
+        ]
+
+        counts = self.db.add_bookmarks(rows, batch_size=2)
+        self.assertEqual(counts, {'inserted': 1, 'updated': 0, 'skipped': 2})
+        self.assertEqual(self.db.get_bookmark_by_url("https://a.com").title, "Old")
+
+        counts = self.db.add_bookmarks(rows[:1], on_duplicate='merge')
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1, 'skipped': 0})
+        merged = self.db.get_bookmark_by_url("https://a.com")
+        self.assertEqual((merged.title, merged.tags), ("Old", "one,two"))
+        self.assertEqual(self.db.add_bookmarks(rows[:1], on_duplicate='merge')['skipped'], 1)
+
+        counts = self.db.add_bookmarks(rows[:1], on_duplicate='update')
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1, 'skipped': 0})
+        updated = self.db.get_bookmark_by_url("https://a.com")
+        self.assertEqual((updated.title, updated.tags), ("New A", "two"))
+
+        self.assertEqual(self.db.get_tag_counts(), [('three', 1), ('two', 1)])
+        self.assertEqual(len(self.db.search_bookmarks("new")), 1)
+        with self.assertRaises(ValueError):
+            self.db.add_bookmarks(rows, on_duplicate='replace')
+
+    def test_keyset_pagination(self):
+        """Test walking pages forwards and backwards with cursors."""
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        for i in range(25):
+            self.db.add_bookmark(Bookmark(title=f"Bookmark {i:02d}", url=f"https://example.com/{i}",
+                                          created_at=same_time, updated_at=same_time,
+                                          visit_count=i % 5))
+
+        for sort, reverse in [('created', False), ('visits', False), ('title', True)]:
+            expected = [b.id for b in self.db.get_all_bookmarks(sort=sort, reverse=reverse)]
+            seen, pages, cursor = [], [], None
+            while True:
+                page = self.db.get_bookmarks_page(limit=10, after=cursor, sort=sort, reverse=reverse)
+                pages.append(page)
+                seen.extend(b.id for b in page['bookmarks'])
+                cursor = page['next']
+                if cursor is None:
+                    break
+            self.assertEqual(seen, expected)
+            self.assertEqual([len(p['bookmarks']) for p in pages], [10, 10, 5])
+            self.assertIsNone(pages[0]['prev'])
+
+            back = self.db.get_bookmarks_page(limit=10, before=pages[2]['prev'], sort=sort, reverse=reverse)
+            self.assertEqual([b.id for b in back['bookmarks']], expected[10:20])
+            self.assertEqual(back['next'], pages[1]['next'])
+
+        # Filtered listings page the same way
+        for i in range(0, 25, 2):
+            self.db.update_bookmark(i + 1, {"tags": "even"})
+        filters = {'tags': ['even']}
+        expected = [b.id for b in self.db.iter_bookmarks(filters, order='title', reverse=True)]
+        self.assertEqual(len(expected), 13)
+        page = self.db.get_bookmarks_page(limit=10, sort='title', reverse=True, filters=filters)
+        rest = self.db.get_bookmarks_page(limit=10, after=page['next'], sort='title', reverse=True,
+                                          filters=filters)
+        self.assertEqual([b.id for b in page['bookmarks'] + rest['bookmarks']], expected)
+        self.assertIsNone(rest['next'])
+        self.assertEqual([b.id for b in self.db.get_all_bookmarks(3, 10, 'title', True, filters)],
+                         expected[10:])
+        self.assertEqual(self.db.get_total_count(filters), 13)
+
+        first = self.db.get_bookmarks_page(limit=10)
+        with self.assertRaises(ValueError):
+            self.db.get_bookmarks_page(limit=10, after=first['next'], sort='visits')
+        with self.assertRaises(ValueError):
+            self.db.get_bookmarks_page(limit=10, after='not-a-cursor')
+
+    def test_keyset_pages_use_sort_indexes(self):
+        """Test that every listing sort reads pages from its index without sorting."""
+        for i in range(5):
+            self.db.add_bookmark(Bookmark(title=f"Bookmark {i}", url=f"https://example.com/{i}"))
+        conn = self.db.get_connection()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            for sort, name in [('created', 'created'), ('updated', 'updated'),
+                               ('visits', 'visits'), ('title', 'title')]:
+                for reverse in (False, True):
+                    first = self.db.get_bookmarks_page(limit=2, sort=sort, reverse=reverse)
+                    self.db.get_bookmarks_page(limit=2, after=first['next'], sort=sort, reverse=reverse)
+                    for sql in [s for s in statements if 'LIMIT' in s][-2:]:
+                        plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql))
+                        self.assertIn(f'USING INDEX idx_bookmarks_{name}', plan)
+                        self.assertNotIn('TEMP B-TREE', plan)
+        finally:
+            conn.set_trace_callback(None)
+
+    def test_iterators_stream_in_chunks(self):
+        """Test that iter_bookmarks and iter_search yield lazily and match the list APIs."""
+        for i in range(7):
+            self.db.add_bookmark(Bookmark(title=f"Python {i}", url=f"https://example.com/{i}",
+                                          tags="odd" if i % 2 else "even"))
+
+        iterator = self.db.iter_bookmarks(chunk_size=3)
+        self.assertEqual(next(iterator).title, "Python 6")
+        self.assertEqual(1 + len(list(iterator)), 7)
+
+        self.assertEqual([b.id for b in self.db.iter_bookmarks(order='title', chunk_size=2)],
+                         [b.id for b in self.db.get_all_bookmarks(sort='title')])
+        self.assertEqual(len(list(self.db.iter_bookmarks({'tags': ['odd']}, chunk_size=2))), 3)
+        self.assertEqual([b.id for b in self.db.iter_search("python", chunk_size=2)],
+                         [b.id for b in self.db.search_bookmarks("python")])
+        self.assertEqual(list(self.db.iter_search("   ")), [])
+
+        with self.assertRaises(ValueError):
+            self.db.iter_bookmarks({'colour': 'red'})
+
+    def test_migrations_upgrade_legacy_database(self):
+        """Test that a pre-migration database is brought up to the current schema."""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+        import sqlite3
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute('''
+            CREATE TABLE bookmarks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                url TEXT NOT NULL UNIQUE,
+                description TEXT,
+                tags TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                visit_count INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute("INSERT INTO bookmarks (title, url, tags, created_at, updated_at) "
+                     "VALUES ('Legacy', 'https://legacy.com', 'old', '2023-01-01 00:00:00', '2023-01-01 00:00:00')")
+        conn.execute("INSERT INTO bookmarks (title, url, tags, created_at, updated_at) "
+                     "VALUES ('Große Kırmızı', 'https://WWW.news.bbc.co.uk/x', ' Old ,Ünï,, OLD', "
+                     "'2023-01-02 00:00:00', '2023-01-02 00:00:00')")
+        conn.commit()
+        self.assertEqual(get_schema_version(conn), 0)
+        conn.close()
+
+        self.db = DatabaseManager(self.temp_db.name)
+        conn = self.db.get_connection()
+        self.assertEqual(get_schema_version(conn), SCHEMA_VERSION)
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({'idx_bookmarks_created', 'idx_bookmarks_updated', 'idx_bookmarks_visits'} <= indexes)
+        self.assertEqual([b.title for b in self.db.search_bookmarks("legacy")], ['Legacy'])
+        self.assertEqual(self.db.get_all_tags(), ['old', 'Ünï'])
+        self.assertEqual(self.db.get_bookmark_by_url('https://legacy.com').created_at,
+                         datetime(2023, 1, 1))
+        self.assertEqual(conn.execute("SELECT typeof(created_at) FROM bookmarks").fetchone()[0],
+                         'integer')
+        self.assertEqual(conn.execute("SELECT domain, registrable_domain FROM bookmarks").fetchall(),
+                         [('legacy.com', 'legacy.com'), ('news.bbc.co.uk', 'bbc.co.uk')])
+        self.assertEqual(conn.execute("SELECT title_folded, tags_folded FROM bookmarks").fetchall(),
+                         [('legacy', 'old'), ('grosse kirmizi', ' old ,uni,, old')])
+        self.assertEqual([b.title for b in self.db.search_bookmarks("kirmizi")], ['Große Kırmızı'])
+
+        # A current database is left alone
+        self.assertEqual(migrate(conn), SCHEMA_VERSION)
+
+    def test_failed_migration_rolls_back(self):
+        """Test that a failing step leaves the schema version unchanged."""
+        from bookmark_manager import migrations
+
+        conn = self.db.get_connection()
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION - 1}')
+
+        def broken_step(cursor):
+            cursor.execute('CREATE TABLE half_done (x)')
+            raise RuntimeError("boom")
+
+        with patch.object(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:-1] +
+                          [(SCHEMA_VERSION, 'Broken', broken_step)]):
+            with self.assertRaises(RuntimeError):
+                migrations.migrate(conn)
+
+        self.assertEqual(get_schema_version(conn), SCHEMA_VERSION - 1)
+        self.assertIsNone(conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone())
+
+    def test_buffered_visits(self):
+        """Test that buffered visits are coalesced, visible and flushed in batches."""
+        bookmark_id = self.db.add_bookmark(Bookmark(title="Test", url="https://example.com"))
+        self.db.visit_buffer = VisitBuffer(max_pending=3)
+
+        self.db.increment_visit_count(bookmark_id)
+        self.db.increment_visit_count(bookmark_id)
+        stored = self.db.get_connection().execute(
+            'SELECT visit_count FROM bookmarks WHERE id = ?', (bookmark_id,)).fetchone()[0]
+        self.assertEqual(stored, 0)
+        self.assertEqual(self.db.get_bookmark_by_id(bookmark_id).visit_count, 2)
+
+        # The third visit reaches the size threshold
+        self.db.increment_visit_count(bookmark_id)
+        self.assertEqual(len(self.db.visit_buffer), 0)
+        self.assertEqual(self.db.get_bookmark_by_id(bookmark_id).visit_count, 3)
+
+        self.db.increment_visit_count(bookmark_id)
+        self.assertEqual(self.db.get_bookmark_stats()['max_visits'], 4)
+
+        # Missing bookmarks are reported, not buffered
+        self.db.increment_visit_count(bookmark_id)
+        self.assertFalse(self.db.increment_visit_count(bookmark_id + 1))
+        self.assertEqual(len(self.db.visit_buffer), 1)
+
+    def test_spooled_visits_across_processes(self):
+        """Test that spooled visits survive the process and are flushed later."""
+        bookmark_id = self.db.add_bookmark(Bookmark(title="Test", url="https://example.com"))
+        spool = self.temp_db.name + '.visits'
+        try:
+            for _ in range(2):
+                with DatabaseManager(self.temp_db.name, visit_buffer=VisitBuffer(spool_path=spool)) as db:
+                    db.increment_visit_count(bookmark_id)
+            self.assertTrue(os.path.exists(spool))
+            self.assertEqual(self.db.get_bookmark_by_id(bookmark_id).visit_count, 0)
+
+            reader = DatabaseManager(self.temp_db.name, visit_buffer=VisitBuffer(spool_path=spool))
+            self.assertEqual(reader.get_bookmark_by_id(bookmark_id).visit_count, 2)
+            self.assertEqual(reader.flush_visits(), 2)
+            reader.close()
+            self.assertFalse(os.path.exists(spool))
+            self.assertEqual(self.db.get_bookmark_by_id(bookmark_id).visit_count, 2)
+        finally:
+            if os.path.exists(spool):
+                os.unlink(spool)
+
+    def test_connection_reused(self):
+        """Test that one connection is kept per thread and uses WAL."""
+        conn = self.db.get_connection()
+        self.db.add_bookmark(Bookmark(title="Test", url="https://example.com"))
+        self.assertIs(self.db.get_connection(), conn)
+
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(journal_mode.lower(), 'wal')
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+        # None keeps SQLite's default journal mode
+        with DatabaseManager(self.temp_db.name, journal_mode=None) as db:
+            self.assertEqual(db.get_total_count(), 1)
+
+    def test_close_and_context_manager(self):
+        """Test closing the manager and reopening on next use."""
+        conn = self.db.get_connection()
+        self.db.close()
+        with self.assertRaises(Exception):
+            conn.execute('SELECT 1')
+
+        with DatabaseManager(self.temp_db.name) as db:
+            db.add_bookmark(Bookmark(title="Test", url="https://example.com"))
+            self.assertEqual(db.get_total_count(), 1)
+
+        # A closed manager transparently reconnects
+        self.assertEqual(self.db.get_total_count(), 1)
+
 
 class TestBookmarkModel(unittest.TestCase):
     """Test cases for Bookmark model."""
@@ -243,6 +918,42 @@ class TestBookmarkModel(unittest.TestCase):
         self.assertEqual(bookmark.tags, "test,demo")
         self.assertEqual(bookmark.visit_count, 5)
 
+    def test_from_row_converts_timestamps_lazily(self):
+        """Test hydrating a bookmark from a tuple row with epoch timestamps."""
+        created = datetime(2024, 5, 1, 9, 30)
+        row = (3, "Row", "https://row.com", None, "a,b",
+               int(created.timestamp()), int(created.timestamp()) + 60, 2)
+
+        bookmark = Bookmark.from_row(row)
+        self.assertNotIn('created_at', bookmark.__dict__)
+        self.assertEqual(bookmark.created_at, created)
+        self.assertEqual(bookmark.updated_at, datetime(2024, 5, 1, 9, 31))
+        self.assertEqual(bookmark, Bookmark(id=3, title="Row", url="https://row.com", tags="a,b",
+                                            created_at=created, updated_at=bookmark.updated_at,
+                                            visit_count=2))
+        with self.assertRaises(AttributeError):
+            bookmark.missing
+
+    def test_fold(self):
+        """Test folding of case, accents, ligatures and letters without decompositions."""
+        self.assertEqual(fold("İstanbul Straße"), "istanbul strasse")
+        self.assertEqual(fold("ﬁle Ærø łódź"), "file aero lodz")
+        self.assertEqual(fold("ASCII"), "ascii")
+        self.assertIsNone(fold(None))
+        self.assertEqual(unfold_markup("Große Straße, İstanbul", "grosse [strasse], [istanbul]", "[]"),
+                         "Große [Straße], [İstanbul]")
+        self.assertEqual(unfold_markup("x é y Øl z", "...e y [ol]...", "[]", "..."), "...é y [Øl]...")
+
+    def test_domains(self):
+        """Test host name and registrable domain extraction."""
+        self.assertEqual(url_domain("https://WWW.GitHub.com:443/x"), "github.com")
+        self.assertEqual(url_domain("not a url"), "")
+        self.assertEqual(registrable_domain("gist.github.com"), "github.com")
+        self.assertEqual(registrable_domain("news.bbc.co.uk"), "bbc.co.uk")
+        self.assertEqual(registrable_domain("www.example.com.tr"), "example.com.tr")
+        self.assertEqual(registrable_domain("192.168.1.10"), "192.168.1.10")
+        self.assertEqual(registrable_domain("localhost"), "localhost")
+
 
 class TestUtils(unittest.TestCase):
     """Test cases for utility functions."""
@@ -311,6 +1022,99 @@ class TestUtils(unittest.TestCase):
             if os.path.exists(json_file):
                 os.unlink(json_file)
 
+    def test_write_json_array_matches_json_dump(self):
+        """Test that streamed JSON arrays equal json.dump output, indented and compact."""
+        import io
+        import json
+        items = [{"title": "Café \"quoted\"\nline", "tags": ["a", "b"], "meta": {}},
+                 {"title": "Second", "tags": [], "meta": {"visits": None}}] * 3
+        for data in (items, []):
+            out = io.StringIO()
+            self.assertEqual(write_json_array(iter(data), out, chunk_size=4), len(data))
+            self.assertEqual(out.getvalue(), json.dumps(data, indent=2, ensure_ascii=False))
+            out = io.StringIO()
+            write_json_array(iter(data), out, indent=None, chunk_size=4)
+            self.assertEqual(out.getvalue(), json.dumps(data, separators=(',', ':'), ensure_ascii=False))
+
+    def test_iter_json_array_across_chunks(self):
+        """Test that the incremental reader parses items split across read chunks."""
+        import io
+        import json
+        data = [{"title": "日本語 ✓", "tags": ["a"], "visits": 12345}, 678, "text", [], {},
+                True, None, -1.5e10, 'say "\\u00e9"']
+        for indent in (2, None):
+            encoded = json.dumps(data, indent=indent, ensure_ascii=False).encode('utf-8')
+            for chunk_size in (1, 5, 4096):
+                self.assertEqual(list(iter_json_array(io.BytesIO(encoded), chunk_size, use_ijson=False)),
+                                 data)
+        self.assertEqual(list(iter_json_array(io.BytesIO(b' [ ] '), use_ijson=False)), [])
+        for malformed in (b'{"title": "x"}', b'[1 2]', b'[{"title": ', b'[1,]', b'[1]x', b'[] []'):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.BytesIO(malformed), 4, use_ijson=False))
+
+        # A malformed item fails at once instead of reading the rest of the file
+        stream = io.BytesIO(b'[{"title": x}, ' + b'1, ' * 100000 + b'1]')
+        with self.assertRaises(ValueError):
+            list(iter_json_array(stream, 64, use_ijson=False))
+        self.assertLess(stream.tell(), 1000)
+
+    def test_ndjson_lines_forward_and_backward(self):
+        """Test NDJSON writing, line-by-line reading and reading from the end."""
+        import io
+        data = [{"title": f"Bookmark {i} é", "tags": ["a"] * (i % 3)} for i in range(50)]
+        out = io.StringIO()
+        self.assertEqual(write_ndjson(iter(data), out, chunk_size=8), 50)
+        encoded = out.getvalue().encode('utf-8')
+        self.assertEqual(encoded.count(b'\n'), 50)
+        self.assertEqual(list(iter_ndjson(io.BytesIO(encoded))), data)
+        for block_size in (1, 7, 4096):
+            self.assertEqual(list(iter_ndjson_reversed(io.BytesIO(encoded), block_size)), data[::-1])
+        with self.assertRaisesRegex(ValueError, "Line 2"):
+            list(iter_ndjson(io.BytesIO(b'{"a": 1}\n{"a": \n')))
+
+    def test_netscape_bookmarks_across_chunks(self):
+        """Test that browser bookmark files stream in with folders as tags."""
+        import io
+        document = (
+            '\ufeff<!DOCTYPE NETSCAPE-Bookmark-file-1>\n<TITLE>Bookmarks</TITLE>\n<DL><p>\n'
+            '<DT><H3 PERSONAL_TOOLBAR_FOLDER="true">Bookmarks bar</H3>\n<DL><p>\n'
+            '<DT><A HREF="https://a.com/?x=1&amp;y=2" ADD_DATE="1700000000000">A &amp; B</A>\n'
+            '<DT><H3>Dev, Tools</H3>\n<DL><p>\n'
+            '<DT><A HREF="https://py.org" ADD_DATE="1700000000" TAGS="lang, Dev  Tools">Python</A>\n'
+            '<DD>The <b>language</b> site\n'
+            '<DT><A HREF="javascript:void(0)">Bookmarklet</A>\n'
+            '</DL><p>\n<DT><H3>Empty</H3>\n'
+            '</DL><p>\n<DT><A HREF="https://untitled.com" ADD_DATE="1600000000"></A>\n</DL><p>\n')
+        encoded = document.encode('utf-8')
+        for chunk_size in (1, 7, 4096):
+            bookmarks = list(iter_netscape_bookmarks(io.BytesIO(encoded), chunk_size))
+            self.assertEqual([(b.url, b.title, b.tags, b.description) for b in bookmarks], [
+                ("https://a.com/?x=1&y=2", "A & B", None, None),
+                ("https://py.org", "Python", "Dev Tools,lang", "The language site"),
+                ("https://untitled.com", "https://untitled.com", None, None),
+            ])
+            self.assertEqual(bookmarks[0].created_at, bookmarks[1].created_at)
+
+        out = io.StringIO()
+        self.assertEqual(write_netscape(iter(bookmarks), out), 3)
+        again = list(iter_netscape_bookmarks(io.BytesIO(out.getvalue().encode('utf-8'))))
+        self.assertEqual([b.to_dict() for b in again], [b.to_dict() for b in bookmarks])
+
+    def test_netscape_unclosed_anchors(self):
+        """Test that a bookmark without </A> keeps its text, or its URL, as the title."""
+        import io
+        document = ('<DL><p>\n<DT><A HREF="https://a.com">First\n'
+                    '<DT><A HREF="https://b.com">\n<DD>Described\n'
+                    '<DT><A HREF="https://c.com">Last in folder\n</DL><p>\n'
+                    '<DT><A HREF="https://d.com">')
+        bookmarks = list(iter_netscape_bookmarks(io.BytesIO(document.encode('utf-8')), 5))
+        self.assertEqual([(b.url, b.title, b.description) for b in bookmarks], [
+            ("https://a.com", "First", None),
+            ("https://b.com", "https://b.com", "Described"),
+            ("https://c.com", "Last in folder", None),
+            ("https://d.com", "https://d.com", None),
+        ])
+
 
 class TestBookmarkManager(unittest.TestCase):
     """Test cases for BookmarkManager class."""
@@ -323,6 +1127,7 @@ class TestBookmarkManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test database."""
+        self.manager.close()
         os.unlink(self.temp_db.name)
     
     def test_add_bookmark(self):
@@ -354,6 +1159,15 @@ class TestBookmarkManager(unittest.TestCase):
         
         success = self.manager.list_bookmarks()
         self.assertTrue(success)
+
+        self.manager.update_bookmark("1", tags="web")
+        self.manager.update_bookmark("2", tags="web")
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(self.manager.list_bookmarks(limit=1, tags=["web"], sort='title'))
+        shown = ' '.join(str(call) for call in mock_print.call_args_list)
+        self.assertIn("First", shown)
+        self.assertNotIn("Second", shown)
+        self.assertIn("--after", shown)
     
     def test_search_bookmarks(self):
         """Test searching bookmarks."""
@@ -393,6 +1207,116 @@ class TestBookmarkManager(unittest.TestCase):
         bookmark = self.manager.db.get_bookmark_by_id(1)
         self.assertIsNone(bookmark)
 
+    def test_import_json_streams_into_batches(self):
+        """Test JSON import through the batched pipeline, and rollback of a malformed file."""
+        self.manager.add_bookmark(url="https://existing.com", title="Existing")
+        items = [{"title": f"Item {i}", "url": f"https://item{i}.com", "tags": ["imported"]}
+                 for i in range(1200)] + [{"title": "Dup", "url": "https://existing.com", "tags": []}]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            write_json_array(items, f)
+        try:
+            self.assertTrue(self.manager.import_bookmarks(f.name))
+            self.assertEqual(self.manager.db.get_total_count(), 1201)
+
+            with open(f.name, 'w', encoding='utf-8') as out:
+                out.write('[{"title": "New", "url": "https://new.com", "tags": []}, {"title": ')
+            self.assertFalse(self.manager.import_bookmarks(f.name))
+            self.assertIsNone(self.manager.db.get_bookmark_by_url("https://new.com"))
+        finally:
+            os.unlink(f.name)
+
+    def test_ndjson_export_append_and_import(self):
+        """Test NDJSON export, appending only new or changed bookmarks, and re-import."""
+        self.manager.add_bookmark(url="https://first.com", title="First", tags="a,b")
+        self.manager.add_bookmark(url="https://second.com", title="Second")
+        with tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False) as f:
+            log_file = f.name
+        other = DatabaseManager(self.temp_db.name + '.copy')
+        try:
+            self.assertTrue(self.manager.export_bookmarks('ndjson', log_file))
+            self.assertTrue(self.manager.export_bookmarks('ndjson', log_file, append=True))
+            self.manager.update_bookmark("1", title="First renamed")
+            self.manager.add_bookmark(url="https://third.com", title="Third")
+            self.assertTrue(self.manager.export_bookmarks('ndjson', log_file, append=True))
+            with open(log_file, encoding='utf-8') as log:
+                self.assertEqual([line.count('"title"') for line in log], [1, 1, 1, 1])
+            self.assertFalse(self.manager.export_bookmarks('json', log_file, append=True))
+
+            # Later lines win when the log is replayed
+            with open(log_file, 'rb') as log:
+                other.add_bookmarks(iter_ndjson_bookmarks(log), on_duplicate='update')
+            self.assertEqual(sorted((b.title, b.get_tags_list()) for b in other.iter_bookmarks()),
+                             [("First renamed", ["a", "b"]), ("Second", []), ("Third", [])])
+            self.assertTrue(self.manager.import_bookmarks(log_file, on_duplicate='update'))
+        finally:
+            other.close()
+            os.unlink(self.temp_db.name + '.copy')
+            os.unlink(log_file)
+
+    def test_compressed_export_and_import(self):
+        """Test exports through each codec and imports detected by suffix or magic bytes."""
+        self.manager.add_bookmark(url="https://first.com", title="First", tags="a")
+        self.manager.add_bookmark(url="https://second.com", title="Second")
+        directory = tempfile.mkdtemp()
+        other = BookmarkManager(os.path.join(directory, 'other.db'))
+        try:
+            for codec, suffix in (('gzip', '.gz'), ('bz2', '.bz2'), ('xz', '.xz')):
+                for format_type in ('json', 'ndjson', 'csv'):
+                    path = os.path.join(directory, f'export.{format_type}{suffix}')
+                    self.assertTrue(self.manager.export_bookmarks(format_type, path, compress=codec, level=1))
+                    with open(path, 'rb') as f:
+                        self.assertEqual(detect_codec(f), codec)
+                    self.assertTrue(other.import_bookmarks(path, on_duplicate='update'))
+            self.assertEqual(sorted(b.title for b in other.db.iter_bookmarks()), ["First", "Second"])
+
+            # Compression is recognized without the suffix, and appends keep the file's codec
+            log_file = os.path.join(directory, 'log.ndjson')
+            self.assertTrue(self.manager.export_bookmarks('ndjson', log_file, compress='gzip'))
+            self.manager.add_bookmark(url="https://third.com", title="Third")
+            self.assertFalse(self.manager.export_bookmarks('ndjson', log_file, append=True, compress='xz'))
+            self.assertTrue(self.manager.export_bookmarks('ndjson', log_file, append=True))
+            self.assertTrue(other.import_bookmarks(log_file))
+            self.assertEqual(other.db.get_total_count(), 3)
+
+            self.assertFalse(self.manager.export_bookmarks('json', log_file, compress='bz2', level=0))
+            self.assertFalse(self.manager.export_bookmarks('json', log_file, level=5))
+        finally:
+            other.close()
+            shutil.rmtree(directory)
+
+    def test_html_export_and_import(self):
+        """Test a Netscape HTML export imported into another collection."""
+        self.manager.add_bookmark(url="https://first.com", title="First <1>", tags="a,b",
+                                  description="Notes & more")
+        self.manager.add_bookmark(url="https://second.com", title="Second")
+        directory = tempfile.mkdtemp()
+        other = BookmarkManager(os.path.join(directory, 'other.db'))
+        try:
+            for filename, codec in (('bookmarks.html', None), ('bookmarks.htm', 'gzip')):
+                path = os.path.join(directory, filename)
+                self.assertTrue(self.manager.export_bookmarks('html', path, compress=codec))
+                self.assertTrue(other.import_bookmarks(path, on_duplicate='update'))
+            imported = {b.url: b for b in other.db.iter_bookmarks()}
+            self.assertEqual(sorted(imported), ["https://first.com", "https://second.com"])
+            self.assertEqual(imported["https://first.com"].title, "First <1>")
+            self.assertEqual(imported["https://first.com"].get_tags_list(), ["a", "b"])
+            self.assertEqual(imported["https://first.com"].description, "Notes & more")
+
+            # Browser exports keep the date each bookmark was added
+            path = os.path.join(directory, 'browser.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('<DL><p>\n<DT><A HREF="https://old.com" ADD_DATE="1500000000" '
+                        'LAST_MODIFIED="1500000600000">Old</A>\n</DL><p>\n')
+            self.assertTrue(other.import_bookmarks(path))
+            old = other.db.get_bookmark_by_url("https://old.com")
+            self.assertEqual(old.created_at, datetime.fromtimestamp(1500000000))
+            self.assertEqual(old.updated_at, datetime.fromtimestamp(1500000600))
+            self.assertEqual(other.db.get_bookmark_by_url("https://first.com").created_at,
+                             self.manager.db.get_bookmark_by_url("https://first.com").created_at)
+        finally:
+            other.close()
+            shutil.rmtree(directory)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
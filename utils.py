@@ -1,15 +1,20 @@
-import json
 import csv
+import io
 import os
 import re
+import sys
 import webbrowser
 from urllib.parse import urlparse
-from typing import List, Dict, Any, Optional
+from itertools import chain
+from typing import List, Dict, Any, Optional, Iterable, Iterator, BinaryIO, Sized, Tuple
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 from colorama import Fore, Style, init
-from models import Bookmark
+from models import Bookmark, HIGHLIGHT_START, HIGHLIGHT_END
+from jsonstream import iter_json_array, iter_ndjson, iter_ndjson_reversed, write_json_array, write_ndjson
+from compression import decompressed, detect_codec, open_text
+from netscape import iter_netscape_bookmarks, write_netscape
 
 # Initialize colorama
 init(autoreset=True)
@@ -51,22 +56,101 @@ def open_url_in_browser(url: str) -> bool:
         return False
 
 
-def export_to_json(bookmarks: List[Bookmark], filename: str) -> bool:
-    """Export bookmarks to JSON file."""
+def export_to_json(bookmarks: Iterable[Bookmark], filename: str, compact: bool = False,
+                   compress: Optional[str] = None, level: Optional[int] = None) -> bool:
+    """Export bookmarks to JSON file, encoding them one at a time.
+
+    ``compress`` names a codec from compression.CODECS to write through.
+    """
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            data = [bookmark.to_dict() for bookmark in bookmarks]
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open_text(filename, 'w', compress, level, encoding='utf-8') as f:
+            write_json_array((bookmark.to_dict() for bookmark in bookmarks), f,
+                             indent=None if compact else 2)
         return True
     except Exception as e:
         print(f"{Fore.RED}Error exporting to JSON: {e}")
         return False
 
 
-def export_to_csv(bookmarks: List[Bookmark], filename: str) -> bool:
-    """Export bookmarks to CSV file."""
+def export_to_ndjson(bookmarks: Iterable[Bookmark], filename: str, append: bool = False,
+                     compress: Optional[str] = None, level: Optional[int] = None) -> Optional[int]:
+    """Export bookmarks to an NDJSON file, one per line; returns how many were written.
+
+    With ``append`` the lines are added to the end of an existing file,
+    which must use the same ``compress`` codec. Returns None if the file
+    could not be written.
+    """
+    try:
+        # Never glue the first new line onto an unterminated last one
+        needs_newline = append and compress is None and _missing_final_newline(filename)
+        with open_text(filename, 'a' if append else 'w', compress, level,
+                       encoding='utf-8', newline='\n') as f:
+            if needs_newline:
+                f.write('\n')
+            return write_ndjson((bookmark.to_dict() for bookmark in bookmarks), f)
+    except Exception as e:
+        print(f"{Fore.RED}Error exporting to NDJSON: {e}")
+        return None
+
+
+def _missing_final_newline(filename: str) -> bool:
+    """Whether a file exists, is not empty and does not end with a newline."""
+    try:
+        with open(filename, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    except FileNotFoundError:
+        return False
+
+
+def ndjson_export_mark(filename: str) -> Tuple[Optional[datetime], Dict[int, Dict[str, Any]]]:
+    """Where an NDJSON export left off: its last updated_at and the items written at it.
+
+    Exports are written in updated order, so only the lines at the end of
+    the file sharing the last timestamp are read; the items are keyed by
+    ID. Compressed files cannot be read backwards and are scanned from the
+    start instead. Returns (None, {}) for a missing or empty file.
+    """
+    mark: Optional[str] = None
+    items: Dict[int, Dict[str, Any]] = {}
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
+        with open(filename, 'rb') as f:
+            if detect_codec(f) is None:
+                for item in iter_ndjson_reversed(f):
+                    if mark is None:
+                        mark = item['updated_at']
+                    elif item['updated_at'] != mark:
+                        break
+                    items.setdefault(item['id'], item)
+            else:
+                for item in iter_ndjson(decompressed(f)):
+                    if item['updated_at'] != mark:
+                        mark, items = item['updated_at'], {}
+                    items[item['id']] = item
+    except FileNotFoundError:
+        pass
+    return (datetime.fromisoformat(mark) if mark else None), items
+
+
+def export_to_html(bookmarks: Iterable[Bookmark], filename: str,
+                   compress: Optional[str] = None, level: Optional[int] = None) -> bool:
+    """Export bookmarks to a Netscape bookmark file that browsers can import."""
+    try:
+        with open_text(filename, 'w', compress, level, encoding='utf-8') as f:
+            write_netscape(bookmarks, f)
+        return True
+    except Exception as e:
+        print(f"{Fore.RED}Error exporting to HTML: {e}")
+        return False
+
+
+def export_to_csv(bookmarks: Iterable[Bookmark], filename: str,
+                  compress: Optional[str] = None, level: Optional[int] = None) -> bool:
+    """Export bookmarks to CSV file, optionally through a ``compress`` codec."""
+    try:
+        with open_text(filename, 'w', compress, level, newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['ID', 'Title', 'URL', 'Description', 'Tags', 'Created At', 'Updated At', 'Visit Count'])
             
@@ -87,87 +171,150 @@ def export_to_csv(bookmarks: List[Bookmark], filename: str) -> bool:
         return False
 
 
+def iter_json_bookmarks(f: BinaryIO) -> Iterator[Bookmark]:
+    """Yield bookmarks from a JSON array in a binary file as they are parsed."""
+    for item in iter_json_array(f):
+        yield Bookmark.from_dict(item)
+
+
+def iter_ndjson_bookmarks(f: BinaryIO) -> Iterator[Bookmark]:
+    """Yield bookmarks from an NDJSON binary file, one line at a time."""
+    for item in iter_ndjson(f):
+        yield Bookmark.from_dict(item)
+
+
 def import_from_json(filename: str) -> List[Bookmark]:
     """Import bookmarks from JSON file."""
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        bookmarks = []
-        for item in data:
-            bookmark = Bookmark.from_dict(item)
-            bookmarks.append(bookmark)
-        
-        return bookmarks
+        with open(filename, 'rb') as f:
+            return list(iter_json_bookmarks(decompressed(f)))
     except Exception as e:
         print(f"{Fore.RED}Error importing from JSON: {e}")
         return []
 
 
+def iter_csv_bookmarks(f: BinaryIO) -> Iterator[Bookmark]:
+    """Yield bookmarks from a CSV binary file, one row at a time."""
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    try:
+        for row in csv.DictReader(text):
+            yield Bookmark(
+                id=int(row['ID']) if row['ID'] else None,
+                title=row['Title'],
+                url=row['URL'],
+                description=row['Description'] if row['Description'] else None,
+                tags=row['Tags'] if row['Tags'] else None,
+                created_at=datetime.fromisoformat(row['Created At']) if row['Created At'] else datetime.now(),
+                updated_at=datetime.fromisoformat(row['Updated At']) if row['Updated At'] else datetime.now(),
+                visit_count=int(row['Visit Count']) if row['Visit Count'] else 0
+            )
+    finally:
+        # Leave f open for the caller
+        text.detach()
+
+
 def import_from_csv(filename: str) -> List[Bookmark]:
     """Import bookmarks from CSV file."""
     try:
-        bookmarks = []
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                bookmark = Bookmark(
-                    id=int(row['ID']) if row['ID'] else None,
-                    title=row['Title'],
-                    url=row['URL'],
-                    description=row['Description'] if row['Description'] else None,
-                    tags=row['Tags'] if row['Tags'] else None,
-                    created_at=datetime.fromisoformat(row['Created At']) if row['Created At'] else datetime.now(),
-                    updated_at=datetime.fromisoformat(row['Updated At']) if row['Updated At'] else datetime.now(),
-                    visit_count=int(row['Visit Count']) if row['Visit Count'] else 0
-                )
-                bookmarks.append(bookmark)
-        
-        return bookmarks
+        with open(filename, 'rb') as f:
+            return list(iter_csv_bookmarks(decompressed(f)))
     except Exception as e:
         print(f"{Fore.RED}Error importing from CSV: {e}")
         return []
 
 
-def format_bookmark_display(bookmark: Bookmark, show_id: bool = True) -> str:
-    """Format a bookmark for display with colors."""
+# File name endings import understands, each with its format name, the
+# reader for a (decompressed) binary stream and whether the dates it reads
+# are kept. Browser exports carry the date each bookmark was added; the
+# other formats get the time of the import.
+IMPORT_FORMATS = (
+    ('.json', 'JSON', iter_json_bookmarks, False),
+    ('.ndjson', 'NDJSON', iter_ndjson_bookmarks, False),
+    ('.jsonl', 'NDJSON', iter_ndjson_bookmarks, False),
+    ('.csv', 'CSV', iter_csv_bookmarks, False),
+    ('.html', 'HTML', iter_netscape_bookmarks, True),
+    ('.htm', 'HTML', iter_netscape_bookmarks, True),
+)
+
+
+def render_highlights(text: str, color: str) -> str:
+    """Turn highlight markers into bright red spans inside text shown in ``color``."""
+    return (text.replace(HIGHLIGHT_START, f"{Style.BRIGHT}{Fore.RED}")
+                .replace(HIGHLIGHT_END, f"{Style.NORMAL}{color}"))
+
+
+def format_bookmark_display(bookmark: Bookmark, show_id: bool = True,
+                            highlights: Optional[Dict[str, str]] = None) -> str:
+    """Format a bookmark for display with colors.
+
+    ``highlights`` maps fields to marked-up text from a search, shown in
+    place of the stored value (a description snippet replaces the full text).
+    """
+    highlights = highlights or {}
+    
+    def field(name: str, color: str) -> str:
+        if name in highlights:
+            return render_highlights(highlights[name], color)
+        return getattr(bookmark, name)
+    
     parts = []
     
     if show_id and bookmark.id:
         parts.append(f"{Fore.CYAN}#{bookmark.id}")
     
-    parts.append(f"{Fore.GREEN}{bookmark.title}")
+    parts.append(f"{Fore.GREEN}{field('title', Fore.GREEN)}")
     
     if bookmark.tags:
-        parts.append(f"{Fore.YELLOW}[{bookmark.tags}]")
+        parts.append(f"{Fore.YELLOW}[{field('tags', Fore.YELLOW)}]")
     
-    parts.append(f"{Fore.BLUE}{bookmark.url}")
+    parts.append(f"{Fore.BLUE}{field('url', Fore.BLUE)}")
     
     if bookmark.description:
-        parts.append(f"{Fore.WHITE}{bookmark.description}")
+        parts.append(f"{Fore.WHITE}{field('description', Fore.WHITE)}")
     
     parts.append(f"{Fore.MAGENTA}Visits: {bookmark.visit_count}")
     
     return ' - '.join(str(part) for part in parts)
 
 
-def display_bookmarks(bookmarks: List[Bookmark], show_stats: bool = True):
-    """Display a list of bookmarks with formatting."""
-    if not bookmarks:
+def display_bookmarks(bookmarks: Iterable[Bookmark], show_stats: bool = True,
+                      total: Optional[int] = None, highlighted: bool = False) -> int:
+    """Display bookmarks with formatting and return how many were shown.
+
+    Accepts any iterable, so results streamed from the database are printed
+    as they arrive. Lists report their length in the header; for other
+    iterables pass ``total`` if it is known up front. With ``highlighted``
+    the items are (bookmark, highlights) pairs from a search.
+    """
+    if total is None and isinstance(bookmarks, Sized):
+        total = len(bookmarks)
+    
+    iterator = iter(bookmarks)
+    first = next(iterator, None)
+    if first is None:
         print(f"{Fore.YELLOW}No bookmarks found.")
-        return
+        return 0
     
     print(f"\n{Fore.CYAN}{'='*60}")
-    print(f"{Fore.CYAN}Bookmarks ({len(bookmarks)} items)")
+    print(f"{Fore.CYAN}Bookmarks ({total} items)" if total is not None else f"{Fore.CYAN}Bookmarks")
     print(f"{Fore.CYAN}{'='*60}")
     
-    for bookmark in bookmarks:
-        print(format_bookmark_display(bookmark))
+    count = 0
+    total_visits = 0
+    for item in chain([first], iterator):
+        if highlighted:
+            bookmark, highlights = item
+            print(format_bookmark_display(bookmark, highlights=highlights))
+        else:
+            bookmark = item
+            print(format_bookmark_display(bookmark))
         print()
+        count += 1
+        total_visits += bookmark.visit_count
     
     if show_stats:
-        total_visits = sum(b.visit_count for b in bookmarks)
         print(f"{Fore.MAGENTA}Total visits: {total_visits}")
+    return count
 
 
 def display_stats(stats: Dict[str, Any]):
@@ -190,8 +337,64 @@ def display_stats(stats: Dict[str, Any]):
         print(f"{Fore.BLUE}  {url}")
 
 
-def display_tags(tags: List[str]):
-    """Display list of tags."""
+def display_domain_stats(rows: List[Tuple[str, int, int]]):
+    """Display bookmark and visit counts per domain."""
+    if not rows:
+        print(f"{Fore.YELLOW}No domains found.")
+        return
+    
+    print(f"\n{Fore.CYAN}{'='*40}")
+    print(f"{Fore.CYAN}Bookmarks by Domain ({len(rows)})")
+    print(f"{Fore.CYAN}{'='*40}")
+    for domain, bookmarks, visits in rows:
+        print(f"{Fore.GREEN}{domain or '(none)'} {Fore.MAGENTA}({bookmarks} bookmarks, {visits} visits)")
+
+
+def display_collections(collections: List[Tuple[str, str, str, int]]):
+    """Display saved collections with their queries and sizes."""
+    if not collections:
+        print(f"{Fore.YELLOW}No collections found.")
+        return
+    
+    print(f"\n{Fore.CYAN}{'='*40}")
+    print(f"{Fore.CYAN}Collections ({len(collections)})")
+    print(f"{Fore.CYAN}{'='*40}")
+    for name, query, search_in, count in collections:
+        scope = f" (in {search_in})" if search_in != 'all' else ''
+        print(f"{Fore.GREEN}{name} {Fore.MAGENTA}({count}) {Fore.BLUE}{query}{scope}")
+
+
+def display_cache_stats(stats: Dict[str, int], max_entries: int, max_bytes: int):
+    """Display result-cache counters and the configured cache bounds."""
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups * 100 if lookups else 0.0
+    
+    print(f"\n{Fore.CYAN}{'='*40}")
+    print(f"{Fore.CYAN}Result Cache Statistics")
+    print(f"{Fore.CYAN}{'='*40}")
+    print(f"{Fore.GREEN}Hits: {stats['hits']}")
+    print(f"{Fore.GREEN}Misses: {stats['misses']}")
+    print(f"{Fore.GREEN}Hit rate: {hit_rate:.1f}%")
+    print(f"{Fore.YELLOW}Evictions: {stats['evictions']}")
+    print(f"{Fore.YELLOW}Invalidations: {stats['invalidations']}")
+    print(f"{Fore.BLUE}Limits: {max_entries} entries, {max_bytes // 1024} KiB")
+
+
+def display_facets(facets: Dict[str, Any]):
+    """Display per-tag, per-domain and per-month hit counts of a search."""
+    print(f"\n{Fore.CYAN}{'='*40}")
+    print(f"{Fore.CYAN}Facets ({facets['total']} matches)")
+    print(f"{Fore.CYAN}{'='*40}")
+    for name in ('tags', 'domains', 'months'):
+        if not facets[name]:
+            continue
+        print(f"{Fore.YELLOW}{name.capitalize()}:")
+        for value, count in facets[name]:
+            print(f"{Fore.GREEN}  {value or '(none)'} {Fore.MAGENTA}({count})")
+
+
+def display_tags(tags: List[str], counts: Optional[Dict[str, int]] = None):
+    """Display list of tags, with bookmark counts when given."""
     if not tags:
         print(f"{Fore.YELLOW}No tags found.")
         return
@@ -201,7 +404,10 @@ def display_tags(tags: List[str]):
     print(f"{Fore.CYAN}{'='*40}")
     
     for i, tag in enumerate(tags, 1):
-        print(f"{Fore.GREEN}{i:3d}. {tag}")
+        if counts is not None:
+            print(f"{Fore.GREEN}{i:3d}. {tag} {Fore.MAGENTA}({counts.get(tag, 0)})")
+        else:
+            print(f"{Fore.GREEN}{i:3d}. {tag}")
 
 
 def confirm_action(message: str) -> bool:
@@ -249,6 +455,12 @@ def print_info(message: str):
     print(f"{Fore.BLUE}ℹ {message}")
 
 
+def print_progress(message: str, done: bool = False):
+    """Show a progress message in place of the previous one (terminals only)."""
+    if sys.stdout.isatty():
+        print(f"\r{Fore.BLUE}… {message}", end='\n' if done else '', flush=True)
+
+
 def paginate_list(items: List[Any], page: int, items_per_page: int = 10) -> List[Any]:
     """Paginate a list of items."""
     start = (page - 1) * items_per_page
@@ -0,0 +1,127 @@
+"""
+Write-behind buffering for bookmark visit counts.
+
+Opening a bookmark only needs to bump a counter, so instead of an UPDATE and
+commit per visit the increments are coalesced and written later in one
+batched UPDATE. Long-running callers keep them in memory; short-lived CLI
+processes append them to a spool file next to the database instead.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class VisitBuffer:
+    """Coalesces visit-count increments until a size or age threshold is hit."""
+
+    def __init__(self, max_pending: int = 100, max_age: float = 60.0,
+                 spool_path: Optional[str] = None):
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.spool_path = spool_path
+        self._counts: Dict[int, int] = {}
+        self._total = 0
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        if spool_path:
+            # Pick up visits that earlier processes left in the spool, including
+            # a claim that was never committed
+            self._load_spool_file(spool_path + '.flushing')
+            self._load_spool_file(spool_path)
+
+    def _load_spool_file(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._add(*_parse_spool_line(line))
+
+    def _add(self, bookmark_id: Optional[int], timestamp: float):
+        if bookmark_id is None:
+            return
+        self._counts[bookmark_id] = self._counts.get(bookmark_id, 0) + 1
+        self._total += 1
+        if self._oldest is None or timestamp < self._oldest:
+            self._oldest = timestamp
+
+    def record(self, bookmark_id: int) -> bool:
+        """Record one visit; returns True when the buffer is due for a flush."""
+        now = time.time()
+        with self._lock:
+            if self.spool_path:
+                with open(self.spool_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{bookmark_id} {now:.3f}\n")
+            self._add(bookmark_id, now)
+        return self.is_due()
+
+    def pending(self, bookmark_id: int) -> int:
+        """Visits recorded for a bookmark that are not in the database yet."""
+        return self._counts.get(bookmark_id, 0)
+
+    def is_due(self) -> bool:
+        """Whether enough visits have piled up, or waited long enough, to flush."""
+        if not self._total:
+            return False
+        return (self._total >= self.max_pending or
+                time.time() - self._oldest >= self.max_age)
+
+    def __len__(self) -> int:
+        return self._total
+
+    def fingerprint(self) -> int:
+        """Hash of the pending counts, the same in every process holding the same visits."""
+        with self._lock:
+            return hash(tuple(sorted(self._counts.items())))
+
+    def claim(self) -> Dict[int, int]:
+        """Take all pending increments, emptying the buffer (and spool file).
+
+        The spool file is renamed to ``<spool>.flushing`` before it is read so
+        visits appended meanwhile by other processes land in a fresh file.
+        Call :meth:`commit_claim` once the increments have been written.
+        """
+        with self._lock:
+            counts = self._counts
+            self._counts, self._total, self._oldest = {}, 0, None
+            if not self.spool_path:
+                return counts
+
+            flushing = self.spool_path + '.flushing'
+            if not os.path.exists(flushing) and os.path.exists(self.spool_path):
+                os.replace(self.spool_path, flushing)
+            # Re-read what was actually claimed: other processes may have
+            # appended visits this one never saw
+            counts = {}
+            if os.path.exists(flushing):
+                with open(flushing, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        bookmark_id, _ = _parse_spool_line(line)
+                        if bookmark_id is not None:
+                            counts[bookmark_id] = counts.get(bookmark_id, 0) + 1
+            # Visits appended after the claim stay pending
+            self._load_spool_file(self.spool_path)
+            return counts
+
+    def requeue(self, counts: Dict[int, int]):
+        """Put back increments from a claim whose write failed."""
+        now = time.time()
+        with self._lock:
+            for bookmark_id, count in counts.items():
+                for _ in range(count):
+                    self._add(bookmark_id, now)
+
+    def commit_claim(self):
+        """Forget a claimed spool file after its increments were written."""
+        if self.spool_path and os.path.exists(self.spool_path + '.flushing'):
+            os.remove(self.spool_path + '.flushing')
+
+
+def _parse_spool_line(line: str):
+    """Parse a '<bookmark id> <unix time>' spool line; bad lines yield no id."""
+    parts = line.split()
+    try:
+        return int(parts[0]), float(parts[1])
+    except (IndexError, ValueError):
+        return None, 0.0